@@ -0,0 +1,167 @@
+#!/usr/bin/python
+from __future__ import print_function, division, absolute_import
+
+# Copyright (c) 2026 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+
+# Benchmark decoding of the v3 entitlement certificate path tree.
+#
+# Generates synthetic path tree extension data with the requested numbers of
+# content paths, then times the table-driven decoder that PathTree uses
+# against the old bit-by-bit decoder.
+#
+# from top level of tree:
+#    PYTHONPATH=src python scripts/bench_pathtree.py [content path counts...]
+
+import sys
+import timeit
+import zlib
+from collections import Counter
+
+from rhsm.huffman import HuffmanDecoder, HuffmanNode
+from rhsm.pathtree import PathTree
+
+FAMILIES = ['rhel', 'rhel-alt', 'jboss', 'openstack', 'rhui', 'satellite']
+VARIANTS = ['server', 'workstation', 'client', 'computenode', 'power', 'system-z']
+REPOS = ['os', 'optional/os', 'extras/os', 'supplementary/os', 'debug', 'source/SRPMS']
+
+
+def synthetic_paths(count):
+    """
+    :param count:   number of content paths to generate
+    :type  count:   int
+    :return:        list of content paths that look roughly like the ones
+                    found in real entitlement certificates
+    :rtype:         list of str
+    """
+    paths = []
+    for i in range(count):
+        paths.append('/content/dist/%s/%s/%d/$releasever/$basearch/product-%d/%s' % (
+            FAMILIES[i % len(FAMILIES)],
+            VARIANTS[(i // len(FAMILIES)) % len(VARIANTS)],
+            5 + i % 4,
+            i // len(REPOS),
+            REPOS[i % len(REPOS)]))
+    return paths
+
+
+def _codes(values):
+    """
+    :param values:  values ordered by ascending weight
+    :return:        dict of value -> (code, length) as built by the decoder
+    """
+    leaves = [HuffmanNode(weight, value) for weight, value in enumerate(values, 1)]
+    root = HuffmanNode.build_tree(leaves)
+    return dict((value, (code, length)) for code, length, value in HuffmanDecoder.leaf_codes(root))
+
+
+def encode_path_tree(paths):
+    """
+    Encodes paths in the v3 entitlement certificate path tree format.
+
+    :param paths:   content paths
+    :type  paths:   list of str
+    :return:        data suitable for passing to PathTree
+    :rtype:         binary string
+    """
+    trie = {}
+    for path in paths:
+        node = trie
+        for segment in path.strip('/').split('/'):
+            node = node.setdefault(segment, {})
+
+    # every path ends in the same empty node
+    nodes = [trie]
+    index = {}
+    end_index = None
+    references = Counter()
+    words = Counter()
+    stack = [trie]
+    edges = {}
+    while stack:
+        node = stack.pop()
+        node_edges = []
+        for word, child in sorted(node.items()):
+            if child:
+                index[id(child)] = len(nodes)
+                nodes.append(child)
+                stack.append(child)
+                child_index = index[id(child)]
+            else:
+                if end_index is None:
+                    end_index = len(nodes)
+                    nodes.append(child)
+                child_index = end_index
+            node_edges.append((word, child_index))
+            references[child_index] += 1
+            words[word] += 1
+        edges[id(node)] = node_edges
+    edges[id(nodes[end_index])] = []
+    words[''] = len(nodes)
+
+    word_list = sorted(words, key=lambda w: (words[w], w))
+    word_codes = _codes(word_list)
+    # the root is written first and has no code, the rest by ascending weight
+    node_order = sorted(range(1, len(nodes)), key=lambda i: (references[i], i))
+    node_codes = _codes(node_order)
+
+    bits = []
+    for i in [0] + node_order:
+        for word, child_index in edges[id(nodes[i])]:
+            bits.append(word_codes[word])
+            bits.append(node_codes[child_index])
+        bits.append(word_codes[''])
+    bit_string = ''.join(format(code, '0%db' % length) for code, length in bits)
+    bit_string += '0' * (-len(bit_string) % 8)
+    packed = bytearray(int(bit_string[i:i + 8], 2) for i in range(0, len(bit_string), 8))
+
+    node_count = len(nodes)
+    if node_count < 128:
+        count_bytes = bytearray([node_count])
+    else:
+        count = bytearray()
+        while node_count:
+            count.insert(0, node_count & 0xff)
+            node_count >>= 8
+        count_bytes = bytearray([128 + len(count)]) + count
+
+    word_data = zlib.compress(b'\0'.join(w.encode('utf-8') for w in word_list))
+    return word_data + bytes(count_bytes) + bytes(packed)
+
+
+def bench(count, repeat=3):
+    data = encode_path_tree(synthetic_paths(count))
+    word_leaves, bits = PathTree._unpack_data(data)
+    word_root = HuffmanNode.build_tree(word_leaves)
+
+    by_table = PathTree._decode_path_tree(word_root, bits)
+    by_bits = PathTree._decode_path_tree_by_bits(word_leaves, bits)
+    assert by_table == by_bits, "decoders disagree"
+
+    table_time = min(timeit.repeat(
+        lambda: PathTree._decode_path_tree(word_root, bits), number=1, repeat=repeat))
+    bits_time = min(timeit.repeat(
+        lambda: PathTree._decode_path_tree_by_bits(word_leaves, bits), number=1, repeat=repeat))
+    total_time = min(timeit.repeat(lambda: PathTree(data), number=1, repeat=repeat))
+    print("%7d paths %9d bytes   table: %8.2f ms   by bits: %8.2f ms   (%5.1fx)   PathTree(): %8.2f ms" % (
+        count, len(data), table_time * 1000, bits_time * 1000, bits_time / table_time, total_time * 1000))
+
+
+def main(args):
+    counts = [int(arg) for arg in args] or [100, 1000, 5000, 20000]
+    for count in counts:
+        bench(count)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,142 @@
+#!/usr/bin/python
+from __future__ import print_function, division, absolute_import
+
+# Copyright (c) 2026 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+
+# Benchmark filtering the available pools.
+#
+# Generates synthetic pools, installed product certificates and entitlement
+# certificates, then times each PoolFilter filter and PoolStash filtering
+# with the options of "subscription-manager list --available
+# --match-installed --no-overlap".
+#
+# from top level of tree:
+#    PYTHONPATH=src python scripts/bench_poolfilter.py [pool count] [installed product count]
+
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from rhsm.certificate import DateRange, GMT
+from subscription_manager import injection as inj
+from subscription_manager.managerlib import PoolFilter, PoolStash
+
+PRODUCT_COUNT = 2000
+
+
+class Product(object):
+    def __init__(self, product_id):
+        self.id = product_id
+
+
+class Cert(object):
+    def __init__(self, product_ids, valid_range=None):
+        self.products = [Product(product_id) for product_id in product_ids]
+        self.valid_range = valid_range
+
+
+class CertDirectory(object):
+    def __init__(self, certs):
+        self.certs = certs
+
+    def list(self):
+        return self.certs
+
+
+class Sorter(object):
+    partially_valid_products = {}
+    partial_stacks = {}
+
+
+class Identity(object):
+    uuid = 'bench-consumer'
+
+
+def synthetic_pools(count):
+    """
+    :param count:   number of pools to generate
+    :type  count:   int
+    :return:        list of dicts that look like the pools returned by
+                    the server, each providing a few of PRODUCT_COUNT
+                    products
+    :rtype:         list of dict
+    """
+    start = datetime.now(GMT()) - timedelta(days=30)
+    end = start + timedelta(days=365)
+    pools = []
+    for i in range(count):
+        product_id = str(i % PRODUCT_COUNT)
+        provided = [str((i * 7 + j) % PRODUCT_COUNT) for j in range(1, 4)]
+        pools.append({
+            'id': 'pool-%d' % i,
+            'productId': product_id,
+            'productName': 'Product %s' % product_id,
+            'providedProducts': [{'productId': p, 'productName': 'Product %s' % p} for p in provided],
+            'productAttributes': [{'name': 'type', 'value': 'SVC' if i % 5 == 0 else 'MKT'}],
+            'attributes': [],
+            'startDate': start.isoformat(),
+            'endDate': end.isoformat(),
+        })
+    return pools
+
+
+def directories(installed_count):
+    installed = CertDirectory([Cert([str(i * 3 % PRODUCT_COUNT)]) for i in range(installed_count)])
+    valid_range = DateRange(datetime.now(GMT()) - timedelta(days=60), datetime.now(GMT()) + timedelta(days=60))
+    entitled = CertDirectory([Cert([str(i * 5 % PRODUCT_COUNT) for i in range(n, n + 4)], valid_range)
+                              for n in range(0, installed_count, 4)])
+    return installed, entitled
+
+
+def pool_stash(pools, installed, entitled):
+    inj.provide(inj.IDENTITY, Identity)
+    inj.provide(inj.PROD_DIR, installed)
+    inj.provide(inj.ENT_DIR, entitled)
+    stash = PoolStash()
+    stash.sorter = Sorter()
+    stash.all_pools = dict((pool['id'], pool) for pool in pools)
+    stash.compatible_pools = stash.all_pools
+    return stash
+
+
+def bench(count, installed_count, repeat=3):
+    pools = synthetic_pools(count)
+    installed, entitled = directories(installed_count)
+    pool_filter = PoolFilter(installed, entitled, Sorter())
+    stash = pool_stash(pools, installed, entitled)
+
+    timings = [
+        ("uninstalled", lambda: pool_filter.filter_out_uninstalled(pools)),
+        ("installed", lambda: pool_filter.filter_out_installed(pools)),
+        ("overlapping", lambda: pool_filter.filter_out_overlapping(pools)),
+        ("non overlapping", lambda: pool_filter.filter_out_non_overlapping(pools)),
+        ("stash", lambda: stash._filter_pools(True, True, True, False, "product")),
+    ]
+    results = []
+    for name, func in timings:
+        results.append("%s: %8.2f ms" % (name, min(timeit.repeat(func, number=1, repeat=repeat)) * 1000))
+    shown = len(stash._filter_pools(True, True, True, False, "product"))
+
+    print("%6d pools %4d products   %s   (%d shown)" % (count, installed_count, "   ".join(results), shown))
+
+
+def main(args):
+    counts = [int(arg) for arg in args[:1]] or [1000, 5000, 20000]
+    installed_count = int(args[1]) if len(args) > 1 else 300
+    for count in counts:
+        bench(count, installed_count)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
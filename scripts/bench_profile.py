@@ -0,0 +1,119 @@
+#!/usr/bin/python
+from __future__ import print_function, division, absolute_import
+
+# Copyright (c) 2026 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+
+# Benchmark building and comparing the rpm package profile.
+#
+# Generates a synthetic list of rpm headers with the requested numbers of
+# packages, then times building an RPMProfile from it, collecting the
+# package dicts and comparing two profiles, and reports the memory the
+# profile takes (python 3 only).
+#
+# from top level of tree:
+#    PYTHONPATH=src python scripts/bench_profile.py [package counts...]
+
+import sys
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from rhsm.profile import RPMProfile
+
+ARCHES = ['x86_64', 'noarch', 'i686']
+VENDORS = ['Red Hat, Inc.', 'Fedora Project', None]
+
+
+def synthetic_headers(count):
+    """
+    :param count:   number of package headers to generate
+    :type  count:   int
+    :return:        list of dicts that look like the rpm headers returned
+                    by TransactionSet.dbMatch(), as new objects each time
+    :rtype:         list of dict
+    """
+    headers = []
+    for i in range(count):
+        headers.append({
+            'name': 'package-%d' % i,
+            'version': '%d.%d.%d' % (i % 7, i % 13, i % 5),
+            'release': '%d.el8' % (i % 11),
+            # built at run time so they are not shared by the compiler
+            'arch': ''.join(ARCHES[i % len(ARCHES)]),
+            'epoch': i % 3 or None,
+            'vendor': VENDORS[i % len(VENDORS)] and ''.join(VENDORS[i % len(VENDORS)]),
+        })
+    headers.append({'name': 'gpg-pubkey', 'version': 'fd431d51', 'release': '4ae0493b',
+                    'arch': None, 'epoch': None, 'vendor': None})
+    return headers
+
+
+def profile_from_headers(headers):
+    profile = RPMProfile.__new__(RPMProfile)
+    profile.packages = RPMProfile._accumulate_profile(headers)
+    return profile
+
+
+def list_eq(profile, other):
+    """ How RPMProfile.__eq__ used to compare profiles. """
+    if len(profile.packages) != len(other.packages):
+        return False
+    for pkg in profile.packages:
+        if pkg not in other.packages:
+            return False
+    return True
+
+
+def profile_memory(headers):
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    profile = profile_from_headers(headers)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del profile
+    return size
+
+
+def bench(count, repeat=3):
+    headers = synthetic_headers(count)
+    profile = profile_from_headers(headers)
+    other = profile_from_headers(list(reversed(headers)))
+    assert profile == other, "profiles differ"
+    assert list_eq(profile, other), "profiles differ"
+
+    build_time = min(timeit.repeat(lambda: profile_from_headers(headers), number=1, repeat=repeat))
+    collect_time = min(timeit.repeat(profile.collect, number=1, repeat=repeat))
+    eq_time = min(timeit.repeat(lambda: profile == other, number=1, repeat=repeat))
+    # the old comparison is quadratic, once is plenty
+    list_eq_time = timeit.timeit(lambda: list_eq(profile, other), number=1)
+    memory = profile_memory(headers)
+
+    print("%7d packages   build: %8.2f ms   collect: %8.2f ms   compare: %8.2f ms   "
+          "(list compare: %9.2f ms)   memory: %s" % (
+              count, build_time * 1000, collect_time * 1000, eq_time * 1000, list_eq_time * 1000,
+              "%.1f KiB" % (memory / 1024) if memory is not None else "n/a"))
+
+
+def main(args):
+    counts = [int(arg) for arg in args] or [1000, 5000, 10000]
+    for count in counts:
+        bench(count)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -123,3 +123,112 @@ class GhettoBitStream(six.Iterator):
         copy = data[:]
         copy.reverse()
         return sum(x << n * 8 for n, x in enumerate(copy))
+
+
+class BitReader(object):
+    """
+    Reads binary data as a stream of bits, most significant bit first, without
+    converting it into strings. Bits are kept in an integer accumulator that is
+    refilled one byte at a time, so callers can look at several bits at once
+    with peek() and then consume however many of them they actually used with
+    skip(). This is what makes table-driven Huffman decoding possible.
+
+    Reading past the end of the data pads the accumulator with zero bits for
+    peek(), but skip() will refuse to consume any of that padding.
+    """
+
+    # extra bits to load into the accumulator whenever it needs refilling
+    FILL_BITS = 32
+
+    combine_bytes = staticmethod(GhettoBitStream.combine_bytes)
+
+    def __init__(self, data):
+        """
+        :param data:    binary data in a string
+        :type  data:    str
+        """
+        self._data = bytearray(data)
+        self._index = 0
+        self._acc = 0
+        self._acc_bits = 0
+        self._pad_bits = 0
+
+    @property
+    def bits_left(self):
+        """
+        :return:    number of real (non-padding) bits that have not been consumed
+        :rtype:     int
+        """
+        return (len(self._data) - self._index) * 8 + self._acc_bits - self._pad_bits
+
+    def _fill(self, count):
+        """
+        Make sure at least count bits are in the accumulator, padding with
+        zeros once the data runs out. Several bytes are loaded at once so
+        that most calls to peek() do not need to refill.
+
+        :param count:   minimum number of bits needed
+        :type  count:   int
+        """
+        data = self._data
+        acc = self._acc
+        acc_bits = self._acc_bits
+        while acc_bits < count + self.FILL_BITS:
+            if self._index < len(data):
+                acc = (acc << 8) | data[self._index]
+                self._index += 1
+            elif acc_bits >= count:
+                break
+            else:
+                acc <<= 8
+                self._pad_bits += 8
+            acc_bits += 8
+        self._acc = acc
+        self._acc_bits = acc_bits
+
+    def peek(self, count):
+        """
+        :param count:   number of bits to look at
+        :type  count:   int
+        :return:        the next count bits in the stream as an unsigned int,
+                        without consuming them
+        :rtype:         int
+        """
+        if self._acc_bits < count:
+            self._fill(count)
+        return self._acc >> (self._acc_bits - count)
+
+    def skip(self, count):
+        """
+        Consume bits that were previously looked at with peek().
+
+        :param count:   number of bits to consume
+        :type  count:   int
+        :raises:        EOFError if that would consume more bits than the
+                        data contains
+        """
+        if self._acc_bits < count:
+            self._fill(count)
+        remaining = self._acc_bits - count
+        if remaining < self._pad_bits:
+            raise EOFError('attempted to read past the end of the bit stream')
+        self._acc_bits = remaining
+        self._acc &= (1 << remaining) - 1
+
+    def read(self, count):
+        """
+        :param count:   number of bits to read
+        :type  count:   int
+        :return:        the next count bits in the stream as an unsigned int
+        :rtype:         int
+        """
+        value = self.peek(count)
+        self.skip(count)
+        return value
+
+    def pop_byte(self):
+        """
+        :return:    next 8 bits in the stream, as an int
+        :rtype:     int
+        """
+        return self.read(8)
@@ -619,6 +619,20 @@ class EntitlementCertificate(ProductCertificate):
         else:
             return self._path_tree.match_path(path)
 
+    def check_paths(self, paths):
+        """
+        Checks many paths against the list of entitled paths. For v3
+        certificates, the path tree is only decoded and compiled for matching
+        once, and paths sharing a prefix reuse the work done for it.
+
+        :param paths:   paths to which access is being requested
+        :type  paths:   iterable of basestring
+
+        :return:    list with True for each path that matches, else False
+        :rtype:     list of bool
+        """
+        return [self.check_path(path) for path in paths]
+
     def _check_v1_path(self, path):
         """
         Check the requested path against a v1 certificate
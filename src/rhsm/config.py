@@ -30,6 +30,8 @@ HOST_CONFIG_DIR = "/etc/rhsm-host/"  # symlink inside docker containers
 DEFAULT_CONFIG_PATH = "%srhsm.conf" % DEFAULT_CONFIG_DIR
 DEFAULT_PROXY_PORT = "3128"
 DEFAULT_SERVER_TIMEOUT = "180"
+DEFAULT_CONNECTION_IDLE_TIMEOUT = "15"
+DEFAULT_CONNECTION_POOL_SIZE = "4"
 
 # Defaults for connecting to RHSM, used to "reset" the configuration file
 # if requested by the user:
@@ -59,6 +61,9 @@ SERVER_DEFAULTS = {
         'proxy_port': '',
         'proxy_password': '',
         'no_proxy': '',
+        'connection_idle_timeout': DEFAULT_CONNECTION_IDLE_TIMEOUT,
+        'connection_pool_size': DEFAULT_CONNECTION_POOL_SIZE,
+        'compress_requests': '0',
         }
 RHSM_DEFAULTS = {
         'baseurl': 'https://' + DEFAULT_CDN_HOSTNAME,
@@ -75,7 +80,10 @@ RHSM_DEFAULTS = {
         'pluginconfdir': '/etc/rhsm/pluginconf.d',
         'auto_enable_yum_plugins': '1',
         'package_profile_on_trans': '0',
-        'inotify': '1'
+        'inotify': '1',
+        'cert_batch_size': '100',
+        'fact_collector_timeout': '60',
+        'skip_network_interfaces': ''
         }
 
 RHSMCERTD_DEFAULTS = {
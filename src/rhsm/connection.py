@@ -17,16 +17,21 @@ from __future__ import print_function, division, absolute_import
 #
 
 import base64
+import codecs
 from rhsm import certificate
 import datetime
 import dateutil.parser
 import locale
 import logging
 import os
+import re
+import select
 import six
 import socket
 import sys
+import threading
 import time
+import zlib
 from email.utils import formatdate
 
 from rhsm.https import httplib, ssl
@@ -271,6 +276,12 @@ class ContentConnection(object):
         self.password = password
         self.ssl_verify_depth = ssl_verify_depth
 
+        # (cert path, key path) -> (fingerprint, SSL context)
+        self._ssl_contexts = {}
+        self._ent_cert_key_list = None
+        self.ssl_context_created = 0
+        self.ssl_context_reused = 0
+
         # allow specifying no_proxy via api or config
         no_proxy_override = no_proxy or config.get('server', 'no_proxy')
         if no_proxy_override:
@@ -332,6 +343,12 @@ class ContentConnection(object):
         Create list of cert-key pairs that can be used for connection with CDN
         :return: List of tuples containing certificate and private key
         """
+        # The list only changes when files are added to or removed from
+        # the directory, which changes its mtime.
+        dir_fingerprint = _file_fingerprint(self.ent_dir)
+        if self._ent_cert_key_list is not None and dir_fingerprint is not None and \
+                self._ent_cert_key_list[0] == dir_fingerprint:
+            return list(self._ent_cert_key_list[1])
 
         ent_cert_key_pairs = []
 
@@ -341,6 +358,7 @@ class ContentConnection(object):
                 key_path = os.path.join(self.ent_dir, "%s-key.pem" % cert_file.split('.', 1)[0])
                 ent_cert_key_pairs.append((cert_path, key_path))
 
+        self._ent_cert_key_list = (dir_fingerprint, list(ent_cert_key_pairs))
         return ent_cert_key_pairs
 
     def _load_ca_certificate(self, context, cert_path, key_path):
@@ -360,13 +378,31 @@ class ContentConnection(object):
         except OSError as e:
             raise ConnectionSetupException(e.strerror)
 
-    def _request(self, request_type, handler, body="", headers=None, ent_cert_key_pairs=None):
-        # See note in Restlib._request
+    def _get_ssl_context(self, cert_path, key_path):
+        """
+        Return an SSL context using the given cert-key pair. Contexts are
+        kept for as long as the cert and key files are unchanged.
+        """
+        fingerprint = (_file_fingerprint(cert_path), _file_fingerprint(key_path))
+        cached = self._ssl_contexts.get((cert_path, key_path))
+        if cached is not None and cached[0] == fingerprint and None not in fingerprint:
+            self.ssl_context_reused += 1
+            log.debug("Reusing SSL context for '%s' (created: %d, reused: %d)" %
+                      (cert_path, self.ssl_context_created, self.ssl_context_reused))
+            return cached[1]
+
+        # See note in BaseRestLib._create_ssl_context
         context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
 
         # Disable SSLv2 and SSLv3 support to avoid poodles.
         context.options = ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3
 
+        self._load_ca_certificate(context, cert_path, key_path)
+        self._ssl_contexts[(cert_path, key_path)] = (fingerprint, context)
+        self.ssl_context_created += 1
+        return context
+
+    def _request(self, request_type, handler, body="", headers=None, ent_cert_key_pairs=None):
         final_headers = {"Host": "%s:%s" % (normalized_host(self.host), self.ssl_port),
                          "Content-Length": "0",
                          "User-Agent": self.user_agent}
@@ -379,7 +415,7 @@ class ContentConnection(object):
             ent_cert_key_pairs = self._get_ent_cert_key_list()
 
         for cert_path, key_path in ent_cert_key_pairs:
-            self._load_ca_certificate(context, cert_path, key_path)
+            context = self._get_ssl_context(cert_path, key_path)
 
             conn = self._create_connection(context)
 
@@ -423,6 +459,53 @@ class ContentConnection(object):
         pass
 
 
+class Validators(dict):
+    """
+    HTTP cache validators (ETag and Last-Modified) of a resource, for making
+    conditional GET requests.
+
+    When passed to BaseRestLib.request_get, the validators are sent as
+    If-None-Match and If-Modified-Since headers and replaced by the ones in
+    the response. If the server answers 304 Not Modified, not_modified is
+    set and the request returns no content; the caller is expected to use
+    the copy of the resource it stored along with the validators.
+    """
+    ETAG = 'etag'
+    LAST_MODIFIED = 'last-modified'
+
+    def __init__(self, *args, **kwargs):
+        super(Validators, self).__init__(*args, **kwargs)
+        self.not_modified = False
+
+    def request_headers(self):
+        """
+        :return: dict of conditional request headers for these validators
+        """
+        headers = {}
+        if self.get(self.ETAG):
+            headers['If-None-Match'] = self[self.ETAG]
+        if self.get(self.LAST_MODIFIED):
+            headers['If-Modified-Since'] = self[self.LAST_MODIFIED]
+        return headers
+
+    def update_from_response(self, status, headers):
+        """
+        Record the validators of a response.
+
+        :param status: HTTP status of the response
+        :param headers: dict of the response headers
+        """
+        response_validators = dict((name.lower(), value) for name, value in headers.items()
+                                   if name.lower() in (self.ETAG, self.LAST_MODIFIED))
+        self.not_modified = str(status) == "304"
+        if self.not_modified:
+            # a 304 may carry updated validators for the same representation
+            self.update(response_validators)
+        else:
+            self.clear()
+            self.update(response_validators)
+
+
 def _get_locale():
     l = None
     try:
@@ -441,12 +524,323 @@ def _get_locale():
     return None
 
 
+def _file_fingerprint(path):
+    """
+    :param path: path of a file
+    :return: tuple identifying the current contents of path, or None if it
+        cannot be read
+    """
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime)
+
+
+def _dir_fingerprint(path, suffix=".pem"):
+    """
+    :param path: path of a directory
+    :param suffix: only files with this suffix are taken into account
+    :return: tuple identifying the current contents of the files in path
+        ending with suffix, or None if the directory cannot be listed
+    """
+    if not path:
+        return None
+    try:
+        names = sorted(name for name in os.listdir(path) if name.endswith(suffix))
+    except OSError:
+        return None
+    return (_file_fingerprint(path),
+            tuple((name, _file_fingerprint(os.path.join(path, name))) for name in names))
+
+
+if hasattr(ssl, 'SSLSession'):
+    class _ResumingHTTPSConnection(httplib.HTTPSConnection):
+        """
+        HTTPSConnection that offers a previously negotiated TLS session to
+        the server, so that it can skip the full handshake.
+        """
+        def __init__(self, *args, **kwargs):
+            self.ssl_session = kwargs.pop('ssl_session', None)
+            httplib.HTTPSConnection.__init__(self, *args, **kwargs)
+
+        def connect(self):
+            httplib.HTTPConnection.connect(self)
+            server_hostname = self._tunnel_host or self.host
+            self.sock = self._context.wrap_socket(self.sock, server_hostname=server_hostname,
+                                                  session=self.ssl_session)
+else:
+    _ResumingHTTPSConnection = None
+
+
+# Requests that can be sent again when the connection is lost before the
+# response arrives, they do not change anything on the server
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+
+class ConnectionPool(object):
+    """
+    Pool of idle keep-alive HTTPS connections, shared by all BaseRestLib
+    instances.
+
+    Connections are pooled by a key describing everything that was used to
+    set them up (server, proxy, client certificate), so a connection is only
+    ever reused for requests that would have created an identical one.
+    Connections idle for longer than idle_timeout seconds are closed instead
+    of being reused, and at most max_connections idle connections are kept
+    for each key.
+
+    The TLS session of the last connection returned for a key is remembered,
+    so that a new connection made with the same SSL context (see
+    BaseRestLib._get_ssl_context) can resume it.
+    """
+    def __init__(self, idle_timeout=None, max_connections=None):
+        if idle_timeout is None:
+            idle_timeout = safe_int(config.get('server', 'connection_idle_timeout'), 0)
+        if max_connections is None:
+            max_connections = safe_int(config.get('server', 'connection_pool_size'), 0)
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        # key -> list of (connection, time it was returned)
+        self._idle = {}
+        # key -> (ssl context, ssl session)
+        self._sessions = {}
+        self.created = 0
+        self.reused = 0
+
+    @property
+    def enabled(self):
+        return self.idle_timeout > 0 and self.max_connections > 0
+
+    def get(self, key):
+        """
+        :param key: connection key
+        :return: an idle connection for key that is still usable, or None
+        """
+        now = time.time()
+        stale = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                candidate, released = idle.pop()
+                if now - released <= self.idle_timeout and self._is_usable(candidate):
+                    conn = candidate
+                    self.reused += 1
+                    break
+                stale.append(candidate)
+        for candidate in stale:
+            candidate.close()
+        return conn
+
+    def put(self, key, conn):
+        """
+        Return a connection whose response has been read completely to the pool.
+        """
+        if not self.enabled:
+            conn.close()
+            return
+        self._remember_session(key, conn)
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_connections:
+                idle.append((conn, time.time()))
+                conn = None
+        if conn is not None:
+            conn.close()
+
+    def session(self, key, context):
+        """
+        :return: TLS session to resume for a new connection for key using
+            context, or None
+        """
+        with self._lock:
+            saved_context, session = self._sessions.get(key, (None, None))
+        if saved_context is context:
+            return session
+        return None
+
+    def clear(self, key=None):
+        """
+        Close the idle connections for key, or all of them.
+        """
+        with self._lock:
+            if key is None:
+                closing = list(self._idle.values())
+                self._idle = {}
+                self._sessions = {}
+            else:
+                closing = [self._idle.pop(key, [])]
+                self._sessions.pop(key, None)
+        for idle in closing:
+            for conn, _released in idle:
+                conn.close()
+
+    def _remember_session(self, key, conn):
+        sock = getattr(conn, 'sock', None)
+        session = getattr(sock, 'session', None)
+        context = getattr(conn, '_context', None)
+        if session is not None and context is not None:
+            with self._lock:
+                self._sessions[key] = (context, session)
+
+    @staticmethod
+    def _is_usable(conn):
+        # An idle keep-alive connection should have nothing to read. If it
+        # does, the server has closed it (or sent something unexpected).
+        sock = getattr(conn, 'sock', None)
+        if sock is None:
+            return False
+        try:
+            readable, _writable, _errors = select.select([sock], [], [], 0)
+        except (select.error, ValueError, socket.error):
+            return False
+        return not readable
+
+
+# Request bodies smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+# Server capability for accepting gzip compressed request bodies
+GZIP_REQUEST_CAPABILITY = "gzip_request"
+
+
+def gzip_compress(data):
+    # zlib rather than the gzip module, which can only do this through a
+    # file object on python 2
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def gzip_decompress(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+def _is_gzip(response):
+    return (response.getheader('content-encoding') or '').lower() == 'gzip'
+
+
+# Bytes read from a streamed response at a time
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _read_text_chunks(response, sizes):
+    """
+    Reads the body of response, uncompressing and decoding it as it
+    arrives. Yields text chunks, and adds the number of bytes read and
+    their uncompressed size to sizes.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if _is_gzip(response) else None
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        data = response.read(STREAM_CHUNK_SIZE)
+        if not data:
+            break
+        sizes[0] += len(data)
+        if decompressor is not None:
+            data = decompressor.decompress(data)
+        sizes[1] += len(data)
+        text = decoder.decode(data)
+        if text:
+            yield text
+    data = decompressor.flush() if decompressor is not None else b''
+    sizes[1] += len(data)
+    text = decoder.decode(data, True)
+    if text:
+        yield text
+
+
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_json_list(chunks):
+    """
+    Decodes a JSON list from an iterable of text chunks, and yields its
+    elements one at a time, as soon as they are complete. Only the text of
+    the element being decoded is kept, not the whole document. A document
+    that is not a list is yielded as a single element.
+
+    :param chunks: iterable of text making up the JSON document
+    :raises ValueError: if the document is not valid JSON
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf = u''
+    pos = 0
+    eof = False
+    state = 'start'
+    while True:
+        pos = _JSON_WHITESPACE.match(buf, pos).end()
+        need = 1
+        if pos < len(buf):
+            if state == 'start':
+                if buf[pos] != '[':
+                    yield json.loads(buf[pos:] + u''.join(chunks))
+                    return
+                pos += 1
+                state = 'first'
+                continue
+            elif state in ('first', 'next') and buf[pos] == ']':
+                return
+            elif state == 'next':
+                if buf[pos] != ',':
+                    raise ValueError("Expecting ',' delimiter or ']' at char %d" % pos)
+                pos += 1
+                state = 'element'
+                continue
+            else:
+                try:
+                    element, end = decoder.raw_decode(buf, idx=pos)
+                except ValueError:
+                    if eof:
+                        raise
+                    end = None
+                if end is not None:
+                    # a number may go on in the next chunk, the element is
+                    # only complete once the delimiter after it is read
+                    after = _JSON_WHITESPACE.match(buf, end).end()
+                    if eof or (after < len(buf) and buf[after] in ',]'):
+                        yield element
+                        pos = end
+                        state = 'next'
+                        continue
+                    need = len(buf) - pos + 1
+                else:
+                    # read at least as much again as we have, so large
+                    # elements are not decoded over and over
+                    need = max(len(buf) - pos, 1) * 2
+        elif eof:
+            if state == 'start':
+                raise ValueError("No JSON document")
+            raise ValueError("Unterminated JSON list")
+
+        buf = buf[pos:]
+        pos = 0
+        while len(buf) < need and not eof:
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+            else:
+                buf += chunk
+
+
+def _format_size(size, uncompressed_size):
+    if size == uncompressed_size:
+        return "%d bytes" % size
+    return "%d bytes (%d uncompressed)" % (size, uncompressed_size)
+
+
 class BaseRestLib(object):
     """
     A low-level wrapper around httplib
     to make rest calls easy and expose the details of
     responses
     """
+    # Idle connections are shared by all instances
+    connection_pool = ConnectionPool()
+
     def __init__(self, host, ssl_port, apihandler,
             username=None, password=None,
             proxy_hostname=None, proxy_port=None,
@@ -478,6 +872,7 @@ class BaseRestLib(object):
 
         self.headers = {"Content-type": "application/json",
                         "Accept": "application/json",
+                        "Accept-Encoding": "gzip",
                         "x-subscription-manager-version": subman_version}
 
         if lc:
@@ -499,6 +894,22 @@ class BaseRestLib(object):
         self.proxy_user = proxy_user
         self.proxy_password = proxy_password
 
+        # SSL context and the fingerprint of the files it was loaded from
+        self._ssl_context = None
+        self._ssl_context_fingerprint = None
+        self.ssl_context_created = 0
+        self.ssl_context_reused = 0
+
+        # Request bodies are only compressed when the server supports it,
+        # see UEPConnection.has_capability
+        self.compress_requests = False
+        # Bytes of request and response bodies sent over the wire, and
+        # their size before compression
+        self.bytes_sent = 0
+        self.bytes_sent_uncompressed = 0
+        self.bytes_received = 0
+        self.bytes_received_uncompressed = 0
+
         # Setup basic authentication if specified:
         if username and password:
             self.headers['Authorization'] = _encode_auth(username, password)
@@ -522,10 +933,7 @@ class BaseRestLib(object):
         if loaded_ca_certs:
             log.debug("Loaded CA certificates from %s: %s" % (self.ca_dir, ', '.join(loaded_ca_certs)))
 
-    # FIXME: can method be empty?
-    def _request(self, request_type, method, info=None, headers=None):
-        handler = self.apihandler + method
-
+    def _create_ssl_context(self):
         # See M2Crypto/SSL/Context.py in m2crypto source and
         # https://www.openssl.org/docs/ssl/SSL_CTX_new.html
         # This ends up invoking SSLv23_method, which is the catch all
@@ -548,6 +956,50 @@ class BaseRestLib(object):
                 self._load_ca_certificates(context)
         if self.cert_file and os.path.exists(self.cert_file):
             context.load_cert_chain(self.cert_file, keyfile=self.key_file)
+        return context
+
+    def _get_ssl_context(self):
+        """
+        Return the SSL context for this connection, creating it again only
+        when the CA certificates or the client certificate or key changed.
+        """
+        fingerprint = (self.insecure,
+                       None if self.insecure else _dir_fingerprint(self.ca_dir),
+                       _file_fingerprint(self.cert_file),
+                       _file_fingerprint(self.key_file))
+        if self._ssl_context is not None and fingerprint == self._ssl_context_fingerprint:
+            self.ssl_context_reused += 1
+            log.debug("Reusing SSL context (created: %d, reused: %d)" %
+                      (self.ssl_context_created, self.ssl_context_reused))
+            return self._ssl_context
+
+        self._ssl_context = self._create_ssl_context()
+        self._ssl_context_fingerprint = fingerprint
+        self.ssl_context_created += 1
+        return self._ssl_context
+
+    def _connection_key(self):
+        """
+        Key of the connection pool that connections for this instance go to.
+        The client certificate is identified by its contents as well as its
+        path, so that a renewed certificate is never sent over a connection
+        set up with the old one.
+        """
+        return (self.host, safe_int(self.ssl_port), self.timeout,
+                self.proxy_hostname, safe_int(self.proxy_port),
+                self.proxy_user, self.proxy_password,
+                self.cert_file, _file_fingerprint(self.cert_file),
+                self.key_file, _file_fingerprint(self.key_file),
+                self.ca_dir, self.insecure)
+
+    def _create_connection(self, key):
+        context = self._get_ssl_context()
+
+        connection_class = httplib.HTTPSConnection
+        kwargs = {'context': context, 'timeout': self.timeout}
+        if _ResumingHTTPSConnection is not None:
+            connection_class = _ResumingHTTPSConnection
+            kwargs['ssl_session'] = self.connection_pool.session(key, context)
 
         if self.proxy_hostname and self.proxy_port:
             log.debug("Using proxy: %s:%s" % (normalized_host(self.proxy_hostname), safe_int(self.proxy_port)))
@@ -557,28 +1009,33 @@ class BaseRestLib(object):
             }
             if self.proxy_user and self.proxy_password:
                 proxy_headers['Proxy-Authorization'] = _encode_auth(self.proxy_user, self.proxy_password)
-            conn = httplib.HTTPSConnection(self.proxy_hostname, self.proxy_port, context=context, timeout=self.timeout)
+            conn = connection_class(self.proxy_hostname, self.proxy_port, **kwargs)
             conn.set_tunnel(self.host, safe_int(self.ssl_port), proxy_headers)
-            self.headers['Host'] = '%s:%s' % (normalized_host(self.host), safe_int(self.ssl_port))
         else:
-            conn = httplib.HTTPSConnection(self.host, self.ssl_port, context=context, timeout=self.timeout)
-
-        if info is not None:
-            body = json.dumps(info, default=json.encode)
-        else:
-            body = None
-
-        log.debug("Making request: %s %s" % (request_type, handler))
+            conn = connection_class(self.host, self.ssl_port, **kwargs)
+        self.connection_pool.created += 1
+        return conn
 
-        if self.user_agent:
-            self.headers['User-Agent'] = self.user_agent
+    def _get_connection(self, key):
+        """
+        :return: tuple of a connection for key and whether it is a reused
+            keep-alive connection
+        """
+        conn = self.connection_pool.get(key)
+        if conn is not None:
+            log.debug("Reusing connection to %s:%s (created: %d, reused: %d)" %
+                      (normalized_host(self.host), safe_int(self.ssl_port),
+                       self.connection_pool.created, self.connection_pool.reused))
+            return conn, True
+        return self._create_connection(key), False
 
-        final_headers = self.headers.copy()
-        if body is None:
-            final_headers["Content-Length"] = "0"
-        if headers:
-            final_headers.update(headers)
+    def close(self):
+        """
+        Close the idle pooled connections used by this instance.
+        """
+        self.connection_pool.clear(self._connection_key())
 
+    def _send_request(self, conn, request_type, handler, body, final_headers):
         try:
             conn.request(request_type, handler, body=body, headers=final_headers)
         except ssl.SSLError:
@@ -602,25 +1059,145 @@ class BaseRestLib(object):
             if str(code) in str(err):
                 raise ProxyException(err)
             raise
-        response = conn.getresponse()
-        result = {
-            "content": response.read().decode('utf-8'),
-            "status": response.status,
-            "headers": dict(response.getheaders())
-        }
 
-        response_log = 'Response: status=' + str(result['status'])
+    def _prepare_request(self, request_type, method, info=None, headers=None, validators=None):
+        """
+        Returns the handler, the body to send, its size before compression
+        and the headers of a request.
+        """
+        handler = self.apihandler + method
+
+        if self.proxy_hostname and self.proxy_port:
+            self.headers['Host'] = '%s:%s' % (normalized_host(self.host), safe_int(self.ssl_port))
+
+        if info is not None:
+            body = json.dumps(info, default=json.encode)
+        else:
+            body = None
+
+        log.debug("Making request: %s %s" % (request_type, handler))
+
+        if self.user_agent:
+            self.headers['User-Agent'] = self.user_agent
+
+        final_headers = self.headers.copy()
+        body_size = 0
+        if body is None:
+            final_headers["Content-Length"] = "0"
+        else:
+            body = body.encode('utf-8')
+            body_size = len(body)
+            if self.compress_requests and body_size >= GZIP_MIN_SIZE:
+                body = gzip_compress(body)
+                final_headers["Content-Encoding"] = "gzip"
+        if validators is not None:
+            final_headers.update(validators.request_headers())
+        if headers:
+            final_headers.update(headers)
+        return handler, body, body_size, final_headers
+
+    def _open_response(self, request_type, handler, body, final_headers):
+        """
+        Sends the request on a pooled or new connection. Returns the
+        connection key, the connection and the response, whose body is left
+        for the caller to read before calling _release_connection.
+        """
+        key = self._connection_key()
+        conn, reused = self._get_connection(key)
+        sent = False
+        try:
+            try:
+                self._send_request(conn, request_type, handler, body, final_headers)
+                sent = True
+                response = conn.getresponse()
+            except (httplib.BadStatusLine, httplib.CannotSendRequest, socket.error) as err:
+                if not self._can_retry(reused, sent, request_type, err):
+                    raise
+                # The server closed the keep-alive connection before our
+                # request reached it, try again on a new one.
+                log.debug("Pooled connection was closed by the server, reconnecting")
+                conn.close()
+                conn = self._create_connection(key)
+                self._send_request(conn, request_type, handler, body, final_headers)
+                response = conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+        return key, conn, response
+
+    def _can_retry(self, reused, sent, request_type, err):
+        """
+        Whether a request that failed on a pooled connection can be sent
+        again on a new one. Once the request was sent, the server may have
+        acted on it, so only requests that can safely be repeated are.
+        """
+        if not reused or isinstance(err, socket.timeout):
+            return False
+        return not sent or request_type in IDEMPOTENT_METHODS
+
+    def _release_connection(self, key, conn, response):
+        if getattr(response, 'will_close', True):
+            conn.close()
+        else:
+            self.connection_pool.put(key, conn)
+
+    def _read_response(self, key, conn, response):
+        """
+        Reads the whole response body and releases the connection.
+        Returns the uncompressed body and its size on the wire.
+        """
+        try:
+            content = response.read()
+        except Exception:
+            conn.close()
+            raise
+        self._release_connection(key, conn, response)
+
+        received_size = len(content)
+        if content and _is_gzip(response):
+            content = gzip_decompress(content)
+        return content, received_size
+
+    def _log_response(self, response, request_type, handler, body, body_size,
+                      received_size, content_size):
+        sent_size = len(body) if body is not None else 0
+        self.bytes_sent += sent_size
+        self.bytes_sent_uncompressed += body_size
+        self.bytes_received += received_size
+        self.bytes_received_uncompressed += content_size
+
+        response_log = 'Response: status=' + str(response.status)
         if response.getheader('x-candlepin-request-uuid'):
             response_log = "%s, requestUuid=%s" % (response_log,
                     response.getheader('x-candlepin-request-uuid'))
         response_log = "%s, request=\"%s %s\"" % (response_log,
             request_type, handler)
+        response_log = "%s, sent=%s, received=%s" % (response_log,
+            _format_size(sent_size, body_size), _format_size(received_size, content_size))
         log.debug(response_log)
 
         # Look for server drift, and log a warning
         if drift_check(response.getheader('date')):
             log.warn("Clock skew detected, please check your system time")
 
+    # FIXME: can method be empty?
+    def _request(self, request_type, method, info=None, headers=None, validators=None):
+        handler, body, body_size, final_headers = self._prepare_request(
+            request_type, method, info=info, headers=headers, validators=validators)
+        key, conn, response = self._open_response(request_type, handler, body, final_headers)
+        content, received_size = self._read_response(key, conn, response)
+        self._log_response(response, request_type, handler, body, body_size,
+                           received_size, len(content))
+
+        result = {
+            "content": content.decode('utf-8'),
+            "status": response.status,
+            "headers": dict(response.getheaders())
+        }
+
+        if validators is not None and str(result['status']) in ["200", "304"]:
+            validators.update_from_response(result['status'], result['headers'])
+
         # FIXME: we should probably do this in a wrapper method
         # so we can use the request method for normal http
 
@@ -628,6 +1205,46 @@ class BaseRestLib(object):
 
         return result
 
+    def _iter_request(self, request_type, method, headers=None):
+        """
+        Makes a request whose response is a JSON list, and yields the
+        elements of the list as they are read from the response.
+        """
+        handler, body, body_size, final_headers = self._prepare_request(
+            request_type, method, headers=headers)
+        key, conn, response = self._open_response(request_type, handler, body, final_headers)
+
+        if response.status != 200:
+            # errors and empty responses are handled as usual
+            content, received_size = self._read_response(key, conn, response)
+            self._log_response(response, request_type, handler, body, body_size,
+                               received_size, len(content))
+            result = {
+                "content": content.decode('utf-8'),
+                "status": response.status,
+                "headers": dict(response.getheaders())
+            }
+            self.validateResponse(result, request_type, handler)
+            if result['content']:
+                for element in iter_json_list([result['content']]):
+                    yield element
+            return
+
+        sizes = [0, 0]
+        finished = False
+        try:
+            for element in iter_json_list(_read_text_chunks(response, sizes)):
+                yield element
+            finished = True
+        finally:
+            # a response that was not read to the end leaves the connection
+            # unusable for other requests
+            if finished:
+                self._release_connection(key, conn, response)
+            else:
+                conn.close()
+        self._log_response(response, request_type, handler, body, body_size, sizes[0], sizes[1])
+
     def validateResponse(self, response, request_type=None, handler=None):
 
         # FIXME: what are we supposed to do with a 204?
@@ -722,8 +1339,8 @@ class BaseRestLib(object):
         if 'errors' in body:
             return " ".join("%s" % errmsg for errmsg in body['errors'])
 
-    def request_get(self, method, headers=None):
-        return self._request("GET", method, headers=headers)
+    def request_get(self, method, headers=None, validators=None):
+        return self._request("GET", method, headers=headers, validators=validators)
 
     def request_post(self, method, params=None, headers=None):
         return self._request("POST", method, params, headers=headers)
@@ -747,15 +1364,110 @@ class Restlib(BaseRestLib):
      of communication with the server.
     """
 
-    def _request(self, request_type, method, info=None, headers=None):
+    def _request(self, request_type, method, info=None, headers=None, validators=None):
         result = super(Restlib, self)._request(request_type, method,
-            info=info, headers=headers)
+            info=info, headers=headers, validators=validators)
 
         # Handle 204s
         if not len(result['content']):
             return None
         return json.loads(result['content'])
 
+    def request_get_iter(self, method, headers=None):
+        """
+        Like request_get, for requests returning a JSON list, but the
+        elements of the list are decoded and yielded as the response is
+        read, instead of decoding the whole response at once. The request is
+        made when iteration starts.
+        """
+        return self._iter_request("GET", method, headers=headers)
+
+
+class PageIterator(object):
+    """
+    Iterates over the items of a paginated listing, fetching the pages
+    as they are needed. While the items of one page are consumed, the next
+    page is fetched in the background.
+    """
+    def __init__(self, fetch_page, per_page, prefetch=True):
+        """
+        :param fetch_page: function returning the list of items on the page
+            number it is called with, starting at 1
+        :param per_page: number of items requested per page
+        :param prefetch: fetch the next page in a background thread
+        """
+        self.fetch_page = fetch_page
+        self.per_page = per_page
+        self.prefetch = prefetch
+        self.pages_fetched = 0
+
+    def __iter__(self):
+        for items in self.iter_pages():
+            for item in items:
+                yield item
+
+    def _fetch(self, page):
+        items = self.fetch_page(page) or []
+        self.pages_fetched += 1
+        return items
+
+    def _is_last(self, items):
+        # a server that does not support paging returns everything at once
+        return len(items) != self.per_page
+
+    @staticmethod
+    def _first_id(items):
+        first = items[0]
+        return first.get('id') if isinstance(first, dict) else first
+
+    def _is_repeated(self, items, previous):
+        # a server that ignores the paging parameters returns the same
+        # items for every page, which may be exactly per_page of them
+        return bool(items) and bool(previous) and self._first_id(items) == self._first_id(previous)
+
+    def _start_fetch(self, page):
+        result = {}
+
+        def fetch():
+            try:
+                result['items'] = self._fetch(page)
+            except Exception:
+                result['error'] = sys.exc_info()
+
+        thread = threading.Thread(target=fetch, name="PageFetcher")
+        thread.daemon = True
+        thread.start()
+        return thread, result
+
+    def iter_pages(self):
+        """
+        Yields the list of items of each page.
+        """
+        page = 1
+        items = self._fetch(page)
+        while True:
+            last = self._is_last(items)
+            if last or not self.prefetch:
+                yield items
+                if last:
+                    return
+                page += 1
+                next_items = self._fetch(page)
+            else:
+                page += 1
+                thread, result = self._start_fetch(page)
+                # if the caller stops early, the page being fetched is dropped
+                yield items
+                thread.join()
+                if 'error' in result:
+                    six.reraise(*result['error'])
+                next_items = result['items']
+
+            if self._is_repeated(next_items, items):
+                log.debug("Page %d repeats the previous page, the server does not support paging" % page)
+                return
+            items = next_items
+
 
 # FIXME: there should probably be a class here for just
 # the connection bits, then a sub class for the api
@@ -794,6 +1506,8 @@ class UEPConnection(object):
         self.ssl_port = ssl_port or safe_int(config.get('server', 'port'))
         self.handler = handler or config.get('server', 'prefix')
         self.timeout = timeout or safe_int(config.get('server', 'server_timeout'))
+        # only used once the server says it accepts compressed requests
+        self.compress_requests = bool(safe_int(config.get('server', 'compress_requests'), 0))
 
         # remove trailing "/" from the prefix if it is there
         # BZ848836
@@ -964,6 +1678,8 @@ class UEPConnection(object):
         """
         if self.capabilities is None:
             self.capabilities = self._load_manager_capabilities()
+            self.conn.compress_requests = self.compress_requests and \
+                GZIP_REQUEST_CAPABILITY in self.capabilities
         return capability in self.capabilities
 
     def shutDown(self):
@@ -1058,6 +1774,18 @@ class UEPConnection(object):
         """
         return self.updateConsumer(consumer_uuid, facts=facts)
 
+    def updateConsumerFactsDelta(self, consumer_uuid, changed, removed):
+        """
+        Update only the consumer facts that changed since the last update.
+        Only available when the server has the "facts_delta" capability.
+        :param consumer_uuid: UUID of consumer
+        :param changed: Dict of the new and changed facts
+        :param removed: List of the names of the facts that are gone
+        :return: Dict containing response from HTTP server
+        """
+        method = "/consumers/%s/facts/delta" % self.sanitize(consumer_uuid)
+        return self.conn.request_post(method, {"changed": changed, "removed": removed})
+
     def updateConsumer(self, uuid, facts=None, installed_products=None,
             guest_uuids=None, service_level=None, release=None,
             autoheal=None, hypervisor_id=None, content_tags=None, role=None, addons=None,
@@ -1166,43 +1894,69 @@ class UEPConnection(object):
         method = "/consumers/%s/profiles" % self.sanitize(consumer_uuid)
         return self.conn.request_put(method, profile)
 
+    def updateProfileDelta(self, consumer_uuid, delta):
+        """
+        Updates the consumer's combined profile with only what changed since
+        the last update. Only available when the server has the
+        "profile_delta" capability.
+        :param consumer_uuid: UUID of consumer
+        :param delta: List of changes, one dict per content type. The "rpm"
+            entry lists "added" and "removed" packages, the other entries
+            carry their whole new "profile".
+        :return: Dict containing response from HTTP server
+        """
+        method = "/consumers/%s/profiles/delta" % self.sanitize(consumer_uuid)
+        return self.conn.request_post(method, delta)
+
     # FIXME: username and password not used here
-    def getConsumer(self, uuid, username=None, password=None):
+    def getConsumer(self, uuid, username=None, password=None, validators=None):
         """
         Returns a consumer object with pem/key for existing consumers
+
+        Returns None when validators are given and the consumer has not
+        changed, see Validators.
         """
         method = '/consumers/%s' % self.sanitize(uuid)
-        return self.conn.request_get(method)
+        return self.conn.request_get(method, validators=validators)
 
-    def getConsumers(self, owner=None):
+    def getConsumers(self, owner=None, stream=False):
         """
-        Returns a list of consumers
+        Returns a list of consumers, or an iterator over them if stream is
+        set, see Restlib.request_get_iter.
         """
         method = '/consumers/'
         if owner:
             method = "%s?owner=%s" % (method, owner)
 
+        if stream:
+            return self.conn.request_get_iter(method)
         return self.conn.request_get(method)
 
-    def getCompliance(self, uuid, on_date=None):
+    def getCompliance(self, uuid, on_date=None, validators=None):
         """
         Returns a compliance object with compliance status information
+
+        Returns None when validators are given and the status has not
+        changed, see Validators.
         """
         method = '/consumers/%s/compliance' % self.sanitize(uuid)
         if on_date:
             method = "%s?on_date=%s" % (method,
                     self.sanitize(on_date.isoformat(), plus=True))
-        return self.conn.request_get(method)
+        return self.conn.request_get(method, validators=validators)
 
-    def getSyspurposeCompliance(self, uuid, on_date=None):
+    def getSyspurposeCompliance(self, uuid, on_date=None, validators=None):
         """
         Returns a system purpose compliance object with compliance status information
+
+        Returns None when validators are given and the status has not
+        changed, see Validators.
         """
         method = '/consumers/%s/purpose_compliance' % self.sanitize(uuid)
         if on_date:
             method = "%s?on_date=%s" % (method,
                                         self.sanitize(on_date.isoformat(), plus=True))
-        return self.conn.request_get(method)
+        return self.conn.request_get(method, validators=validators)
 
     def createOwner(self, ownerKey, ownerDisplayName=None):
         params = {"key": ownerKey}
@@ -1262,15 +2016,19 @@ class UEPConnection(object):
         method = '/consumers/%s' % self.sanitize(consumerId)
         return self.conn.request_delete(method)
 
-    def getCertificates(self, consumer_uuid, serials=[]):
+    def getCertificates(self, consumer_uuid, serials=[], stream=False):
         """
         Fetch all entitlement certificates for this consumer.
         Specify a list of serial numbers to filter if desired.
+        If stream is set, an iterator over the certificates is returned, see
+        Restlib.request_get_iter.
         """
         method = '/consumers/%s/certificates' % (self.sanitize(consumer_uuid))
         if len(serials) > 0:
             serials_str = ','.join(serials)
             method = "%s?serials=%s" % (method, serials_str)
+        if stream:
+            return self.conn.request_get_iter(method)
         return self.conn.request_get(method)
 
     def getCertificateSerials(self, consumerId):
@@ -1367,12 +2125,20 @@ class UEPConnection(object):
 
         return self.conn.request_put(method)
 
-    def getPoolsList(self, consumer=None, listAll=False, active_on=None, owner=None, filter_string=None, future=None, after_date=None):
+    def getPoolsList(self, consumer=None, listAll=False, active_on=None, owner=None, filter_string=None, future=None, after_date=None,
+                     stream=False, page=None, per_page=None, sort_by=None, order=None):
         """
         List pools for a given consumer or owner.
 
         Ideally, try to always pass the owner key argument. The old method is deprecated
         and may eventually be removed.
+
+        If stream is set, an iterator over the pools is returned, see
+        Restlib.request_get_iter.
+
+        page and per_page request a single page of the pools, pages are
+        numbered from 1. sort_by names the pool attribute the pools are
+        sorted by and order is "asc" or "desc". See iterPoolsList.
         """
 
         if owner:
@@ -1400,9 +2166,28 @@ class UEPConnection(object):
                     self.sanitize(active_on.isoformat(), plus=True))
         if filter_string:
             method = "%s&matches=%s" % (method, self.sanitize(filter_string, plus=True))
+        if page is not None:
+            method = "%s&page=%d" % (method, page)
+        if per_page is not None:
+            method = "%s&per_page=%d" % (method, per_page)
+        if sort_by:
+            method = "%s&sort_by=%s" % (method, self.sanitize(sort_by))
+        if order:
+            method = "%s&order=%s" % (method, self.sanitize(order))
+        if stream:
+            return self.conn.request_get_iter(method)
         results = self.conn.request_get(method)
         return results
 
+    def iterPoolsList(self, per_page, prefetch=True, **kwargs):
+        """
+        Returns a PageIterator over the pools, requesting per_page pools at a
+        time. Takes the same keyword arguments as getPoolsList.
+        """
+        def fetch_page(page):
+            return self.getPoolsList(page=page, per_page=per_page, **kwargs)
+        return PageIterator(fetch_page, per_page, prefetch=prefetch)
+
     def getPool(self, poolId, consumerId=None):
         method = "/pools/%s" % self.sanitize(poolId)
         if consumerId:
@@ -1413,9 +2198,9 @@ class UEPConnection(object):
         method = "/products/%s" % self.sanitize(product_uuid)
         return self.conn.request_get(method)
 
-    def getRelease(self, consumerId):
+    def getRelease(self, consumerId, validators=None):
         method = "/consumers/%s/release" % self.sanitize(consumerId)
-        results = self.conn.request_get(method)
+        results = self.conn.request_get(method, validators=validators)
         return results
 
     def getAvailableReleases(self, consumerId):
@@ -1430,14 +2215,20 @@ class UEPConnection(object):
         method = "/consumers/%s/available_releases" % self.sanitize(consumerId)
         return self.conn.request_get(method)
 
-    def getEntitlementList(self, consumerId, request_certs=False):
+    def getEntitlementList(self, consumerId, request_certs=False, validators=None, stream=False):
+        """
+        If stream is set, an iterator over the entitlements is returned
+        and validators are not used, see Restlib.request_get_iter.
+        """
         method = "/consumers/%s/entitlements" % self.sanitize(consumerId)
         if not request_certs:
             # It is unnecessary to download the certificate and key here
             filters = "?exclude=certificates.key&exclude=certificates.cert"
         else:
             filters = ""
-        results = self.conn.request_get(method + filters)
+        if stream:
+            return self.conn.request_get_iter(method + filters)
+        results = self.conn.request_get(method + filters, validators=validators)
         return results
 
     def getServiceLevelList(self, owner_key):
@@ -1544,12 +2335,15 @@ class UEPConnection(object):
         method = "/status"
         return self.conn.request_get(method)
 
-    def getContentOverrides(self, consumerId):
+    def getContentOverrides(self, consumerId, validators=None):
         """
         Get all the overrides for the specified consumer.
+
+        Returns None when validators are given and the overrides have not
+        changed, see Validators.
         """
         method = "/consumers/%s/content_overrides" % self.sanitize(consumerId)
-        return self.conn.request_get(method)
+        return self.conn.request_get(method, validators=validators)
 
     def setContentOverrides(self, consumerId, overrides):
         """
@@ -109,19 +109,22 @@ class HuffmanNode(object):
         :rtype:         rhsm.huffman.HuffmanNode
         """
         # the counter makes sure that when nodes of equal weight are compared,
-        # the one most recently added gets chosen
+        # the one most recently added gets chosen. Ordering on the plain
+        # weight rather than the node itself avoids a rich comparison call
+        # for every heap operation.
         counter = itertools.count()
         # We use the heapq module to make a min priority queue
-        queue = [(node, next(counter)) for node in nodes]
+        queue = [(node.weight, next(counter), node) for node in nodes]
         heapq.heapify(queue)
         while True:
-            left, count = heapq.heappop(queue)
+            weight, count, left = heapq.heappop(queue)
             try:
-                right, count = heapq.heappop(queue)
+                weight, count, right = heapq.heappop(queue)
             except IndexError:
                 # no more nodes to compare, so a is the root node of the tree
                 return left
-            heapq.heappush(queue, (cls.combine(left, right), next(counter)))
+            parent = cls.combine(left, right)
+            heapq.heappush(queue, (parent.weight, next(counter), parent))
 
     def __lt__(self, other):
         return self.weight < other.weight
@@ -150,3 +153,103 @@ class HuffmanNode(object):
 
     def __repr__(self):
         return 'HuffmanNode(%d, "%s")' % (self.weight, self.value)
+
+
+class HuffmanDecoder(object):
+    """
+    Decodes symbols from a rhsm.bitstream.BitReader using lookup tables built
+    from an existing Huffman tree, instead of matching codes one bit at a time.
+
+    The primary table is indexed by the next TABLE_BITS bits of the stream
+    (or fewer, if no code is that long). Each entry holds the length of the
+    code that starts with those bits along with its value, so a single
+    lookup decodes any code that is no longer than the table index. Codes that
+    are longer share a primary entry per prefix that points to a secondary
+    table built the same way for the remaining bits.
+    """
+
+    TABLE_BITS = 12
+
+    def __init__(self, root, table_bits=None):
+        """
+        :param root:        root node of a Huffman tree, as returned by
+                            HuffmanNode.build_tree
+        :type  root:        rhsm.huffman.HuffmanNode
+        :param table_bits:  maximum number of bits used to index one table
+        :type  table_bits:  int
+        """
+        self.table_bits = table_bits or self.TABLE_BITS
+        self._table = self._build_table(self.leaf_codes(root), self.table_bits)
+
+    @staticmethod
+    def leaf_codes(root):
+        """
+        Walks the tree from the top once, rather than computing each leaf's
+        code from the bottom up as HuffmanNode.code does.
+
+        :param root:    root node of a Huffman tree
+        :type  root:    rhsm.huffman.HuffmanNode
+        :return:        list of (code, length, value) for every leaf, where
+                        code is the leaf's Huffman code as an unsigned int
+        :rtype:         list of tuples
+        """
+        codes = []
+        stack = [(root, 0, 0)]
+        while stack:
+            node, code, length = stack.pop()
+            if node.is_leaf:
+                codes.append((code, length, node.value))
+            else:
+                stack.append((node.left, code << 1, length + 1))
+                stack.append((node.right, (code << 1) | 1, length + 1))
+        return codes
+
+    @classmethod
+    def _build_table(cls, codes, table_bits):
+        """
+        :param codes:       list of (code, length, value) as returned by
+                            leaf_codes, relative to the start of this table
+        :type  codes:       list of tuples
+        :param table_bits:  maximum number of bits used to index the table
+        :type  table_bits:  int
+        :return:            tuple of (index bits, table), where each table
+                            entry is a tuple of (code length, value,
+                            secondary table or None)
+        :rtype:             tuple
+        """
+        bits = min(table_bits, max(length for code, length, value in codes))
+        table = [None] * (1 << bits)
+        long_codes = {}
+        for code, length, value in codes:
+            if length <= bits:
+                shift = bits - length
+                start = code << shift
+                entry = (length, value, None)
+                for index in range(start, start + (1 << shift)):
+                    table[index] = entry
+            else:
+                extra = length - bits
+                long_codes.setdefault(code >> extra, []).append(
+                    (code & ((1 << extra) - 1), extra, value))
+        for prefix, sub_codes in long_codes.items():
+            table[prefix] = (bits, None, cls._build_table(sub_codes, table_bits))
+        return bits, table
+
+    def decode(self, reader):
+        """
+        :param reader:  bit reader with a Huffman code as the next value
+        :type  reader:  rhsm.bitstream.BitReader
+        :return:        value of the leaf whose code was read from the stream
+        :raises:        ValueError if the bits do not form a known code,
+                        EOFError if the stream ends in the middle of a code
+        """
+        bits, table = self._table
+        while True:
+            entry = table[reader.peek(bits)]
+            if entry is None:
+                raise ValueError('invalid Huffman code in bit stream')
+            length, value, sub_table = entry
+            reader.skip(length)
+            if sub_table is None:
+                return value
+            bits, table = sub_table
@@ -16,11 +16,14 @@ from __future__ import print_function, division, absolute_import
 # in this software or its documentation.
 
 import itertools
+import logging
 import zlib
 import six
 
-from rhsm.bitstream import GhettoBitStream
-from rhsm.huffman import HuffmanNode
+from rhsm.bitstream import BitReader, GhettoBitStream
+from rhsm.huffman import HuffmanDecoder, HuffmanNode
+
+log = logging.getLogger(__name__)
 
 # this is the "sentinel" value used for the path node that indicates the end
 # of a path
@@ -57,14 +60,68 @@ class PathTree(object):
                         certificates
         :type  data:    binary string
         """
+        self._matcher = None
         word_leaves, unused_bits = self._unpack_data(data)
-        HuffmanNode.build_tree(word_leaves)
+        word_root = HuffmanNode.build_tree(word_leaves)
+        try:
+            self.path_tree = self._decode_path_tree(word_root, unused_bits)
+        except (ValueError, EOFError) as e:
+            log.debug("Table-driven path tree decoding failed, falling back "
+                      "to bit-by-bit decoding: %s" % e)
+            self.path_tree = self._decode_path_tree_by_bits(word_leaves, unused_bits)
+
+    @classmethod
+    def _decode_path_tree(cls, word_root, data):
+        """
+        Builds the path tree by reading the bit stream through lookup tables
+        made from the word and path node Huffman trees.
+
+        :param word_root:   root of the Huffman tree made from the word list
+        :type  word_root:   rhsm.huffman.HuffmanNode
+        :param data:        bits that were left over after decompressing the
+                            word list
+        :type  data:        binary string
+        :return:            root node of the path tree
+        :rtype:             dict
+        """
+        reader = BitReader(data)
+        path_leaves = cls._generate_path_leaves(reader)
+        path_root = HuffmanNode.build_tree(path_leaves)
+        decode_word = HuffmanDecoder(word_root).decode
+        decode_node = HuffmanDecoder(path_root).decode
+
+        root = {}
+        values = [root] + [leaf.value for leaf in path_leaves]
+        for value in values:
+            while True:
+                word = decode_word(reader)
+                # check for end of node
+                if not word:
+                    break
+                value.setdefault(word, []).append(decode_node(reader))
+        cls._mark_path_ends(values)
+        return root
+
+    @classmethod
+    def _decode_path_tree_by_bits(cls, word_leaves, data):
+        """
+        Builds the path tree by matching Huffman codes one bit at a time. This
+        is much slower than _decode_path_tree and is only kept as a fallback.
+
+        :param word_leaves: leaves of the Huffman tree made from the word list
+        :type  word_leaves: list of HuffmanNode instances
+        :param data:        bits that were left over after decompressing the
+                            word list
+        :type  data:        binary string
+        :return:            root node of the path tree
+        :rtype:             dict
+        """
         word_dict = dict((node.code, node.value) for node in word_leaves)
-        bitstream = GhettoBitStream(unused_bits)
-        path_leaves = self._generate_path_leaves(bitstream)
+        bitstream = GhettoBitStream(data)
+        path_leaves = cls._generate_path_leaves(bitstream)
         HuffmanNode.build_tree(path_leaves)
         path_dict = dict((node.code, node) for node in path_leaves)
-        self.path_tree = self._generate_path_tree(
+        return cls._generate_path_tree(
                 path_dict, path_leaves, word_dict, bitstream)
 
     def match_path(self, path):
@@ -82,7 +139,30 @@ class PathTree(object):
         """
         if not path.startswith('/'):
             raise ValueError('path must start with "/"')
-        return self._traverse_tree(self.path_tree, path.strip('/').split('/'))
+        return self.matcher.match(path.strip('/').split('/'))
+
+    def match_paths(self, paths):
+        """
+        Like match_path, for many paths at once. Paths that share a prefix
+        only have that prefix matched against the tree once.
+
+        :param paths:   absolute paths to match against the tree
+        :type  paths:   iterable of str
+        :return:        list with True for each path that matched, else False
+        :rtype:         list of bool
+        """
+        return [self.match_path(path) for path in paths]
+
+    @property
+    def matcher(self):
+        """
+        :return:    PathMatcher compiled from path_tree the first time it is
+                    needed, and again if path_tree is replaced
+        :rtype:     rhsm.pathtree.PathMatcher
+        """
+        if self._matcher is None or self._matcher.tree is not self.path_tree:
+            self._matcher = PathMatcher(self.path_tree)
+        return self._matcher
 
     def __str__(self):
         paths = []
@@ -193,7 +273,8 @@ class PathTree(object):
                             format, the beginning of this stream defines how
                             many total nodes exist. This method retrieves that
                             value.
-        :type  bitstream:   rhsm.bitstream.GhettoBitStream
+        :type  bitstream:   rhsm.bitstream.GhettoBitStream or
+                            rhsm.bitstream.BitReader
         :return:            number of nodes
         :rtype:             int
         """
@@ -219,7 +300,8 @@ class PathTree(object):
 
         :param bitstream:   stream of bits remaining after decompressing the
                             word list
-        :type  bitstream:   rhsm.bitstream.GhettoBitStream
+        :type  bitstream:   rhsm.bitstream.GhettoBitStream or
+                            rhsm.bitstream.BitReader
         :return:            list of HuffmanNode objects that can be used to
                             build a path tree
         :rtype:             list of HuffmanNode objects
@@ -287,10 +369,138 @@ class PathTree(object):
                     break
                 path_node = cls._get_leaf_from_dict(path_dict, bitstream)
                 value.setdefault(word, []).append(path_node.value)
-        # add the sentinel value that marks this explicitly as the end of a path
-        # there should usually only be one of these nodes
+        cls._mark_path_ends(values)
+        return root
+
+    @staticmethod
+    def _mark_path_ends(values):
+        """
+        Add the sentinel value that marks nodes without children explicitly as
+        the end of a path. There should usually only be one of these nodes.
+
+        :param values:  every node of the path tree
+        :type  values:  list of dicts
+        """
         for value in values:
             if not value:
                 value[PATH_END] = None
 
-        return root
+
+class _MatcherNode(object):
+    """
+    One node of a compiled path tree. Children reached through literal words
+    are kept apart from children reached through "$variable" words, so that
+    matching a word is a dict lookup instead of a scan over every key.
+    """
+
+    __slots__ = ['literal', 'variable', 'is_end']
+
+    def __init__(self):
+        self.literal = {}
+        self.variable = ()
+        self.is_end = False
+
+
+class PathMatcher(object):
+    """
+    Matches paths against a path tree, as built by PathTree, with the same
+    rules as PathTree._traverse_tree.
+
+    Instead of recursing through the tree for every path, the set of tree
+    nodes that can be reached after each path prefix is computed once and
+    remembered, so checking many URLs that share their leading segments only
+    walks the shared part of the tree once.
+    """
+
+    # upper bound on remembered prefixes, to keep memory use predictable
+    MAX_PREFIXES = 10000
+
+    def __init__(self, tree):
+        """
+        :param tree:    root node of a path tree
+        :type  tree:    dict
+        """
+        self.tree = tree
+        self._root = self._compile(tree, {})
+        self._prefixes = {}
+
+    @classmethod
+    def _compile(cls, tree, compiled):
+        """
+        :param tree:        node of a path tree
+        :type  tree:        dict
+        :param compiled:    nodes already compiled, by id of the tree node.
+                            The same dict may be referenced from several
+                            places in a path tree.
+        :type  compiled:    dict
+        :return:            compiled node
+        :rtype:             rhsm.pathtree._MatcherNode
+        """
+        node = compiled.get(id(tree))
+        if node is not None:
+            return node
+        node = compiled[id(tree)] = _MatcherNode()
+        node.is_end = PATH_END in tree
+        variable = []
+        for word, children in six.iteritems(tree):
+            if word == PATH_END:
+                continue
+            children = [cls._compile(child, compiled) for child in children]
+            if word.startswith('$'):
+                variable.extend(children)
+            else:
+                node.literal[word] = children
+        node.variable = tuple(variable)
+        return node
+
+    def _states(self, words, length):
+        """
+        :param words:   path segments
+        :type  words:   list of str
+        :param length:  how many of the segments to consume
+        :type  length:  int
+        :return:        the compiled nodes reachable after consuming the first
+                        length words, or None if one of them is a path end
+        :rtype:         frozenset or None
+        """
+        if length == 0:
+            return None if self._root.is_end else frozenset([self._root])
+        key = tuple(words[:length])
+        try:
+            return self._prefixes[key]
+        except KeyError:
+            pass
+        states = self._states(words, length - 1)
+        if states is not None:
+            word = words[length - 1]
+            next_states = set()
+            for node in states:
+                next_states.update(node.literal.get(word, ()))
+                next_states.update(node.variable)
+            if any(node.is_end for node in next_states):
+                states = None
+            else:
+                states = frozenset(next_states)
+        if len(self._prefixes) >= self.MAX_PREFIXES:
+            self._prefixes.clear()
+        self._prefixes[key] = states
+        return states
+
+    def match(self, words):
+        """
+        :param words:   path segments, as from splitting a path on "/"
+        :type  words:   list of str
+        :return:        True iff a complete path in the tree is a prefix of
+                        words, or words is a "listing" request for a
+                        directory in the tree, else False
+        :rtype:         bool
+        """
+        for length in range(len(words)):
+            states = self._states(words, length)
+            if states is None:
+                return True
+            if not states:
+                return False
+            if words[length] == LISTING and length == len(words) - 1:
+                return True
+        return self._states(words, len(words)) is None
@@ -12,10 +12,14 @@ from __future__ import print_function, division, absolute_import
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 #
+import errno
+import glob
 import logging
+import tempfile
 
 import rpm
 import six
+import os
 import os.path
 from rhsm import ourjson as json
 from rhsm.utils import suppress_output
@@ -49,10 +53,64 @@ class InvalidProfileType(Exception):
     pass
 
 
+def file_fingerprint(patterns):
+    """
+    :param patterns: glob patterns of the files to fingerprint
+    :type patterns: list of str
+    :return: dict of the modification time and size of each file matching
+        patterns, which changes whenever one of the files does
+    :rtype: dict
+    """
+    fingerprint = {}
+    for pattern in patterns:
+        for path in glob.glob(pattern):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            fingerprint[path] = [st.st_mtime, st.st_size]
+    return fingerprint
+
+
+def rpmdb_cookie():
+    """
+    :return: the rpmdb cookie, which changes whenever packages are installed
+        or removed, or None if it is not available
+    :rtype: str
+    """
+    try:
+        return rpm.TransactionSet().dbCookie()
+    except (AttributeError, rpm.error) as err:
+        log.debug("Unable to get the rpmdb cookie: %s" % err)
+        return None
+
+
 class ModulesProfile(object):
+    """
+    Collect information about module streams
+
+    Listing the modules needs the whole dnf sack, which is slow to load,
+    so the list is cached along with the rpmdb cookie and the state of the
+    files it was computed from. As long as none of them changed, the cached
+    list is used.
+    """
+
+    CACHE_FILE = "/var/lib/rhsm/cache/module_profile.json"
+
+    # module state, dnf configuration and repositories the list of modules
+    # depends on, the installed packages are covered by the rpmdb cookie
+    STATE_GLOBS = [
+        "/etc/dnf/modules.d/*.module",
+        "/etc/dnf/modules.defaults.d/*.yaml",
+        "/etc/dnf/dnf.conf",
+        "/etc/dnf/vars/*",
+        "/etc/os-release",
+        "/etc/yum.repos.d/*.repo",
+        "/var/cache/dnf/*/repodata/repomd.xml",
+    ]
 
     def __init__(self):
-        self.content = self.__generate()
+        self.content = self._load()
 
     def __str__(self):
         return str(self.content)
@@ -60,6 +118,46 @@ class ModulesProfile(object):
     def __eq__(self, other):
         return self.content == other.content
 
+    def _load(self):
+        if dnf is None or libdnf is None:
+            return []
+        state = {"rpmdb_cookie": rpmdb_cookie(), "files": file_fingerprint(self.STATE_GLOBS)}
+        cached = self._read_cache()
+        # without the cookie, there is no telling whether packages changed
+        if state["rpmdb_cookie"] is not None and cached is not None and cached.get("state") == state:
+            log.debug("Module state has not changed, using cached module profile")
+            return cached["modules"]
+        modules = self.__generate()
+        self._write_cache(state, modules)
+        return modules
+
+    def _read_cache(self):
+        try:
+            with open(self.CACHE_FILE) as f:
+                return json.loads(f.read())
+        except IOError as err:
+            if err.errno != errno.ENOENT:
+                log.warn("Unable to read module profile cache %s: %s" % (self.CACHE_FILE, err))
+        except ValueError:
+            log.warn("Module profile cache %s is corrupted" % self.CACHE_FILE)
+        return None
+
+    def _write_cache(self, state, modules):
+        try:
+            cache_dir = os.path.dirname(self.CACHE_FILE)
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            fd, temp_path = tempfile.mkstemp(prefix='.module_profile', dir=cache_dir)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(json.dumps({"state": state, "modules": modules}))
+                os.rename(temp_path, self.CACHE_FILE)
+            except Exception:
+                os.unlink(temp_path)
+                raise
+        except (IOError, OSError) as err:
+            log.warn("Unable to write module profile cache %s: %s" % (self.CACHE_FILE, err))
+
     @staticmethod
     def _uniquify(module_list):
         ret = {}
@@ -198,17 +296,31 @@ class EnabledReposProfile(object):
         return self._enabled_repos.content
 
 
+# Only a handful of distinct arches and vendors are shared by all the
+# installed packages, so keep one copy of each.
+_shared_strings = {}
+
+
+def _shared(value):
+    if value is None:
+        return None
+    return _shared_strings.setdefault(value, value)
+
+
 class Package(object):
     """
     Represents a package installed on the system.
     """
+    # there can be thousands of these, keep them small
+    __slots__ = ['name', 'version', 'release', 'arch', 'epoch', 'vendor']
+
     def __init__(self, name, version, release, arch, epoch=0, vendor=None):
         self.name = name
         self.version = version
         self.release = release
-        self.arch = arch
+        self.arch = _shared(arch)
         self.epoch = epoch
-        self.vendor = vendor
+        self.vendor = _shared(vendor)
 
     def to_dict(self):
         """ Returns a dict representation of this packages info. """
@@ -238,6 +350,13 @@ class Package(object):
 
         return False
 
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.name, self.version, self.release, self.arch, self.epoch,
+                     self._normalize_string(self.vendor)))
+
     def __str__(self):
         return "<Package: %s %s %s>" % (self.name, self.version, self.release)
 
@@ -279,31 +398,47 @@ class RPMProfile(object):
             self.packages = self._accumulate_profile(installed)
 
     @staticmethod
-    def _accumulate_profile(rpm_header_list):
+    def _iter_profile(rpm_header_list):
         """
-        Accumulates list of installed rpm info
-        @param rpm_header_list: list of rpm headers
-        @type rpm_header_list: list
-        @return: list of package info dicts
-        @rtype: list
+        Generates installed rpm info one package at a time
+        @param rpm_header_list: iterable of rpm headers
+        @type rpm_header_list: iterable
+        @return: generator of Package objects
+        @rtype: generator
         """
-
-        pkg_list = []
         for h in rpm_header_list:
-            if h['name'] == "gpg-pubkey":
+            name = h['name']
+            if name == "gpg-pubkey":
                 # dbMatch includes imported gpg keys as well
                 # skip these for now as there isn't compelling
                 # reason for server to know this info
                 continue
-            pkg_list.append(Package(
-                name=h['name'],
+            yield Package(
+                name=name,
                 version=h['version'],
                 release=h['release'],
                 arch=h['arch'],
                 epoch=h['epoch'] or 0,
                 vendor=h['vendor'] or None
-            ))
-        return pkg_list
+            )
+
+    @staticmethod
+    def _accumulate_profile(rpm_header_list):
+        """
+        Accumulates list of installed rpm info
+        @param rpm_header_list: list of rpm headers
+        @type rpm_header_list: list
+        @return: list of Package objects
+        @rtype: list
+        """
+        return list(RPMProfile._iter_profile(rpm_header_list))
+
+    def iter_collect(self):
+        """
+        Generates the dicts returned by collect() one package at a time.
+        """
+        for pkg in self.packages:
+            yield pkg.to_dict()
 
     def collect(self):
         """
@@ -314,10 +449,7 @@ class RPMProfile(object):
         @return : list of package info dicts
         @rtype: list
         """
-        pkg_dicts = []
-        for pkg in self.packages:
-            pkg_dicts.append(pkg.to_dict())
-        return pkg_dicts
+        return list(self.iter_collect())
 
     def __eq__(self, other):
         """
@@ -331,11 +463,8 @@ class RPMProfile(object):
         if len(self.packages) != len(other.packages):
             return False
 
-        for pkg in self.packages:
-            if pkg not in other.packages:
-                return False
-
-        return True
+        other_packages = set(other.packages)
+        return all(pkg in other_packages for pkg in self.packages)
 
 
 def get_profile(profile_type):
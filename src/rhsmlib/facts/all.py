@@ -12,23 +12,128 @@ from __future__ import print_function, division, absolute_import
 # have received a copy of GPLv2 along with this software; if not, see
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 #
+import logging
+import sys
+import threading
+import time
+
+import six
+
+from rhsm.config import initConfig
+from rhsmlib.facts import cache
 from rhsmlib.facts import collector
 from rhsmlib.facts import custom
 from rhsmlib.facts import host_collector
 from rhsmlib.facts import hwprobe
 
+log = logging.getLogger(__name__)
+
+DEFAULT_COLLECTOR_TIMEOUT = 60
+
 
 class AllFactsCollector(collector.FactsCollector):
-    def __init__(self):
+    """
+    Runs all the other facts collectors at the same time, each of them for
+    at most timeout seconds (fact_collector_timeout in rhsm.conf by
+    default). The facts of a collector that takes longer are left out, and
+    the collector is listed in timed_out. A timeout of 0 runs the
+    collectors one after another without a time limit.
+
+    How long each collector took is kept in timings, and the names of the
+    facts each collector returned in fact_cache, see
+    get_timed_out_fact_names().
+
+    Facts that rarely change are reused from fact_cache, see
+    rhsmlib.facts.cache.FactsCache.
+    """
+    def __init__(self, timeout=None, fact_cache=None):
         self.collectors = [
             collector.StaticFactsCollector(),
             host_collector.HostCollector(),
             hwprobe.HardwareCollector(),
             custom.CustomFactsCollector(),
         ]
+        self.timeout = timeout
+        self.fact_cache = fact_cache or cache.FactsCache()
+        for fact_collector in self.collectors:
+            fact_collector.fact_cache = self.fact_cache
+        self.timings = {}
+        self.timed_out = []
+
+    def _get_timeout(self):
+        if self.timeout is not None:
+            return self.timeout
+        try:
+            timeout = initConfig().get_int('rhsm', 'fact_collector_timeout')
+        except ValueError as e:
+            log.warn("Invalid fact_collector_timeout: %s" % e)
+            timeout = None
+        if timeout is None or timeout < 0:
+            return DEFAULT_COLLECTOR_TIMEOUT
+        return timeout
+
+    def _collect(self, fact_collector, results, errors):
+        start = time.time()
+        try:
+            results[fact_collector] = fact_collector.get_cached_all()
+        except Exception:
+            errors.append(sys.exc_info())
+        finally:
+            self.timings[fact_collector.__class__.__name__] = time.time() - start
+
+    def get_timed_out_fact_names(self):
+        """
+        :return: the names of the facts the collectors in timed_out
+            returned the last time they finished
+        """
+        names = set()
+        for name in self.timed_out:
+            names.update(self.fact_cache.get_fact_names(name))
+        return names
 
     def get_all(self):
+        self.timings = {}
+        self.timed_out = []
         results = {}
+        errors = []
+        timeout = self._get_timeout()
+
+        if timeout == 0:
+            for fact_collector in self.collectors:
+                self._collect(fact_collector, results, errors)
+                if errors:
+                    six.reraise(*errors[0])
+        else:
+            threads = []
+            for fact_collector in self.collectors:
+                thread = threading.Thread(target=self._collect, args=[fact_collector, results, errors],
+                                          name="FactsCollector-%s" % fact_collector.__class__.__name__)
+                thread.daemon = True
+                thread.start()
+                threads.append((fact_collector, thread))
+
+            deadline = time.time() + timeout
+            for fact_collector, thread in threads:
+                thread.join(max(0, deadline - time.time()))
+                if thread.is_alive():
+                    name = fact_collector.__class__.__name__
+                    log.warn("Facts collector %s did not finish in %s seconds, leaving out its facts" %
+                             (name, timeout))
+                    self.timed_out.append(name)
+            if errors:
+                six.reraise(*errors[0])
+
+        all_facts = {}
         for fact_collector in self.collectors:
-            results.update(fact_collector.get_all())
-        return results
+            name = fact_collector.__class__.__name__
+            # a collector that timed out could still finish while we merge
+            if name not in self.timed_out:
+                facts = results.get(fact_collector, {})
+                all_facts.update(facts)
+                self.fact_cache.set_fact_names(name, facts.keys())
+
+        self.fact_cache.save()
+
+        log.debug("Facts collector timings: %s" % ", ".join(
+            "%s %.3fs" % (name, seconds) for name, seconds in sorted(self.timings.items())))
+        return all_facts
@@ -0,0 +1,210 @@
+from __future__ import print_function, division, absolute_import
+
+# Copyright (c) 2026 Red Hat, Inc.
+#
+# This software is licensed to you under the GNU General Public License,
+# version 2 (GPLv2). There is NO WARRANTY for this software, express or
+# implied, including the implied warranties of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. You should have received a copy of GPLv2
+# along with this software; if not, see
+# http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
+#
+# Red Hat trademarks are not licensed under GPLv2. No permission is
+# granted to use or replicate Red Hat trademarks that are incorporated
+# in this software or its documentation.
+#
+import errno
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from rhsm import ourjson as json
+from rhsm.profile import file_fingerprint
+from rhsmlib.facts import collector
+
+log = logging.getLogger(__name__)
+
+
+class FactsCache(object):
+    """
+    Keeps the facts of collectors (or of single collector methods) between
+    runs, so facts that rarely change are not collected every time.
+
+    How long an entry stays valid depends on its volatility:
+        collector.ALWAYS: never cached
+        collector.PERIODIC: for PERIODIC_MAX_AGE seconds
+        collector.BOOT_STABLE: until the next boot
+
+    and in both cases only as long as the files the facts come from and
+    the number of cpus are unchanged. New entries are kept in memory until
+    save() is called. When another process rewrites or deletes the cache
+    file, e.g. "subscription-manager facts --update" while rhsmd keeps its
+    cache, the entries are read again and the unsaved ones are dropped.
+
+    The names of the facts each collector returned are kept too, so the
+    facts of a collector that timed out can be told apart from the others.
+    """
+    CACHE_FILE = "/var/lib/rhsm/facts/collector_cache.json"
+    BOOT_ID_FILE = "/proc/sys/kernel/random/boot_id"
+    PERIODIC_MAX_AGE = 24 * 60 * 60
+    # entry with the names of the facts each collector returned last time
+    FACT_NAMES_KEY = "fact_names"
+
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file or self.CACHE_FILE
+        self._lock = threading.Lock()
+        self._entries = None
+        self._dirty = False
+        # stat of the cache file when last read or written, see _load
+        self._file_state = None
+        self._boot_id = None
+
+    def boot_id(self):
+        if self._boot_id is None:
+            try:
+                with open(self.BOOT_ID_FILE) as f:
+                    self._boot_id = f.read().strip()
+            except IOError as e:
+                log.debug("Unable to read boot id: %s" % e)
+                self._boot_id = ''
+        return self._boot_id
+
+    def _cpu_count(self, name):
+        try:
+            return os.sysconf(name)
+        except (ValueError, OSError):
+            return None
+
+    def _state(self, files):
+        # cpus can be hot plugged without a reboot
+        return {
+            'boot_id': self.boot_id(),
+            'cpu_count': [self._cpu_count('SC_NPROCESSORS_CONF'), self._cpu_count('SC_NPROCESSORS_ONLN')],
+            'files': file_fingerprint(files),
+        }
+
+    def _stat_cache_file(self):
+        try:
+            st = os.stat(self.cache_file)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime)
+
+    def _load(self):
+        file_state = self._stat_cache_file()
+        if self._entries is not None and file_state == self._file_state:
+            return
+        self._entries = {}
+        self._dirty = False
+        self._file_state = file_state
+        try:
+            with open(self.cache_file) as f:
+                entries = json.loads(f.read())
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                log.warn("Unable to read facts cache %s: %s" % (self.cache_file, e))
+            return
+        except ValueError as e:
+            log.warn("Ignoring invalid facts cache %s: %s" % (self.cache_file, e))
+            return
+        if isinstance(entries, dict):
+            self._entries = entries
+
+    def _is_valid(self, entry, volatility, state):
+        if entry.get('volatility') != volatility or entry.get('state') != state:
+            return False
+        if volatility == collector.PERIODIC:
+            age = time.time() - entry.get('timestamp', 0)
+            return 0 <= age < self.PERIODIC_MAX_AGE
+        return True
+
+    def get(self, key, volatility, files, collect):
+        """
+        :param key: name of the cache entry, ie the collector class name
+        :param volatility: collector.ALWAYS, collector.PERIODIC or
+            collector.BOOT_STABLE
+        :param files: glob patterns of the files the facts are read from
+        :param collect: function that collects the facts
+        :return: the cached facts while they are valid, otherwise the result
+            of collect(), which is cached for the next time
+        """
+        if volatility == collector.ALWAYS:
+            return collect()
+        # there is no way to tell whether the system was rebooted
+        if volatility == collector.BOOT_STABLE and not self.boot_id():
+            return collect()
+
+        state = self._state(files)
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+        if entry is not None and self._is_valid(entry, volatility, state):
+            log.debug("Using cached facts for %s" % key)
+            return dict(entry['facts'])
+
+        facts = collect()
+        # an empty result is likely a failure, try again next time
+        if facts:
+            with self._lock:
+                self._entries[key] = {
+                    'volatility': volatility,
+                    'state': state,
+                    'timestamp': time.time(),
+                    'facts': dict(facts),
+                }
+                self._dirty = True
+        return facts
+
+    def get_fact_names(self, key):
+        """
+        :param key: collector class name
+        :return: the names of the facts the collector returned the last
+            time it finished, or an empty list if it never did
+        """
+        with self._lock:
+            self._load()
+            return list(self._entries.get(self.FACT_NAMES_KEY, {}).get(key, []))
+
+    def set_fact_names(self, key, names):
+        names = sorted(names)
+        with self._lock:
+            self._load()
+            fact_names = self._entries.setdefault(self.FACT_NAMES_KEY, {})
+            if fact_names.get(key) != names:
+                fact_names[key] = names
+                self._dirty = True
+
+    def save(self):
+        """Writes the facts collected since the cache was loaded."""
+        with self._lock:
+            self._load()
+            if not self._dirty:
+                return
+            directory = os.path.dirname(self.cache_file)
+            try:
+                if not os.access(directory, os.R_OK):
+                    os.makedirs(directory)
+                fd, temp_path = tempfile.mkstemp(prefix='.collector_cache', dir=directory)
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump(self._entries, f, default=json.encode)
+                    os.rename(temp_path, self.cache_file)
+                except Exception:
+                    os.unlink(temp_path)
+                    raise
+                self._dirty = False
+                self._file_state = self._stat_cache_file()
+            except (IOError, OSError) as e:
+                log.warn("Unable to write facts cache %s: %s" % (self.cache_file, e))
+
+    def delete(self):
+        with self._lock:
+            self._entries = None
+            self._dirty = False
+            try:
+                os.unlink(self.cache_file)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    log.warn("Unable to delete facts cache %s: %s" % (self.cache_file, e))
@@ -55,10 +55,29 @@ def get_arch(prefix=None):
         log.exception(e)
         raise
 
+
+# How long the facts of a collector stay valid, see rhsmlib.facts.cache:
+# collected every time
+ALWAYS = "always"
+# reused for a while, as long as the files they come from do not change
+PERIODIC = "periodic"
+# reused until the system is rebooted or the files they come from change
+BOOT_STABLE = "boot-stable"
+
 # An empty FactsCollector should just return an empty dict on get_all()
 
 
 class FactsCollector(object):
+    # volatility of the facts returned by get_all(), and the files they
+    # are read from
+    volatility = ALWAYS
+    volatility_files = []
+    # volatility of the facts of single hardware methods, maps method name
+    # to (volatility, files)
+    method_volatility = {}
+    # a rhsmlib.facts.cache.FactsCache to reuse facts from, if any
+    fact_cache = None
+
     def __init__(self, arch=None, prefix=None, testing=None,
                  hardware_methods=None, collected_hw_info=None):
         """Base class for facts collecting classes.
@@ -87,6 +106,25 @@ class FactsCollector(object):
         facts_collection = collection.FactsCollection(facts_dict=facts_dict)
         return facts_collection
 
+    def _use_fact_cache(self):
+        # facts read from a prefix or test data are never cached
+        return self.fact_cache is not None and not self.prefix and not self.testing
+
+    def get_cached_all(self):
+        """Like get_all(), but reuses cached facts while they are valid."""
+        if self.volatility == ALWAYS or not self._use_fact_cache():
+            return self.get_all()
+        return self.fact_cache.get(self.__class__.__name__, self.volatility,
+                                   self.volatility_files, self.get_all)
+
+    def _run_hardware_method(self, hardware_method):
+        name = hardware_method.__name__
+        if not self._use_fact_cache() or name not in self.method_volatility:
+            return hardware_method()
+        volatility, files = self.method_volatility[name]
+        return self.fact_cache.get("%s.%s" % (self.__class__.__name__, name),
+                                   volatility, files, hardware_method)
+
     def get_all(self):
         # try each hardware method, and try/except around, since
         # these tend to be fragile
@@ -94,7 +132,7 @@ class FactsCollector(object):
         for hardware_method in self.hardware_methods:
             info_dict = {}
             try:
-                info_dict = hardware_method()
+                info_dict = self._run_hardware_method(hardware_method)
             except Exception as e:
                 log.warn("Hardware detection [%s] failed: %s" % (hardware_method.__name__, e))
 
@@ -40,6 +40,9 @@ class NullFirmwareInfoCollector(object):
 
 
 class FirmwareCollector(collector.FactsCollector):
+    # DMI and device tree data only change with the hardware
+    volatility = collector.BOOT_STABLE
+
     def __init__(self, prefix=None, testing=None, collected_hw_info=None):
         super(FirmwareCollector, self).__init__(
             prefix=prefix,
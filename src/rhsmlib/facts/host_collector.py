@@ -52,14 +52,16 @@ class HostCollector(collector.FactsCollector):
             prefix=self.prefix,
             testing=self.testing,
         )
-        firmware_info_dict = firmware_collector.get_all()
+        firmware_collector.fact_cache = self.fact_cache
+        firmware_info_dict = firmware_collector.get_cached_all()
 
         virt_collector = virt.VirtCollector(
             prefix=self.prefix,
             testing=self.testing,
             collected_hw_info=firmware_info_dict
         )
-        virt_collector_info = virt_collector.get_all()
+        virt_collector.fact_cache = self.fact_cache
+        virt_collector_info = virt_collector.get_cached_all()
 
         host_facts.update(virt_collector_info)
         host_facts.update(firmware_info_dict)
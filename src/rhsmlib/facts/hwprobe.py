@@ -18,6 +18,7 @@ from __future__ import print_function, division, absolute_import
 # granted to use or replicate Red Hat trademarks that are incorporated
 # in this software or its documentation.
 #
+import fnmatch
 import logging
 import os
 import platform
@@ -25,6 +26,7 @@ import re
 import socket
 import sys
 
+from rhsm.config import initConfig
 from rhsmlib.facts import cpuinfo
 from rhsmlib.facts import collector
 
@@ -42,6 +44,17 @@ from rhsmlib.compat import check_output as compat_check_output
 from subprocess import CalledProcessError
 
 
+# cpu.* topology facts and the lscpu.* facts lscpu reports them as
+LSCPU_TOPOLOGY_FACTS = [
+    ('cpu.cpu(s)', 'lscpu.cpu(s)'),
+    ('cpu.thread(s)_per_core', 'lscpu.thread(s)_per_core'),
+    ('cpu.core(s)_per_socket', 'lscpu.core(s)_per_socket'),
+    ('cpu.cpu_socket(s)', 'lscpu.socket(s)'),
+    ('cpu.socket(s)_per_book', 'lscpu.socket(s)_per_book'),
+    ('cpu.book(s)', 'lscpu.book(s)'),
+]
+
+
 class ClassicCheck(object):
     def is_registered_with_classic(self):
         try:
@@ -82,6 +95,86 @@ def gather_entries(entries_string):
     return entries
 
 
+def dir_entries(path):
+    """
+    Returns (name, is_dir) for each entry of the directory path. Uses
+    os.scandir when available, which gets both from a single directory
+    read without a stat() per entry.
+    """
+    if hasattr(os, 'scandir'):
+        return [(entry.name, entry.is_dir()) for entry in os.scandir(path)]
+    return [(name, os.path.isdir(os.path.join(path, name))) for name in os.listdir(path)]
+
+
+class CpuTopology(object):
+    """
+    The cpus of a system and their topology, as found in
+    /sys/devices/system/cpu/cpuN/topology/.
+
+    The cpu directories and the topology directory of each cpu are listed
+    once, when the topology is created. The topology files are only read
+    when asked for, and at most once.
+    """
+    # we also have cpufreq, etc in this dir, so match just the numbs
+    cpu_re = re.compile(r'cpu([0-9]+$)')
+
+    def __init__(self, sys_cpu_path):
+        self.sys_cpu_path = sys_cpu_path
+        # cpu directories with topology info, ordered by cpu number
+        self.cpu_files = []
+        self._topology_files = {}
+        self._contents = {}
+
+        cpus = []
+        for name, is_dir in dir_entries(sys_cpu_path):
+            match = self.cpu_re.match(name)
+            if not match or not is_dir:
+                continue
+            cpu_file = os.path.join(sys_cpu_path, name)
+            # see rhbz#1070908
+            # ppc64 machines running on LPARs will add
+            # a sys cpu entry for every cpu thread on the
+            # physical machine, regardless of how many are
+            # allocated to the LPAR. This throws off the cpu
+            # thread count, which throws off the cpu socket count.
+            # The entries for the unallocated or offline cpus
+            # do not have topology info however.
+            # So, skip sys cpu entries without topology info.
+            #
+            # NOTE: this assumes RHEL6+, prior to rhel5, on
+            # some arches like ppc and s390, there is no topology
+            # info ever, so this will break.
+            try:
+                topology_files = set(entry for entry, entry_is_dir in
+                                     dir_entries(os.path.join(cpu_file, "topology")))
+            except OSError:
+                continue
+            cpus.append((int(match.group(1)), name, cpu_file))
+            self._topology_files[cpu_file] = topology_files
+
+        self.cpu_files = [cpu_file for number, name, cpu_file in sorted(cpus)]
+
+    def read(self, cpu_file, field):
+        """
+        Returns the content of the topology file field of the cpu, or None
+        if the cpu has no such file.
+        """
+        key = (cpu_file, field)
+        if key not in self._contents:
+            entries = None
+            if field in self._topology_files.get(cpu_file, ()):
+                try:
+                    with open(os.path.join(cpu_file, "topology", field), 'r') as f:
+                        # ia64 entries seem to be null padded, or perhaps
+                        # that's a collection error
+                        # FIXME
+                        entries = f.read().rstrip('\n\x00')
+                except IOError:
+                    pass
+            self._contents[key] = entries
+        return self._contents[key]
+
+
 class GenericPlatformSpecificInfoProvider(object):
     """Default provider for platform without a specific platform info provider.
     ie, all platforms except those with DMI (ie, intel platforms)"""
@@ -94,6 +187,16 @@ class GenericPlatformSpecificInfoProvider(object):
 
 
 class HardwareCollector(collector.FactsCollector):
+    # memory and network facts are collected every time
+    method_volatility = {
+        'get_release_info': (collector.BOOT_STABLE, ['/etc/os-release', '/etc/redhat-release']),
+        'get_proc_cpuinfo': (collector.BOOT_STABLE, []),
+        'get_proc_stat': (collector.BOOT_STABLE, []),
+        'get_cpu_info': (collector.BOOT_STABLE, []),
+        # includes the current cpu frequency
+        'get_ls_cpu_info': (collector.PERIODIC, []),
+    }
+
     def __init__(self, arch=None, prefix=None, testing=None, collected_hw_info=None):
         super(HardwareCollector, self).__init__(
             arch=arch,
@@ -113,6 +216,27 @@ class HardwareCollector(collector.FactsCollector):
             self.get_network_info,
             self.get_network_interfaces,
         ]
+        self._cpu_topology = None
+        self._interfaces_info = None
+        # slave -> permanent hw address for each bonding master read
+        self._bonding_slaves = {}
+
+    def get_all(self):
+        # the cpu topology and network interfaces are read once per
+        # collection and shared by the methods that need them
+        self._cpu_topology = None
+        self._interfaces_info = None
+        return super(HardwareCollector, self).get_all()
+
+    def get_cpu_topology(self):
+        if self._cpu_topology is None:
+            self._cpu_topology = CpuTopology(self.prefix + "/sys/devices/system/cpu/")
+        return self._cpu_topology
+
+    def get_interfaces_info(self):
+        if self._interfaces_info is None:
+            self._interfaces_info = ethtool.get_interfaces_info(self._get_network_devices())
+        return self._interfaces_info
 
     def get_uname_info(self):
         uname_info = {}
@@ -220,21 +344,12 @@ class HardwareCollector(collector.FactsCollector):
         return meminfo
 
     def count_cpumask_entries(self, cpu, field):
-        try:
-            f = open("%s/topology/%s" % (cpu, field), 'r')
-        except IOError:
-            return None
-
-        # ia64 entries seem to be null padded, or perhaps
-        # that's a collection error
-        # FIXME
-        entries = f.read().rstrip('\n\x00')
-        f.close()
+        entries = self.get_cpu_topology().read(cpu, field)
         # these fields can exist, but be empty. For example,
         # thread_siblings_list from s390x-rhel64-zvm-2cpu-has-topo
         # test data
 
-        if len(entries):
+        if entries:
             cpumask_entries = gather_entries(entries)
             return len(cpumask_entries)
         # that field was empty
@@ -329,9 +444,6 @@ class HardwareCollector(collector.FactsCollector):
 
         return None
 
-    def check_for_cpu_topo(self, cpu_topo_dir):
-        return os.access(cpu_topo_dir, os.R_OK)
-
     def get_proc_cpuinfo(self):
         proc_cpuinfo = {}
         fact_namespace = 'proc_cpuinfo'
@@ -373,30 +485,7 @@ class HardwareCollector(collector.FactsCollector):
 
     def get_cpu_info(self):
         cpu_info = {}
-        # we also have cpufreq, etc in this dir, so match just the numbs
-        cpu_re = r'cpu([0-9]+$)'
-
-        cpu_files = []
-        sys_cpu_path = self.prefix + "/sys/devices/system/cpu/"
-        for cpu in os.listdir(sys_cpu_path):
-            if re.match(cpu_re, cpu):
-                cpu_topo_dir = os.path.join(sys_cpu_path, cpu, "topology")
-
-                # see rhbz#1070908
-                # ppc64 machines running on LPARs will add
-                # a sys cpu entry for every cpu thread on the
-                # physical machine, regardless of how many are
-                # allocated to the LPAR. This throws off the cpu
-                # thread count, which throws off the cpu socket count.
-                # The entries for the unallocated or offline cpus
-                # do not have topology info however.
-                # So, skip sys cpu entries without topology info.
-                #
-                # NOTE: this assumes RHEL6+, prior to rhel5, on
-                # some arches like ppc and s390, there is no topology
-                # info ever, so this will break.
-                if self.check_for_cpu_topo(cpu_topo_dir):
-                    cpu_files.append("%s/%s" % (sys_cpu_path, cpu))
+        cpu_files = self.get_cpu_topology().cpu_files
 
         # for systems with no cpus
         if not cpu_files:
@@ -533,6 +622,31 @@ class HardwareCollector(collector.FactsCollector):
 
         return cpu_info
 
+    def get_lscpu_topology_info(self):
+        """
+        The cpu topology facts lscpu would have reported, derived from the
+        same /sys cpu topology as the cpu.* facts. Used when lscpu is not
+        available or fails.
+        """
+        lscpu_info = {}
+        try:
+            cpu_info = self.get_cpu_info()
+            cpu_files = self.get_cpu_topology().cpu_files
+        except Exception as e:
+            log.debug("Could not gather cpu topology for lscpu facts: %s", e)
+            return lscpu_info
+
+        for cpu_key, lscpu_key in LSCPU_TOPOLOGY_FACTS:
+            if cpu_key in cpu_info:
+                lscpu_info[lscpu_key] = "%s" % cpu_info[cpu_key]
+
+        # s390x can group books into drawers
+        if cpu_files:
+            drawer_siblings_per_cpu = self.count_cpumask_entries(cpu_files[0], 'drawer_siblings_list')
+            if drawer_siblings_per_cpu:
+                lscpu_info['lscpu.drawer(s)'] = "%s" % (len(cpu_files) // drawer_siblings_per_cpu)
+        return lscpu_info
+
     def get_ls_cpu_info(self):
         lscpu_info = {}
 
@@ -541,7 +655,7 @@ class HardwareCollector(collector.FactsCollector):
         # if we have `lscpu`, let's use it for facts as well, under
         # the `lscpu` name space
         if not os.access(LSCPU_CMD, os.R_OK):
-            return lscpu_info
+            return self.get_lscpu_topology_info()
 
         # copy of parent process environment
         lscpu_env = dict(os.environ)
@@ -562,7 +676,7 @@ class HardwareCollector(collector.FactsCollector):
         except CalledProcessError as e:
             log.exception(e)
             log.warning('Error with lscpu (%s) subprocess: %s', lscpu_cmd_string, e)
-            return lscpu_info
+            return self.get_lscpu_topology_info()
 
         errors = []
         try:
@@ -592,7 +706,7 @@ class HardwareCollector(collector.FactsCollector):
         :return: list of IPv4 addresses
         """
         addr_list = []
-        interface_info = ethtool.get_interfaces_info(ethtool.get_devices())
+        interface_info = self.get_interfaces_info()
         for info in interface_info:
             for addr in info.get_ipv4_addresses():
                 if addr.address != '127.0.0.1':
@@ -609,7 +723,7 @@ class HardwareCollector(collector.FactsCollector):
         :return: list of IPv6 addresses
         """
         addr_list = []
-        interface_info = ethtool.get_interfaces_info(ethtool.get_devices())
+        interface_info = self.get_interfaces_info()
         for info in interface_info:
             for addr in info.get_ipv6_addresses():
                 if addr.scope == 'universe':
@@ -673,6 +787,36 @@ class HardwareCollector(collector.FactsCollector):
 
         return net_info
 
+    def _get_skipped_interfaces(self):
+        """
+        Returns the glob patterns of the skip_network_interfaces option in
+        rhsm.conf, for interfaces that should not be reported.
+        """
+        try:
+            patterns = initConfig().get('rhsm', 'skip_network_interfaces')
+        except Exception as e:
+            log.debug("Unable to read skip_network_interfaces: %s", e)
+            return []
+        return [pattern.strip() for pattern in (patterns or '').split(',') if pattern.strip()]
+
+    def _get_network_devices(self):
+        """
+        Returns the network devices to report facts about, all of them but
+        the ones matching skip_network_interfaces. Skipping them before
+        asking ethtool for their info saves querying every container veth
+        and the like.
+        """
+        devices = ethtool.get_devices()
+        patterns = self._get_skipped_interfaces()
+        if not patterns:
+            return devices
+        reported = [device for device in devices
+                    if not any(fnmatch.fnmatchcase(device, pattern) for pattern in patterns)]
+        if len(reported) != len(devices):
+            log.debug("Skipping %d network interfaces matching skip_network_interfaces",
+                      len(devices) - len(reported))
+        return reported
+
     def _should_get_mac_address(self, device):
         return not (device.startswith('sit') or device.startswith('lo'))
 
@@ -681,8 +825,9 @@ class HardwareCollector(collector.FactsCollector):
         old_ipv4_metakeys = ['ipv4_address', 'ipv4_netmask', 'ipv4_broadcast']
         ipv4_metakeys = ['address', 'netmask', 'broadcast']
         ipv6_metakeys = ['address', 'netmask']
+        self._bonding_slaves = {}
         try:
-            interfaces_info = ethtool.get_interfaces_info(ethtool.get_devices())
+            interfaces_info = self.get_interfaces_info()
             for info in interfaces_info:
                 mac_address = info.mac_address
                 device = info.device
@@ -775,26 +920,34 @@ class HardwareCollector(collector.FactsCollector):
 
     # from rhn-client-tools  hardware.py
     # see bz#785666
-    def _get_slave_hwaddr(self, master, slave):
-        hwaddr = ""
+    def _read_bonding_slaves(self, master):
+        """
+        Returns a dict of the permanent hw address of each slave of the
+        bonding master, read from /proc/net/bonding once for all the slaves.
+        """
+        if master in self._bonding_slaves:
+            return self._bonding_slaves[master]
+
+        slaves = {}
         try:
             bonding = open('/proc/net/bonding/%s' % master, "r")
-        except:
-            return hwaddr
-
-        slave_found = False
-        for line in bonding.readlines():
-            if slave_found and line.find("Permanent HW addr: ") != -1:
-                hwaddr = line.split()[3].upper()
-                break
-
-            if line.find("Slave Interface: ") != -1:
-                ifname = line.split()[2]
-                if ifname == slave:
-                    slave_found = True
-
-        bonding.close()
-        return hwaddr
+        except IOError:
+            bonding = None
+
+        if bonding is not None:
+            slave = None
+            for line in bonding.readlines():
+                if line.find("Slave Interface: ") != -1:
+                    slave = line.split()[2]
+                elif slave is not None and slave not in slaves and line.find("Permanent HW addr: ") != -1:
+                    slaves[slave] = line.split()[3].upper()
+            bonding.close()
+
+        self._bonding_slaves[master] = slaves
+        return slaves
+
+    def _get_slave_hwaddr(self, master, slave):
+        return self._read_bonding_slaves(master).get(slave, "")
 
 
 if __name__ == '__main__':
@@ -139,6 +139,8 @@ class VirtUuidCollector(collector.FactsCollector):
 
 
 class VirtCollector(collector.FactsCollector):
+    volatility = collector.BOOT_STABLE
+
     def get_all(self):
         virt_info = {}
 
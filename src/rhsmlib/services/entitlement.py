@@ -253,16 +253,33 @@ class EntitlementService(object):
 
     def get_available_pools(self, show_all=None, on_date=None, no_overlap=None,
                             match_installed=None, matches=None, service_level=None, future=None,
-                            after_date=None):
-        available_pools = managerlib.get_available_entitlements(
-            get_all=show_all,
-            active_on=on_date,
-            overlapping=no_overlap,
-            uninstalled=match_installed,
-            filter_string=matches,
-            future=future,
-            after_date=after_date,
-        )
+                            after_date=None, page_size=None):
+        """
+        Returns a list of the available pools. If page_size is given, the
+        pools are requested from the server page_size at a time, and an
+        iterator yielding them as they arrive is returned instead.
+        """
+        if page_size:
+            available_pools = managerlib.iter_available_entitlements(
+                get_all=show_all,
+                active_on=on_date,
+                overlapping=no_overlap,
+                uninstalled=match_installed,
+                filter_string=matches,
+                future=future,
+                after_date=after_date,
+                page_size=page_size,
+            )
+        else:
+            available_pools = managerlib.get_available_entitlements(
+                get_all=show_all,
+                active_on=on_date,
+                overlapping=no_overlap,
+                uninstalled=match_installed,
+                filter_string=matches,
+                future=future,
+                after_date=after_date,
+            )
 
         def filter_pool_by_service_level(pool_data):
             pool_level = ""
@@ -271,6 +288,8 @@ class EntitlementService(object):
             return service_level.lower() == pool_level.lower()
 
         if service_level is not None:
+            if page_size:
+                return (pool for pool in available_pools if filter_pool_by_service_level(pool))
             available_pools = list(filter(filter_pool_by_service_level, available_pools))
 
         return available_pools
@@ -38,9 +38,10 @@ class Syspurpose(object):
         self.identity = inj.require(inj.IDENTITY)
         self.purpose_status = {'status': 'unknown'}
 
-    def get_syspurpose_status(self, on_date=None):
+    def get_syspurpose_status(self, on_date=None, validators=None):
         if self.identity.is_valid() and self.cp.has_capability("syspurpose"):
-            self.purpose_status = self.cp.getSyspurposeCompliance(self.identity.uuid, on_date)
+            self.purpose_status = self.cp.getSyspurposeCompliance(self.identity.uuid, on_date,
+                                                                  validators=validators)
         return self.purpose_status
 
     def get_overall_status(self, status):
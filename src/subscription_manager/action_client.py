@@ -38,7 +38,6 @@ class ActionClient(base_action_client.BaseActionClient):
 
     def _get_libset(self):
 
-        # TODO: replace with FSM thats progress through this async and wait/joins if needed
         self.entcertlib = EntCertActionInvoker()
         self.content_client = ContentActionClient()
         self.factlib = FactsActionInvoker()
@@ -56,6 +55,21 @@ class ActionClient(base_action_client.BaseActionClient):
 
         return lib_set
 
+    def _get_dependencies(self):
+        # Everything talks to the server with the identity cert, so wait for
+        # it to be regenerated if need be. The repos are generated from the
+        # entitlement certs, and the package profile reports which of them
+        # are enabled. The other uploads do not depend on each other.
+        return {
+            self.entcertlib: [],
+            self.idcertlib: [self.entcertlib],
+            self.content_client: [self.entcertlib, self.idcertlib],
+            self.factlib: [self.idcertlib],
+            self.profilelib: [self.idcertlib, self.content_client],
+            self.installedprodlib: [self.idcertlib],
+            self.syspurposelib: [self.idcertlib],
+        }
+
 
 class HealingActionClient(base_action_client.BaseActionClient):
     def _get_libset(self):
@@ -69,6 +83,16 @@ class HealingActionClient(base_action_client.BaseActionClient):
 
         return lib_set
 
+    def _get_dependencies(self):
+        # autoheal uses the installed products and syspurpose we report, and
+        # its new entitlements are then fetched
+        return {
+            self.installedprodlib: [],
+            self.syspurposelib: [],
+            self.healinglib: [self.installedprodlib, self.syspurposelib],
+            self.entcertlib: [self.healinglib],
+        }
+
 
 # it may make more sense to have *Lib.cleanup actions?
 # *Lib things are weird, since some are idempotent, but
@@ -16,6 +16,11 @@ from __future__ import print_function, division, absolute_import
 # in this software or its documentation.
 #
 import logging
+import sys
+import threading
+
+import six
+from six.moves import queue
 
 from subscription_manager import injection as inj
 
@@ -24,14 +29,99 @@ from rhsm.connection import GoneException, ExpiredIdentityCertException
 log = logging.getLogger(__name__)
 
 
+class UpdateScheduler(object):
+    """
+    Runs the update of each lib in a libset once every lib it depends on
+    has been updated, updating independent libs at the same time on at
+    most max_workers threads.
+
+    A GoneException or ExpiredIdentityCertException from a lib stops any
+    further libs from being started, and is raised once the libs already
+    running have finished.
+    """
+
+    def __init__(self, libset, dependencies, max_workers):
+        self.libset = libset
+        self.dependencies = dependencies
+        self.max_workers = max(1, max_workers)
+
+        for lib in self.libset:
+            for dependency in self.dependencies.get(lib, []):
+                if dependency not in self.libset:
+                    raise ValueError("%s depends on %s, which is not in the libset" % (lib, dependency))
+
+    def _ready(self, pending, done):
+        return [lib for lib in pending
+                if all(dependency in done for dependency in self.dependencies.get(lib, []))]
+
+    def run(self, run_update, run_threaded_update=None):
+        """
+        Update every lib with run_update(lib), or with
+        run_threaded_update(lib) when it is updated on a thread of its own.
+
+        :return: the update reports, in libset order
+        """
+        run_threaded_update = run_threaded_update or run_update
+        reports = {}
+        pending = list(self.libset)
+        done = set()
+        running = set()
+        finished = queue.Queue()
+        error = None
+
+        def update(lib, run):
+            log.debug("running lib: %s" % lib)
+            try:
+                finished.put((lib, run(lib), None))
+            except Exception:
+                finished.put((lib, None, sys.exc_info()))
+
+        while pending or running:
+            ready = self._ready(pending, done) if error is None else []
+            if not running and len(ready) == 1:
+                # nothing to overlap with, no need for a thread
+                lib = ready[0]
+                pending.remove(lib)
+                running.add(lib)
+                update(lib, run_update)
+            else:
+                for lib in ready[:self.max_workers - len(running)]:
+                    pending.remove(lib)
+                    running.add(lib)
+                    thread = threading.Thread(target=update, args=[lib, run_threaded_update],
+                                              name="UpdateThread-%s" % lib.__class__.__name__)
+                    thread.daemon = True
+                    thread.start()
+
+            if not running:
+                if error is None:
+                    raise ValueError("Circular dependency between libs: %s" % pending)
+                break
+
+            lib, report, exc_info = finished.get()
+            running.remove(lib)
+            done.add(lib)
+            reports[lib] = report
+            if exc_info is not None and error is None:
+                error = exc_info
+
+        if error is not None:
+            six.reraise(*error)
+
+        return [reports[lib] for lib in self.libset]
+
+
 class BaseActionClient(object):
     """
     An object used to update the certficates, yum repos, and facts for the system.
     """
 
+    # most libs we update at the same time
+    max_workers = 4
+
     def __init__(self):
 
-        self._libset = self._get_libset()
+        self._libset = list(self._get_libset())
         self.lock = inj.require(inj.ACTION_LOCK)
         self.report = None
         self.update_reports = []
@@ -39,6 +129,17 @@ class BaseActionClient(object):
     def _get_libset(self):
         return []
 
+    def _get_dependencies(self):
+        """
+        Map each lib of the libset to the libs that have to be updated
+        before it. Libs that do not depend on each other are updated at
+        the same time.
+
+        By default every lib depends on the lib before it, so the libset
+        is updated in order.
+        """
+        return dict((lib, self._libset[i - 1:i]) for i, lib in enumerate(self._libset))
+
     def update(self, autoheal=False):
         """
         Update I{entitlement} certificates and corresponding
@@ -76,15 +177,17 @@ class BaseActionClient(object):
 
         return update_report
 
-    def _run_updates(self, autoheal):
-
-        update_reports = []
-
-        for lib in self._libset:
-            log.debug("running lib: %s" % lib)
-            update_report = self._run_update(lib)
-
-            # a map/dict may make more sense here
-            update_reports.append(update_report)
+    def _run_threaded_update(self, lib):
+        # A UEPConnection is not safe to share between threads, so the libs
+        # updated at the same time each talk to the server on their own.
+        cp_provider = inj.require(inj.CP_PROVIDER)
+        cp_provider.set_thread_consumer_auth_cp(cp_provider.new_consumer_auth_cp())
+        try:
+            return self._run_update(lib)
+        finally:
+            cp_provider.set_thread_consumer_auth_cp(None)
 
-        return update_reports
+    def _run_updates(self, autoheal):
+        scheduler = UpdateScheduler(self._libset, self._get_dependencies(), self.max_workers)
+        # a map/dict may make more sense here
+        return scheduler.run(self._run_update, self._run_threaded_update)
@@ -25,10 +25,11 @@ import os
 import socket
 import threading
 from rhsm.https import ssl
+from six.moves import queue
 
 from rhsm.config import initConfig
 import rhsm.connection as connection
-from rhsm.profile import get_profile
+from rhsm.profile import get_profile, file_fingerprint, rpmdb_cookie, ModulesProfile, REPOSITORY_PATH
 import subscription_manager.injection as inj
 from subscription_manager.jsonwrapper import PoolWrapper
 from rhsm import ourjson as json
@@ -41,6 +42,7 @@ from subscription_manager.i18n import ugettext as _
 log = logging.getLogger(__name__)
 
 PACKAGES_RESOURCE = "packages"
+PROFILE_DELTA_CAPABILITY = "profile_delta"
 
 conf = config.Config(initConfig())
 
@@ -112,9 +114,11 @@ class CacheManager(object):
             f.close()
             if debug:
                 log.debug("Wrote cache: %s" % self.CACHE_FILE)
+            return True
         except IOError as err:
             log.error("Unable to write cache: %s" % self.CACHE_FILE)
             log.exception(err)
+            return False
 
     def _read_cache(self):
         """
@@ -191,25 +195,72 @@ class StatusCache(CacheManager):
     """
     Unlike other cache managers, this one gets info from the server rather
     than sending it.
+
+    The HTTP validators (ETag, Last-Modified) the server sent along with the
+    status are stored next to the cache file, so that later requests are
+    conditional and the server can answer 304 Not Modified instead of
+    sending the same status again.
     """
     def __init__(self):
         self.server_status = None
         self.last_error = None
+        self.validators = None
+        # status being loaded by a StatusCachePrefetcher
+        self._pending = None
+
+    @property
+    def validators_file(self):
+        return "%s.validators.json" % os.path.splitext(self.CACHE_FILE)[0]
 
     def load_status(self, uep, uuid, on_date=None):
         """
         Load status from wherever is appropriate.
 
         If server is reachable, return it's response
-        and cache the results to disk.
+        and cache the results to disk. If the server reports the
+        status has not changed since it was cached, return the cache.
 
         If the server is not reachable, return the latest cache if
         it is still reasonable to use it.
 
         Returns None if we cannot reach the server, or use the cache.
+
+        If the status was prefetched, wait for and return that instead.
+        """
+        pending = self._pending
+        if pending is not None:
+            self._pending = None
+            status = pending.get()
+            if pending.uuid == uuid and on_date is None:
+                return status
+        return self._load_status(uep, uuid, on_date)
+
+    def prefetch(self, uuid):
         """
+        Mark the status of uuid as being loaded in the background, the
+        next load_status() call waits for and returns it.
+
+        :return: the _PendingStatus the loading thread should complete
+        """
+        self._pending = _PendingStatus(uuid)
+        return self._pending
+
+    def _load_status(self, uep, uuid, on_date=None):
         try:
-            self._sync_with_server(uep, uuid, on_date)
+            validators = self._read_validators(on_date)
+            self._sync_with_server(uep, uuid, on_date, validators=validators)
+            if validators is not None and validators.not_modified:
+                cached = super(StatusCache, self)._read_cache()
+                if cached is not None:
+                    log.debug("Status not modified on server, using cache: %s" % self.CACHE_FILE)
+                    self.server_status = cached
+                    self.validators = validators
+                    self.last_error = False
+                    return self.server_status
+                # the cache went away or cannot be read, so fetch it all again
+                validators = connection.Validators()
+                self._sync_with_server(uep, uuid, on_date, validators=validators)
+            self.validators = validators
             self.write_cache()
             self.last_error = False
             return self.server_status
@@ -254,6 +305,43 @@ class StatusCache(CacheManager):
         json_str = open_file.read()
         return json.loads(json_str)
 
+    def _read_validators(self, on_date=None):
+        """
+        Return the validators to make a conditional request for the status
+        with. Statuses for a specific date are never conditional.
+        """
+        if on_date is not None:
+            return None
+        if not os.path.exists(self.CACHE_FILE) or not os.path.exists(self.validators_file):
+            return connection.Validators()
+        try:
+            with open(self.validators_file) as f:
+                return connection.Validators(json.loads(f.read()))
+        except (IOError, ValueError, TypeError) as err:
+            log.debug("Unable to read validators %s: %s" % (self.validators_file, err))
+            return connection.Validators()
+
+    def _write_cache_and_validators(self, validators):
+        # Validators are only valid for the status they came with, so
+        # remove them until the new status is safely on disk.
+        self._delete_validators()
+        if not super(StatusCache, self).write_cache(True) or not validators:
+            return
+        try:
+            with open(self.validators_file, "w") as f:
+                json.dump(dict(validators), f)
+        except IOError as err:
+            log.error("Unable to write validators: %s" % self.validators_file)
+            log.exception(err)
+
+    def _delete_validators(self):
+        if os.path.exists(self.validators_file):
+            try:
+                os.remove(self.validators_file)
+            except OSError as err:
+                log.error("Unable to delete validators: %s" % self.validators_file)
+                log.exception(err)
+
     def _read_cache(self):
         """
         Prefer in memory cache to avoid io.  If it doesn't exist, save
@@ -286,7 +374,7 @@ class StatusCache(CacheManager):
         no default, the None likely indicates an error needs to be raised.
         """
 
-        if self.server_status is None:
+        if self.server_status is None or self._pending is not None:
             self.server_status = self.load_status(uep, uuid)
         return self.server_status
 
@@ -295,15 +383,87 @@ class StatusCache(CacheManager):
         This is threaded because it should never block in runtime.
         Writing to disk means it will be read from memory for the rest of this run.
         """
-        threading.Thread(target=super(StatusCache, self).write_cache,
-                         args=[True],
+        threading.Thread(target=self._write_cache_and_validators,
+                         args=[self.validators],
                          name="WriteCache%sThread" % self.__class__.__name__).start()
         log.debug("Started thread to write cache: %s" % self.CACHE_FILE)
 
     # we override a @classmethod with an instance method in the sub class?
     def delete_cache(self):
         super(StatusCache, self).delete_cache()
+        self._delete_validators()
         self.server_status = None
+        self.validators = None
+
+
+class _PendingStatus(object):
+    """
+    Result of a StatusCache.load_status() call made by another thread.
+    """
+    def __init__(self, uuid):
+        self.uuid = uuid
+        self._done = threading.Event()
+        self._status = None
+        self._error = None
+
+    def complete(self, status=None, error=None):
+        self._status = status
+        self._error = error
+        self._done.set()
+
+    def get(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._status
+
+
+class StatusCachePrefetcher(object):
+    """
+    Loads the status of several StatusCaches from the server at the same
+    time, so that a command that needs all of them waits about as long as
+    the slowest request instead of the sum of them.
+
+    Each worker thread makes its requests over its own connection, created
+    by uep_factory. The results are handed to the caches, whose next
+    load_status() call returns them instead of asking the server again.
+    Only statuses that do not depend on each other should be prefetched
+    together.
+    """
+    MAX_WORKERS = 4
+
+    def __init__(self, uep_factory, max_workers=None):
+        self.uep_factory = uep_factory
+        self.max_workers = max_workers or self.MAX_WORKERS
+
+    def prefetch(self, status_caches, uuid):
+        """
+        Start loading the status of each of status_caches for uuid, and
+        return without waiting for them.
+        """
+        tasks = queue.Queue()
+        for status_cache in status_caches:
+            tasks.put((status_cache, status_cache.prefetch(uuid)))
+
+        for i in range(min(self.max_workers, len(status_caches))):
+            worker = threading.Thread(target=self._work, args=[tasks, uuid],
+                                      name="StatusCachePrefetch%dThread" % i)
+            worker.daemon = True
+            worker.start()
+
+    def _work(self, tasks, uuid):
+        uep = None
+        while True:
+            try:
+                status_cache, pending = tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if uep is None:
+                    uep = self.uep_factory()
+                pending.complete(status=status_cache._load_status(uep, uuid))
+            except Exception as e:
+                pending.complete(error=e)
 
 
 class EntitlementStatusCache(StatusCache):
@@ -314,8 +474,8 @@ class EntitlementStatusCache(StatusCache):
     """
     CACHE_FILE = "/var/lib/rhsm/cache/entitlement_status.json"
 
-    def _sync_with_server(self, uep, uuid, on_date=None, *args, **kwargs):
-        self.server_status = uep.getCompliance(uuid, on_date)
+    def _sync_with_server(self, uep, uuid, on_date=None, validators=None, *args, **kwargs):
+        self.server_status = uep.getCompliance(uuid, on_date, validators=validators)
 
 
 class SyspurposeComplianceStatusCache(StatusCache):
@@ -326,9 +486,9 @@ class SyspurposeComplianceStatusCache(StatusCache):
     """
     CACHE_FILE = "/var/lib/rhsm/cache/syspurpose_compliance_status.json"
 
-    def _sync_with_server(self, uep, uuid, on_date=None, *args, **kwargs):
+    def _sync_with_server(self, uep, uuid, on_date=None, validators=None, *args, **kwargs):
         self.syspurpose_service = syspurpose.Syspurpose(uep)
-        self.server_status = self.syspurpose_service.get_syspurpose_status(on_date)
+        self.server_status = self.syspurpose_service.get_syspurpose_status(on_date, validators=validators)
 
     def write_cache(self):
         if self.server_status is not None and self.server_status['status'] != 'unknown':
@@ -347,8 +507,10 @@ class ProductStatusCache(StatusCache):
     """
     CACHE_FILE = "/var/lib/rhsm/cache/product_status.json"
 
-    def _sync_with_server(self, uep, uuid, *args, **kwargs):
-        consumer_data = uep.getConsumer(uuid)
+    def _sync_with_server(self, uep, uuid, on_date=None, validators=None, *args, **kwargs):
+        consumer_data = uep.getConsumer(uuid, validators=validators)
+        if validators is not None and validators.not_modified:
+            return
 
         if 'installedProducts' not in consumer_data:
             log.warn("Server does not support product date ranges.")
@@ -362,8 +524,8 @@ class OverrideStatusCache(StatusCache):
     """
     CACHE_FILE = "/var/lib/rhsm/cache/content_overrides.json"
 
-    def _sync_with_server(self, uep, consumer_uuid, *args, **kwargs):
-        self.server_status = uep.getContentOverrides(consumer_uuid)
+    def _sync_with_server(self, uep, consumer_uuid, on_date=None, validators=None, *args, **kwargs):
+        self.server_status = uep.getContentOverrides(consumer_uuid, validators=validators)
 
 
 class ReleaseStatusCache(StatusCache):
@@ -372,12 +534,12 @@ class ReleaseStatusCache(StatusCache):
     """
     CACHE_FILE = "/var/lib/rhsm/cache/releasever.json"
 
-    def _sync_with_server(self, uep, consumer_uuid, *args, **kwargs):
+    def _sync_with_server(self, uep, consumer_uuid, on_date=None, validators=None, *args, **kwargs):
         def get_release(uuid):
 
             # To mimic connection problems you can raise required exception:
             # raise connection.RemoteServerException(500, "GET", "/release")
-            return uep.getRelease(uuid)
+            return uep.getRelease(uuid, validators=validators)
 
         self.server_status = get_release(consumer_uuid)
 
@@ -393,10 +555,21 @@ class ProfileManager(CacheManager):
 
     CACHE_FILE = "/var/lib/rhsm/cache/profile.json"
 
+    # Fingerprint of the files the cached profile was collected from, see
+    # _current_fingerprint()
+    FINGERPRINT_FILE = "/var/lib/rhsm/cache/profile.fingerprint.json"
+    FINGERPRINT_GLOBS = ModulesProfile.STATE_GLOBS + [
+        REPOSITORY_PATH,
+        "/etc/dnf/vars/*",
+        "/etc/yum/vars/*",
+    ]
+
     def __init__(self):
         # Could be None, we'll read the system's current profile later once
         # we're sure we actually need the data.
         self._current_profile = None
+        # fingerprint taken just before the current profile was collected
+        self._profile_fingerprint = None
         self.report_package_profile = self.profile_reporting_enabled()
 
     def profile_reporting_enabled(self):
@@ -424,6 +597,7 @@ class ProfileManager(CacheManager):
     @property
     def current_profile(self):
         if not self._current_profile:
+            self._profile_fingerprint = self._current_fingerprint()
             rpm_profile = get_profile('rpm').collect()
             enabled_repos = get_profile('enabled_repos').collect()
             module_profile = get_profile('modulemd').collect()
@@ -434,6 +608,65 @@ class ProfileManager(CacheManager):
     @current_profile.setter
     def current_profile(self, new_profile):
         self._current_profile = new_profile
+        self._profile_fingerprint = None
+
+    def _current_fingerprint(self):
+        """
+        Cheap summary of the state of the package database, repositories
+        and modules the profile is collected from. While it stays the same,
+        so does the profile.
+
+        Returns None without the rpmdb cookie, as there is then no cheap way
+        to tell whether packages were installed or removed.
+        """
+        cookie = rpmdb_cookie()
+        if cookie is None:
+            return None
+        return {
+            'rpmdb_cookie': cookie,
+            'files': file_fingerprint(self.FINGERPRINT_GLOBS),
+        }
+
+    def _read_fingerprint(self):
+        if not os.path.exists(self.FINGERPRINT_FILE):
+            return None
+        try:
+            with open(self.FINGERPRINT_FILE) as f:
+                return json.loads(f.read())
+        except (IOError, ValueError) as err:
+            log.debug("Unable to read profile fingerprint %s: %s" % (self.FINGERPRINT_FILE, err))
+            return None
+
+    def _write_fingerprint(self, fingerprint):
+        try:
+            with open(self.FINGERPRINT_FILE, "w") as f:
+                json.dump(fingerprint, f)
+        except IOError as err:
+            log.error("Unable to write profile fingerprint: %s" % self.FINGERPRINT_FILE)
+            log.exception(err)
+
+    @classmethod
+    def _delete_fingerprint(cls):
+        if os.path.exists(cls.FINGERPRINT_FILE):
+            try:
+                os.remove(cls.FINGERPRINT_FILE)
+            except OSError as err:
+                log.error("Unable to delete profile fingerprint: %s" % cls.FINGERPRINT_FILE)
+                log.exception(err)
+
+    def write_cache(self, debug=True):
+        # The fingerprint is only valid for the profile it was taken with, so
+        # remove it until the new profile is safely on disk.
+        self._delete_fingerprint()
+        written = super(ProfileManager, self).write_cache(debug)
+        if written and self._profile_fingerprint is not None:
+            self._write_fingerprint(self._profile_fingerprint)
+        return written
+
+    @classmethod
+    def delete_cache(cls):
+        super(ProfileManager, cls).delete_cache()
+        cls._delete_fingerprint()
 
     def to_dict(self):
         return self.current_profile
@@ -465,16 +698,76 @@ class ProfileManager(CacheManager):
             log.debug("Cache file %s does not exist" % self.CACHE_FILE)
             return True
 
+        # Collecting the profile means reading every package header, avoid it
+        # if nothing it is collected from has changed since it was cached.
+        if self._current_profile is None:
+            fingerprint = self._read_fingerprint()
+            if fingerprint is not None and fingerprint == self._current_fingerprint():
+                log.debug("Package database, repositories and modules have not changed")
+                return False
+
         cached_profile = self._read_cache()
-        return not cached_profile == self.current_profile
+        changed = not cached_profile == self.current_profile
+        if not changed and self._profile_fingerprint is not None:
+            self._write_fingerprint(self._profile_fingerprint)
+        return changed
+
+    @staticmethod
+    def _package_key(pkg_dict):
+        return tuple(sorted(pkg_dict.items()))
+
+    def _profile_delta(self, combined_profile):
+        """
+        Compare combined_profile with the last profile sent to the server.
+
+        Returns the changes as expected by UEPConnection.updateProfileDelta,
+        or None if there is no usable cached profile to compare with.
+        """
+        if not self._cache_exists():
+            return None
+        cached_profile = self._read_cache()
+        if not isinstance(cached_profile, dict) or \
+                any(content_type not in cached_profile for content_type in combined_profile):
+            return None
+
+        cached_keys = set(self._package_key(pkg) for pkg in cached_profile["rpm"])
+        # one pass over the current packages, keying each of them once
+        current_keys = set()
+        added = []
+        for pkg in combined_profile["rpm"]:
+            key = self._package_key(pkg)
+            current_keys.add(key)
+            if key not in cached_keys:
+                added.append(pkg)
+        removed = [pkg for pkg in cached_profile["rpm"] if self._package_key(pkg) not in current_keys]
+        log.debug("Package profile changes: %d packages added, %d removed, %d unchanged" %
+                  (len(added), len(removed), len(current_keys) - len(added)))
+
+        delta = []
+        if added or removed:
+            delta.append({"content_type": "rpm", "added": added, "removed": removed})
+        for content_type in ["enabled_repos", "modulemd"]:
+            if cached_profile[content_type] != combined_profile[content_type]:
+                delta.append({"content_type": content_type, "profile": combined_profile[content_type]})
+        return delta
 
     def _sync_with_server(self, uep, consumer_uuid, *args, **kwargs):
         """
         This method has to be able to sync combined profile, when server supports this functionality
         and it also has to be able to send only profile containing list of installed RPMs.
+        When the server supports it, only the changes since the cached profile are sent.
         """
         combined_profile = self.current_profile
         if uep.has_capability("combined_reporting"):
+            if uep.has_capability(PROFILE_DELTA_CAPABILITY):
+                delta = self._profile_delta(combined_profile)
+                # nothing to send means the server is being forced to resync
+                if delta:
+                    try:
+                        uep.updateProfileDelta(consumer_uuid, delta)
+                        return
+                    except connection.RestlibException as e:
+                        log.warn("Unable to upload package profile changes, uploading whole profile: %s" % e)
             _combined_profile = [
                 {
                     "content_type": "rpm",
@@ -599,8 +892,8 @@ class PoolStatusCache(StatusCache):
     """
     CACHE_FILE = "/var/lib/rhsm/cache/pool_status.json"
 
-    def _sync_with_server(self, uep, uuid, *args, **kwargs):
-        self.server_status = uep.getEntitlementList(uuid)
+    def _sync_with_server(self, uep, uuid, on_date=None, validators=None, *args, **kwargs):
+        self.server_status = uep.getEntitlementList(uuid, validators=validators)
 
 
 class PoolTypeCache(object):
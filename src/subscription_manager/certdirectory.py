@@ -16,8 +16,15 @@ from __future__ import print_function, division, absolute_import
 # granted to use or replicate Red Hat trademarks that are incorporated
 # in this software or its documentation.
 #
+import errno
 import logging
 import os
+import stat
+import struct
+import sys
+import tempfile
+
+from six.moves import cPickle as pickle
 
 from rhsm.certificate import Key, create_from_file
 from rhsm.config import initConfig
@@ -98,31 +105,266 @@ class Directory(object):
         return self.path
 
 
+class CertificateCache(object):
+    """
+    Persistent cache of the certificates parsed from one directory.
+
+    Parsing a certificate means an X509 parse, a walk over its extensions
+    and, for v3 entitlements, decompressing and parsing the JSON payload.
+    Every new process used to pay that for every certificate. The parsed
+    objects are stored here keyed on the file path, and each entry records
+    a fingerprint of the file (inode, size, mtime, ctime) and the serial, so
+    a certificate is only re-parsed when the file on disk has been replaced
+    or rewritten.
+
+    Certificates are cached without their rhsm._certificate X509 object,
+    which cannot be serialized. Nothing outside of rhsm.certificate2 uses it
+    and Certificate.write() only needs it when the original PEM was not
+    kept, so the PEM text is stored in that case.
+    """
+
+    CACHE_DIR = "/var/lib/rhsm/cache/certificates"
+
+    # Bump this whenever the attributes of the certificate classes in
+    # rhsm.certificate2 change in a way that older cache files can't satisfy.
+    VERSION = 1
+    MAGIC = b'RHSMCERTCACHE'
+
+    def __init__(self, cert_dir_path):
+        name = cert_dir_path.strip(os.sep).replace(os.sep, '_') or 'root'
+        self.cache_dir = Path.abs(self.CACHE_DIR)
+        self.cache_file = os.path.join(self.cache_dir, '%s.bin' % name)
+        self._entries = None
+        self._dirty = False
+
+    @classmethod
+    def _header(cls):
+        # Objects pickled by python 2 and 3 differ in their str/bytes types,
+        # so the major version is part of the header too.
+        return cls.MAGIC + struct.pack('!HB', cls.VERSION, sys.version_info[0])
+
+    @staticmethod
+    def fingerprint(path):
+        """
+        Returns a tuple that changes whenever the file at path is rewritten
+        or replaced. Raises OSError if the file can't be stat'd.
+        """
+        st = os.stat(path)
+        return (st.st_ino, st.st_size, st.st_mtime, st.st_ctime)
+
+    def _load(self):
+        self._entries = {}
+        self._dirty = False
+        try:
+            with open(self.cache_file, 'rb') as f:
+                # Only trust a cache written by this user that nobody else
+                # could have modified, since loading it creates objects.
+                st = os.fstat(f.fileno())
+                if st.st_uid != os.geteuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                    log.warning("Ignoring certificate cache with unsafe ownership or "
+                                "permissions: %s" % self.cache_file)
+                    return
+                header = self._header()
+                if f.read(len(header)) != header:
+                    log.debug("Ignoring certificate cache from another version: %s" % self.cache_file)
+                    return
+                self._entries = pickle.load(f)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                log.debug("Unable to read certificate cache %s: %s" % (self.cache_file, e))
+        except Exception as e:
+            log.debug("Ignoring unreadable certificate cache %s: %s" % (self.cache_file, e))
+
+    def get(self, path, fingerprint):
+        """
+        Returns the cached certificate for path, or None if there is none or
+        the file has changed since it was cached.
+        """
+        if self._entries is None:
+            self._load()
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != fingerprint:
+            return None
+        serial, klass, state = entry[1:]
+        if state.get('serial') != serial:
+            return None
+        cert = klass.__new__(klass)
+        cert.__dict__.update(state)
+        return cert
+
+    def put(self, path, fingerprint, cert):
+        if self._entries is None:
+            self._load()
+        state = dict(cert.__dict__)
+        state['x509'] = None
+        if state.get('pem') is None:
+            try:
+                with open(path, 'r') as f:
+                    state['pem'] = f.read()
+            except IOError as e:
+                log.debug("Not caching certificate %s: %s" % (path, e))
+                return
+        self._entries[path] = (fingerprint, cert.serial, cert.__class__, state)
+        self._dirty = True
+
+    def prune(self, paths):
+        """
+        Drop entries for any files that are not in paths.
+        """
+        if self._entries is None:
+            self._load()
+        for path in set(self._entries) - set(paths):
+            del self._entries[path]
+            self._dirty = True
+
+    def save(self):
+        """
+        Write the cache to disk if anything changed. The file is replaced
+        atomically so concurrent readers see either the old or new cache.
+        """
+        if not self._dirty:
+            return
+        tmp_path = None
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self._header())
+                pickle.dump(self._entries, f, 2)
+            os.rename(tmp_path, self.cache_file)
+            self._dirty = False
+        except Exception as e:
+            log.debug("Unable to write certificate cache %s: %s" % (self.cache_file, e))
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def delete(self):
+        self._entries = {}
+        self._dirty = False
+        try:
+            os.unlink(self.cache_file)
+            log.debug("Deleted certificate cache: %s" % self.cache_file)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                log.error("Unable to delete certificate cache %s: %s" % (self.cache_file, e))
+
+
+class CertificateIndex(object):
+    """
+    Lookup tables over a listing of certificates, so that finding
+    certificates by serial, product, pool or stack doesn't have to scan the
+    whole listing every time.
+
+    Lists in the tables keep the order of the listing they were built from.
+    """
+
+    def __init__(self, certs):
+        self.certs = certs
+        self.size = len(certs)
+        self.by_serial = {}
+        self.by_product = {}
+        self.by_pool_id = {}
+        self.by_stacking_id = {}
+        for cert in certs:
+            self.by_serial.setdefault(cert.serial, cert)
+            product_ids = set()
+            for product in cert.products:
+                if product.id not in product_ids:
+                    product_ids.add(product.id)
+                    self.by_product.setdefault(product.id, []).append(cert)
+            pool = getattr(cert, 'pool', None)
+            if pool is not None:
+                self.by_pool_id.setdefault(str(pool.id), []).append(cert)
+            order = getattr(cert, 'order', None)
+            if order and order.stacking_id:
+                self.by_stacking_id.setdefault(order.stacking_id, []).append(cert)
+
+    def is_current(self, certs):
+        """
+        True if this index was built from certs, as far as can be told
+        without comparing every certificate.
+        """
+        return self.certs is certs and self.size == len(certs)
+
+
 class CertificateDirectory(Directory):
 
     KEY = 'key.pem'
 
+    # Set per instance by _get_index(). Defined here as well because some
+    # subclasses (and test stubs) don't call __init__.
+    _index = None
+
+    # Whether parsed certificates are kept in a CertificateCache between
+    # processes.
+    CACHE_CERTS = False
+
     def __init__(self, path):
         super(CertificateDirectory, self).__init__(path)
         self.create()
         self._listing = None
+        # path -> (fingerprint, cert) for every certificate in the last
+        # listing, see CertificateCache.fingerprint
+        self._loaded = {}
+        self._cert_cache = None
+        if self.CACHE_CERTS:
+            self._cert_cache = CertificateCache(self.path)
 
     def refresh(self):
-        # simply clear the cache. the next list() will reload.
+        # clear the listing. the next list() will only reload the files
+        # that were added or changed since.
         self._listing = None
+        self._index = None
+
+    def _get_index(self):
+        """
+        Returns the CertificateIndex for the current listing, building it
+        the first time it is needed after a refresh().
+        """
+        certs = self.list()
+        if self._index is None or not self._index.is_current(certs):
+            self._index = CertificateIndex(certs)
+        return self._index
 
     def list(self):
         if self._listing is not None:
             return self._listing
         listing = []
+        loaded = {}
         for _p, fn in Directory.list(self):
             if not fn.endswith('.pem') or fn.endswith(self.KEY):
                 continue
             path = self.abspath(fn)
-            listing.append(create_from_file(path))
+            try:
+                # stat before parsing, so a file rewritten in between is
+                # recorded under the old fingerprint and re-read next time
+                fingerprint = CertificateCache.fingerprint(path)
+            except OSError:
+                fingerprint = None
+            previous = self._loaded.get(path)
+            if fingerprint is not None and previous is not None and previous[0] == fingerprint:
+                cert = previous[1]
+            else:
+                cert = self._create_from_file(path, fingerprint)
+            loaded[path] = (fingerprint, cert)
+            listing.append(cert)
+        if self._cert_cache is not None:
+            self._cert_cache.prune(loaded)
+            self._cert_cache.save()
+        self._loaded = loaded
         self._listing = listing
         return listing
 
+    def _create_from_file(self, path, fingerprint):
+        if self._cert_cache is None or fingerprint is None:
+            return create_from_file(path)
+        cert = self._cert_cache.get(path, fingerprint)
+        if cert is None:
+            cert = create_from_file(path)
+            self._cert_cache.put(path, fingerprint, cert)
+        return cert
+
     def list_valid(self):
         valid = []
         for c in self.list():
@@ -138,44 +380,24 @@ class CertificateDirectory(Directory):
         return expired
 
     def find(self, sn):
-        # TODO: could optimize to just load SERIAL.pem? Maybe not in all cases.
-        for c in self.list():
-            if c.serial == sn:
-                return c
-        return None
+        return self._get_index().by_serial.get(sn)
 
     def find_all_by_product(self, p_hash):
-        certs = set()
-        providing_stack_ids = set()
-        stack_id_map = {}
+        index = self._get_index()
+        certs = set(index.by_product.get(p_hash, []))
 
-        # Note this will override a product cert for id '71' with
-        # a different product cert for id '71' if it is later in self.list
-        for c in self.list():
-            for p in c.products:
-                if p.id == p_hash:
-                    certs.add(c)
-                    # Keep track of stacks that provide our product
-                    if c.order and c.order.stacking_id:
-                        providing_stack_ids.add(c.order.stacking_id)
-
-            # Keep track of stack ids in case we need them later.  avoids another loop
-            if c.order and c.order.stacking_id:
-                if c.order.stacking_id not in stack_id_map:
-                    stack_id_map[c.order.stacking_id] = set()
-                stack_id_map[c.order.stacking_id].add(c)
-
-        # Complete
+        # Complete the stacks that provide our product
+        providing_stack_ids = set(c.order.stacking_id for c in certs
+                                  if c.order and c.order.stacking_id)
         for stack_id in providing_stack_ids:
-            certs |= stack_id_map[stack_id]
+            certs.update(index.by_stacking_id[stack_id])
 
         return list(certs)
 
     def find_by_product(self, p_hash):
-        for c in self.list():
-            for p in c.products:
-                if p.id == p_hash:
-                    return c
+        certs = self._get_index().by_product.get(p_hash)
+        if certs:
+            return certs[0]
         return None
 
     # Set up an alias for backwards compatibility
@@ -225,14 +447,26 @@ class ProductDirectory(ProductCertificateDirectory):
         self.installed_prod_dir = ProductCertificateDirectory(path=installed_prod_path)
         self.default_prod_dir = ProductCertificateDirectory(path=default_prod_path)
 
+    # the combined listing, and the two listings it was built from
+    _combined = None
+    _combined_from = (None, None)
+
     def list(self):
         installed_prod_list = self.installed_prod_dir.list()
         default_prod_list = self.default_prod_dir.list()
 
+        # Keep returning the same combined list until either directory is
+        # refreshed, so the index built from it stays valid.
+        if self._combined_from[0] is installed_prod_list and \
+                self._combined_from[1] is default_prod_list:
+            return self._combined
+
         # Product IDs in installed_prod dir.
         pids = set([cert.products[0].id for cert in installed_prod_list])
         # Everything from /etc/pki/product, only use product-default for pids that don't already exist
-        return installed_prod_list + [l for l in default_prod_list if l.products[0].id not in pids]
+        self._combined = installed_prod_list + [l for l in default_prod_list if l.products[0].id not in pids]
+        self._combined_from = (installed_prod_list, default_prod_list)
+        return self._combined
 
     def refresh(self):
         self.installed_prod_dir.refresh()
@@ -255,6 +489,7 @@ class EntitlementDirectory(CertificateDirectory):
 
     PATH = conf['rhsm']['entitlementCertDir']
     PRODUCT = 'product'
+    CACHE_CERTS = True
 
     @classmethod
     def productpath(cls):
@@ -295,9 +530,19 @@ class EntitlementDirectory(CertificateDirectory):
     def list_valid_with_content_access(self):
         return [x for x in self.list_with_content_access() if self._check_key(x) and x.is_valid()]
 
+    # the listing without content access certs, and the listing it was
+    # filtered from
+    _filtered = None
+    _filtered_from = None
+
     def list(self):
         certs = super(EntitlementDirectory, self).list()
-        return [cert for cert in certs if cert.entitlement_type != CONTENT_ACCESS_CERT_TYPE]
+        # Keep returning the same filtered list until the directory is
+        # refreshed, so the index built from it stays valid.
+        if self._filtered_from is not certs:
+            self._filtered = [cert for cert in certs if cert.entitlement_type != CONTENT_ACCESS_CERT_TYPE]
+            self._filtered_from = certs
+        return self._filtered
 
     def list_with_content_access(self):
         return super(EntitlementDirectory, self).list()
@@ -307,20 +552,14 @@ class EntitlementDirectory(CertificateDirectory):
         Returns all entitlement certificates providing access to the given
         product ID.
         """
-        entitlements = []
-        for cert in self.list():
-            for cert_product in cert.products:
-                if product_id == cert_product.id:
-                    entitlements.append(cert)
-        return entitlements
+        return list(self._get_index().by_product.get(product_id, []))
 
     def list_for_pool_id(self, pool_id):
         """
         Returns all entitlement certificates provided by the given
         pool ID.
         """
-        entitlements = [entitlement for entitlement in self.list() if str(entitlement.pool.id) == str(pool_id)]
-        return entitlements
+        return list(self._get_index().by_pool_id.get(str(pool_id), []))
 
     def list_serials_for_pool_ids(self, pool_ids):
         """
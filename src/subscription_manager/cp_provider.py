@@ -14,6 +14,8 @@ from __future__ import print_function, division, absolute_import
 # in this software or its documentation.
 #
 
+import threading
+
 from subscription_manager.identity import ConsumerIdentity
 import rhsm.connection as connection
 
@@ -39,6 +41,7 @@ class CPProvider(object):
 
     # Initialize with default connection info from the config file
     def __init__(self):
+        self.thread_local = threading.local()
         self.set_connection_info()
         self.correlation_id = None
 
@@ -95,21 +98,40 @@ class CPProvider(object):
         self.no_auth_cp = None
 
     def get_consumer_auth_cp(self):
+        thread_cp = getattr(self.thread_local, 'consumer_auth_cp', None)
+        if thread_cp is not None:
+            return thread_cp
         if not self.consumer_auth_cp:
-            self.consumer_auth_cp = connection.UEPConnection(
-                    host=self.server_hostname,
-                    ssl_port=self.server_port,
-                    handler=self.server_prefix,
-                    proxy_hostname=self.proxy_hostname,
-                    proxy_port=self.proxy_port,
-                    proxy_user=self.proxy_user,
-                    proxy_password=self.proxy_password,
-                    cert_file=self.cert_file, key_file=self.key_file,
-                    correlation_id=self.correlation_id,
-                    no_proxy=self.no_proxy,
-                    restlib_class=self.restlib_class)
+            self.consumer_auth_cp = self.new_consumer_auth_cp()
         return self.consumer_auth_cp
 
+    # A UEPConnection should not be used by several threads at once, so
+    # threads making requests of their own get a connection of their own.
+    # It reuses the server capabilities the shared connection already
+    # loaded rather than asking the server for them again.
+    def new_consumer_auth_cp(self):
+        cp = connection.UEPConnection(
+                host=self.server_hostname,
+                ssl_port=self.server_port,
+                handler=self.server_prefix,
+                proxy_hostname=self.proxy_hostname,
+                proxy_port=self.proxy_port,
+                proxy_user=self.proxy_user,
+                proxy_password=self.proxy_password,
+                cert_file=self.cert_file, key_file=self.key_file,
+                correlation_id=self.correlation_id,
+                no_proxy=self.no_proxy,
+                restlib_class=self.restlib_class)
+        if self.consumer_auth_cp and self.consumer_auth_cp.capabilities is not None:
+            cp.capabilities = self.consumer_auth_cp.capabilities
+            cp.conn.compress_requests = self.consumer_auth_cp.conn.compress_requests
+        return cp
+
+    # Make get_consumer_auth_cp() return this connection in the calling
+    # thread, or the shared one again when set to None.
+    def set_thread_consumer_auth_cp(self, cp):
+        self.thread_local.consumer_auth_cp = cp
+
     def get_basic_auth_cp(self):
         if not self.basic_auth_cp:
             self.basic_auth_cp = connection.UEPConnection(
@@ -15,10 +15,17 @@ from __future__ import print_function, division, absolute_import
 # in this software or its documentation.
 #
 import logging
+import six
 import socket
+import sys
+import threading
+import time
+
+from six.moves import queue
 
 from rhsm.certificate import Key, create_from_pem
 from rhsm.certificate2 import CONTENT_ACCESS_CERT_TYPE
+from rhsm.config import initConfig
 
 from subscription_manager.certdirectory import Writer
 from subscription_manager import certlib
@@ -27,13 +34,19 @@ from subscription_manager import utils
 from subscription_manager.injection import IDENTITY, require
 from subscription_manager import rhelentbranding
 import subscription_manager.injection as inj
+from rhsmlib.services import config
 
 from subscription_manager.i18n import ungettext, ugettext as _
 
 log = logging.getLogger(__name__)
 
+conf = config.Config(initConfig())
+
 CONTENT_ACCESS_CERT_CAPABILITY = "org_level_content_access"
 
+# Used when cert_batch_size is unset or invalid in rhsm.conf
+DEFAULT_CERT_BATCH_SIZE = 100
+
 
 class EntCertActionInvoker(certlib.BaseActionInvoker):
     """Invoker for entitlement certificate updating actions."""
@@ -126,7 +139,14 @@ class EntCertUpdateAction(object):
         rogue_serials = self._find_rogue_serials(local, expected)
 
         self.delete(rogue_serials)
-        self.install(missing_serials)
+        try:
+            self.install(missing_serials)
+        except Exception:
+            # The batches fetched before the error are installed, so finish
+            # updating for those before passing the error on.
+            install_error = sys.exc_info()
+        else:
+            install_error = None
 
         log.info('certs updated:\n%s', self.report)
         self.syslog_results()
@@ -149,6 +169,9 @@ class EntCertUpdateAction(object):
             # reload certs and update branding
             self.branding_hook()
 
+        if install_error is not None:
+            six.reraise(*install_error)
+
         if self.uep.has_capability(CONTENT_ACCESS_CERT_CAPABILITY):
             content_access_certs = self._find_content_access_certs()
             update_data = None
@@ -174,12 +197,91 @@ class EntCertUpdateAction(object):
         return self.report
 
     def install(self, missing_serials):
-        """Install any missing entitlement certificates."""
+        """Install any missing entitlement certificates.
 
-        cert_bundles = self.get_certificates_by_serial_list(missing_serials)
+        Missing serials are requested from the server in batches of
+        cert_batch_size. The next batch is downloaded in the background
+        while the certificates of the previous one are parsed and written.
+        """
+        start = time.time()
 
         ent_cert_bundles_installer = EntitlementCertBundlesInstaller(self.report)
-        ent_cert_bundles_installer.install(cert_bundles)
+        try:
+            ent_cert_bundles_installer.install(self._fetch_batches(missing_serials))
+        finally:
+            self.report.timings['total'] += time.time() - start
+            if missing_serials:
+                log.debug('ent cert install timings: %s', self.report.format_timings())
+
+    def _get_batch_size(self):
+        try:
+            batch_size = conf['rhsm'].get_int('cert_batch_size')
+        except ValueError:
+            log.warn("Invalid cert_batch_size in rhsm.conf, using %s",
+                     DEFAULT_CERT_BATCH_SIZE)
+            batch_size = None
+        if not batch_size or batch_size < 1:
+            batch_size = DEFAULT_CERT_BATCH_SIZE
+        return batch_size
+
+    def _fetch_batch(self, sn_list):
+        start = time.time()
+        cert_bundles = self.get_certificates_by_serial_list(sn_list)
+        self.report.timings['fetch'] += time.time() - start
+        self.report.batches += 1
+        return cert_bundles
+
+    def _fetch_batches(self, missing_serials):
+        """Yield the cert bundles for missing_serials, one batch at a time.
+
+        The batch being installed, at most one fetched batch waiting for it
+        and the batch being fetched are held in memory, so no more than three
+        batches worth of cert bundles at once. Errors raised while fetching
+        are re-raised in the calling thread.
+        """
+        batch_size = self._get_batch_size()
+        batches = [missing_serials[i:i + batch_size]
+                   for i in range(0, len(missing_serials), batch_size)]
+
+        if len(batches) < 2:
+            for batch in batches:
+                for cert_bundle in self._fetch_batch(batch):
+                    yield cert_bundle
+            return
+
+        results = queue.Queue(maxsize=1)
+        stopped = threading.Event()
+
+        def fetch():
+            for batch in batches:
+                if stopped.is_set():
+                    return
+                try:
+                    results.put((self._fetch_batch(batch), None))
+                except Exception as e:
+                    results.put((None, e))
+                    return
+
+        fetcher = threading.Thread(target=fetch, name="EntCertFetcher")
+        fetcher.daemon = True
+        fetcher.start()
+        try:
+            for _batch in batches:
+                wait_start = time.time()
+                cert_bundles, error = results.get()
+                self.report.timings['wait'] += time.time() - wait_start
+                if error is not None:
+                    raise error
+                for cert_bundle in cert_bundles:
+                    yield cert_bundle
+        finally:
+            # let the fetcher finish if we stop early
+            stopped.set()
+            while fetcher.is_alive():
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
 
     def _find_content_access_certs(self):
         certs = self.ent_dir.list_with_content_access()
@@ -327,10 +429,14 @@ class EntitlementCertBundlesInstaller(object):
     def install(self, cert_bundles):
         """Fetch entitliement certs, install them, and update the report."""
         bundle_installer = EntitlementCertBundleInstaller(self.report)
-        for cert_bundle in cert_bundles:
-            bundle_installer.install(cert_bundle)
-        self.exceptions = bundle_installer.exceptions
-        self.post_install()
+        try:
+            for cert_bundle in cert_bundles:
+                bundle_installer.install(cert_bundle)
+        finally:
+            # cert_bundles may fail part way, the bundles installed so far
+            # still get the post_install treatment
+            self.exceptions = bundle_installer.exceptions
+            self.post_install()
 
     # TODO: add subman plugin slot,conduit,hooks
     def pre_install(self):
@@ -374,8 +480,12 @@ class EntitlementCertBundleInstaller(object):
 
         cert_bundle_writer = Writer()
         try:
+            start = time.time()
             key, cert = self.build_cert(bundle)
+            parsed = time.time()
             cert_bundle_writer.write(key, cert)
+            self.report.timings['parse'] += parsed - start
+            self.report.timings['write'] += time.time() - parsed
 
             self.report.added.append(cert)
         except Exception as e:
@@ -425,6 +535,10 @@ class EntCertUpdateReport(certlib.ActionReport):
         self.added = []
         self.rogue = []
         self._exceptions = []
+        # seconds spent in each phase of installing missing certs. fetch
+        # overlaps parse and write, wait is the part of it not overlapped.
+        self.timings = dict.fromkeys(['fetch', 'wait', 'parse', 'write', 'total'], 0.0)
+        self.batches = 0
 
     def updates(self):
         """Total number of ent certs installed and deleted."""
@@ -435,6 +549,12 @@ class EntCertUpdateReport(certlib.ActionReport):
     def exceptions(self):
         return self._exceptions
 
+    def format_timings(self):
+        """Per phase install timings, for debug logging."""
+        phases = ['%s=%.3fs' % (phase, self.timings[phase])
+                  for phase in ['fetch', 'wait', 'parse', 'write', 'total']]
+        return '%d batch(es) %s' % (self.batches, ' '.join(phases))
+
     def write(self, s, title, certificates):
         """Generate a report stanza for a list of certs."""
         indent = '  '
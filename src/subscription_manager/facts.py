@@ -18,12 +18,15 @@ import os
 
 from subscription_manager.injection import PLUGIN_MANAGER, require
 from subscription_manager.cache import CacheManager
+from rhsm import connection
 from rhsm import ourjson as json
 
 from rhsmlib.facts.all import AllFactsCollector
 
 log = logging.getLogger(__name__)
 
+FACTS_DELTA_CAPABILITY = "facts_delta"
+
 
 class Facts(CacheManager):
     """
@@ -48,6 +51,9 @@ class Facts(CacheManager):
         # plugin manager so we can add custom facts via plugin
         self.plugin_manager = require(PLUGIN_MANAGER)
 
+        # how many bytes the last upload of only the changed facts saved
+        self.bytes_saved = 0
+
     def get_last_update(self):
         try:
             return datetime.fromtimestamp(os.stat(self.CACHE_FILE).st_mtime)
@@ -76,6 +82,13 @@ class Facts(CacheManager):
         if len(self.facts) == 0 or refresh:
             collector = AllFactsCollector()
             facts = collector.get_all()
+            if collector.timed_out:
+                # Keep reporting what the collectors that took too long found
+                # the last time, rather than having these facts disappear.
+                cached_facts = self.read_cache_only() or {}
+                for key in collector.get_timed_out_fact_names():
+                    if key in cached_facts:
+                        facts.setdefault(key, cached_facts[key])
             self.plugin_manager.run('post_facts_collection', facts=facts)
             self.facts = facts
         return self.facts
@@ -83,9 +96,45 @@ class Facts(CacheManager):
     def to_dict(self):
         return self.get_facts()
 
+    def _facts_delta(self, facts):
+        """
+        Compare facts with the last facts sent to the server.
+
+        Returns a tuple of the new and changed facts and the names of the
+        removed facts, or None if there is no usable cache to compare with.
+        """
+        cached_facts = self.read_cache_only()
+        if not isinstance(cached_facts, dict):
+            return None
+        changed = dict((key, value) for key, value in facts.items()
+                       if key not in cached_facts or cached_facts[key] != value)
+        removed = sorted(set(cached_facts) - set(facts))
+        return changed, removed
+
     def _sync_with_server(self, uep, consumer_uuid):
+        facts = self.get_facts()
+        self.bytes_saved = 0
+        if uep.has_capability(FACTS_DELTA_CAPABILITY):
+            delta = self._facts_delta(facts)
+            # nothing to send means the server is being forced to resync
+            if delta is not None and (delta[0] or delta[1]):
+                changed, removed = delta
+                try:
+                    log.debug("Updating %d changed and %d removed facts on server" %
+                              (len(changed), len(removed)))
+                    uep.updateConsumerFactsDelta(consumer_uuid, changed, removed)
+                except connection.RestlibException as e:
+                    log.warn("Unable to upload fact changes, uploading all facts: %s" % e)
+                else:
+                    full_size = len(json.dumps(facts, default=json.encode))
+                    delta_size = len(json.dumps({"changed": changed, "removed": removed},
+                                                default=json.encode))
+                    self.bytes_saved = full_size - delta_size
+                    log.debug("Uploaded %d bytes of fact changes instead of %d bytes of facts, "
+                              "saved %d bytes" % (delta_size, full_size, self.bytes_saved))
+                    return
         log.debug("Updating facts on server")
-        uep.updateConsumer(consumer_uuid, facts=self.get_facts())
+        uep.updateConsumer(consumer_uuid, facts=facts)
 
     def _load_data(self, open_file):
         json_str = open_file.read()
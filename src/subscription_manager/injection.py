@@ -14,6 +14,8 @@ from __future__ import print_function, division, absolute_import
 # in this software or its documentation.
 #
 
+import threading
+
 import six
 
 # Supported Features:
@@ -51,6 +53,9 @@ class FeatureBroker(object):
     """
     def __init__(self):
         self.providers = {}
+        # singletons may be required by several threads at once, but must
+        # only be created once
+        self.lock = threading.RLock()
 
     def provide(self, feature, provider):
         """
@@ -78,7 +83,9 @@ class FeatureBroker(object):
             raise KeyError("Unknown feature: %r" % feature)
 
         if isinstance(provider, (type, six.class_types)):
-            self.providers[feature] = provider(*args, **kwargs)
+            with self.lock:
+                if self.providers[feature] is provider:
+                    self.providers[feature] = provider(*args, **kwargs)
         elif six.callable(provider):
             return provider(*args, **kwargs)
 
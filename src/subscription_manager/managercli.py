@@ -42,6 +42,7 @@ from rhsm.utils import remove_scheme, ServerUrlParseError
 
 from subscription_manager import identity
 from subscription_manager.branding import get_branding
+from subscription_manager.cache import StatusCachePrefetcher
 from subscription_manager.entcertlib import EntCertActionInvoker, CONTENT_ACCESS_CERT_CAPABILITY
 from subscription_manager.action_client import ActionClient, UnregisterActionClient
 from subscription_manager.cert_sorter import FUTURE_SUBSCRIBED, \
@@ -49,6 +50,7 @@ from subscription_manager.cert_sorter import FUTURE_SUBSCRIBED, \
 from subscription_manager.cli import AbstractCLICommand, CLI, system_exit
 from subscription_manager import rhelentbranding
 from rhsmlib.facts.hwprobe import ClassicCheck
+from rhsmlib.facts.cache import FactsCache
 import subscription_manager.injection as inj
 from subscription_manager.jsonwrapper import PoolWrapper
 from subscription_manager import managerlib
@@ -331,6 +333,26 @@ class CliCommand(AbstractCLICommand):
         log.debug('%s', self.identity)
         return self.identity.is_valid()
 
+    def prefetch_status(self, *cache_names):
+        """
+        Start loading the server status of the given status caches in the
+        background, so the command can do other work while it waits.
+        """
+        if not self.is_registered():
+            return
+        # The server computes these statuses from the installed products we
+        # report, so those have to be up to date first (BZ 1357152). If that
+        # fails, leave it to the usual sequential loading to report the error.
+        try:
+            inj.require(inj.INSTALLED_PRODUCTS_MANAGER).update_check(self.cp, self.identity.uuid)
+        except Exception as e:
+            log.debug("Not prefetching status, unable to update installed products: %s", e)
+            return
+        status_caches = [inj.require(cache_name) for cache_name in cache_names]
+        cp_provider = inj.require(inj.CP_PROVIDER)
+        prefetcher = StatusCachePrefetcher(cp_provider.new_consumer_auth_cp)
+        prefetcher.prefetch(status_caches, self.identity.uuid)
+
     def persist_server_options(self):
         """
         Whether to persist options like --serverurl or --baseurl to the
@@ -2046,6 +2068,10 @@ class FactsCommand(CliCommand):
         self._validate_options()
         facts = inj.require(inj.FACTS)
 
+        if self.options.update:
+            # collect every fact again, including those that rarely change
+            FactsCache().delete()
+
         if self.options.list:
             facts_dict = facts.get_facts()
             facts_keys = sorted(facts_dict.keys())
@@ -2547,6 +2573,7 @@ class ListCommand(CliCommand):
         self._validate_options()
 
         if self.options.installed and not self.options.pid_only:
+            self.prefetch_status(inj.ENTITLEMENT_STATUS_CACHE, inj.PROD_STATUS_CACHE)
             installed_products = products.InstalledProducts(self.cp).list(self.options.filter_string)
 
             if len(installed_products):
@@ -2574,6 +2601,7 @@ class ListCommand(CliCommand):
             elif self.options.after_date:
                 after_date = self._parse_date(self.options.after_date)
 
+            # print the pools as the pages arrive from the server
             epools = entitlement.EntitlementService().get_available_pools(
                 show_all=self.options.all,
                 on_date=on_date,
@@ -2582,47 +2610,52 @@ class ListCommand(CliCommand):
                 matches=self.options.filter_string,
                 service_level=self.options.service_level,
                 after_date=after_date,
+                page_size=managerlib.POOL_PAGE_SIZE,
             )
 
-            if len(epools):
+            found = False
+            for data in epools:
                 if self.options.pid_only:
-                    for data in epools:
-                        print(data['id'])
-                else:
+                    print(data['id'])
+                    found = True
+                    continue
+
+                if not found:
                     print("+-------------------------------------------+")
                     print("    " + _("Available Subscriptions"))
                     print("+-------------------------------------------+")
+                    found = True
 
-                    for data in epools:
-                        if PoolWrapper(data).is_virt_only():
-                            machine_type = _("Virtual")
-                        else:
-                            machine_type = _("Physical")
+                if PoolWrapper(data).is_virt_only():
+                    machine_type = _("Virtual")
+                else:
+                    machine_type = _("Physical")
 
-                        if 'management_enabled' in data and data['management_enabled']:
-                            data['management_enabled'] = _("Yes")
-                        else:
-                            data['management_enabled'] = _("No")
-
-                        kwargs = {"filter_string": self.options.filter_string,
-                                  "match_columns": AVAILABLE_SUBS_MATCH_COLUMNS,
-                                  "is_atty": sys.stdout.isatty()}
-                        print(columnize(AVAILABLE_SUBS_LIST, highlight_by_filter_string_columnize_cb,
-                                data['productName'],
-                                data['providedProducts'],
-                                data['productId'],
-                                data['contractNumber'] or "",
-                                data['id'],
-                                data['management_enabled'],
-                                data['quantity'],
-                                data['suggested'],
-                                data['service_level'] or "",
-                                data['service_type'] or "",
-                                data['pool_type'],
-                                data['startDate'],
-                                data['endDate'],
-                                machine_type, **kwargs) + "\n")
-            elif not self.options.pid_only:
+                if 'management_enabled' in data and data['management_enabled']:
+                    data['management_enabled'] = _("Yes")
+                else:
+                    data['management_enabled'] = _("No")
+
+                kwargs = {"filter_string": self.options.filter_string,
+                          "match_columns": AVAILABLE_SUBS_MATCH_COLUMNS,
+                          "is_atty": sys.stdout.isatty()}
+                print(columnize(AVAILABLE_SUBS_LIST, highlight_by_filter_string_columnize_cb,
+                        data['productName'],
+                        data['providedProducts'],
+                        data['productId'],
+                        data['contractNumber'] or "",
+                        data['id'],
+                        data['management_enabled'],
+                        data['quantity'],
+                        data['suggested'],
+                        data['service_level'] or "",
+                        data['service_type'] or "",
+                        data['pool_type'],
+                        data['startDate'],
+                        data['endDate'],
+                        machine_type, **kwargs) + "\n")
+
+            if not found and not self.options.pid_only:
                 if self.options.filter_string and self.options.service_level:
                     print(
                         _("No available subscription pools were found matching the expression \"%s\" and the service level \"%s\".")
@@ -2861,17 +2894,10 @@ class StatusCommand(CliCommand):
             except ValueError as err:
                 system_exit(os.EX_DATAERR, err)
 
-        print("+-------------------------------------------+")
-        print("   " + _("System Status Details"))
-        print("+-------------------------------------------+")
-
-        service_status = entitlement.EntitlementService(None).get_status(on_date)
-        reasons = service_status['reasons']
-
-        if service_status['valid']:
-            result = 0
-        else:
-            result = 1
+        # the content access mode check below does not depend on the
+        # compliance status, so ask the server for both at once
+        if on_date is None:
+            self.prefetch_status(inj.ENTITLEMENT_STATUS_CACHE)
 
         ca_message = ""
         has_cert = (_(
@@ -2889,6 +2915,18 @@ class StatusCommand(CliCommand):
             except Exception as e:
                 log.debug("Unable to check the orgs content access mode: %s" % e)
 
+        print("+-------------------------------------------+")
+        print("   " + _("System Status Details"))
+        print("+-------------------------------------------+")
+
+        service_status = entitlement.EntitlementService(None).get_status(on_date)
+        reasons = service_status['reasons']
+
+        if service_status['valid']:
+            result = 0
+        else:
+            result = 1
+
         print(_("Overall Status: %s\n%s") % (service_status['status'], ca_message))
 
         columns = get_terminal_width()
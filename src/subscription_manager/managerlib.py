@@ -26,8 +26,10 @@ import syslog
 
 from rhsm.config import initConfig
 from rhsm.certificate import Key, CertificateException, create_from_pem
+from rhsmlib.facts.cache import FactsCache
 
 import subscription_manager.cache as cache
+from subscription_manager.certdirectory import CertificateCache, Path
 from subscription_manager.cert_sorter import StackingGroupSorter, ComplianceManager
 from subscription_manager import identity
 from subscription_manager.injection import require, CERT_SORTER, \
@@ -54,6 +56,9 @@ ENT_CONFIG_DIR = cfg.get('rhsm', 'entitlementCertDir')
 # Expected permissions for identity certificates:
 ID_CERT_PERMS = stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP
 
+# Number of pools requested at a time when pools are listed page by page
+POOL_PAGE_SIZE = 500
+
 
 def system_log(message, priority=syslog.LOG_NOTICE):
     utils.system_log(message, priority)
@@ -110,6 +115,7 @@ class PoolFilter(object):
         in the requested list of product ids. Both the top level product
         and all provided products will be checked.
         """
+        product_ids = set(product_ids)
         matched_pools = []
         for pool in pools:
             if pool['productId'] in product_ids:
@@ -124,23 +130,29 @@ class PoolFilter(object):
                     break
         return matched_pools
 
+    def _get_installed_product_ids(self):
+        return set(str(product.products[0].id) for product in self.product_directory.list())
+
+    def _pool_product_ids(self, pool):
+        """
+        Returns the ids of the product of a pool and of the products it
+        provides.
+        """
+        product_ids = set(p['productId'] for p in pool['providedProducts'])
+        product_ids.add(pool['productId'])
+        return product_ids
+
     def filter_out_uninstalled(self, pools):
         """
         Filter the given list of pools, return only those which provide
         a product installed on this system.
         """
-        installed_products = self.product_directory.list()
+        installed_ids = self._get_installed_product_ids()
         matched_data_dict = {}
         for d in pools:
-            for product in installed_products:
-                productid = product.products[0].id
-                # we only need one matched item per pool id, so add to dict to keep unique:
-                # Build a list of provided product IDs for comparison:
-                provided_ids = [p['productId'] for p in d['providedProducts']]
-
-                if str(productid) in provided_ids or \
-                        str(productid) == d['productId']:
-                    matched_data_dict[d['id']] = d
+            # we only need one matched item per pool id, so add to dict to keep unique:
+            if not installed_ids.isdisjoint(self._pool_product_ids(d)):
+                matched_data_dict[d['id']] = d
 
         return list(matched_data_dict.values())
 
@@ -149,18 +161,13 @@ class PoolFilter(object):
         Filter the given list of pools, return only those which do not provide
         a product installed on this system.
         """
-        installed_products = self.product_directory.list()
+        installed_ids = self._get_installed_product_ids()
         matched_data_dict = {}
         for d in pools:
+            # we only need one matched item per pool id, so add to dict to keep unique:
             matched_data_dict[d['id']] = d
-            provided_ids = [p['productId'] for p in d['providedProducts']]
-            for product in installed_products:
-                productid = product.products[0].id
-                # we only need one matched item per pool id, so add to dict to keep unique:
-                if str(productid) in provided_ids or \
-                        str(productid) == d['productId']:
-                    del matched_data_dict[d['id']]
-                    break
+            if not installed_ids.isdisjoint(self._pool_product_ids(d)):
+                del matched_data_dict[d['id']]
 
         return list(matched_data_dict.values())
 
@@ -198,18 +205,36 @@ class PoolFilter(object):
                 entitled_products_to_certs[prod_id].add(cert)
         return entitled_products_to_certs
 
-    def _dates_overlap(self, pool, certs):
-        pool_start = isodate.parse_date(pool['startDate'])
-        pool_end = isodate.parse_date(pool['endDate'])
+    def _get_entitled_product_to_date_ranges(self):
+        """
+        Returns a dict mapping the ids of the entitled products to the
+        validity date ranges of the certificates providing them.
+        """
+        return dict((prod_id, [cert.valid_range for cert in certs]) for prod_id, certs in
+                    self._get_entitled_product_to_cert_map().items())
 
-        for cert in certs:
-            cert_range = cert.valid_range
+    def _dates_overlap(self, pool_start, pool_end, date_ranges):
+        for cert_range in date_ranges:
             if cert_range.has_date(pool_start) or cert_range.has_date(pool_end):
                 return True
         return False
 
+    def _is_overlapping(self, pool, provided_ids, entitled_date_ranges):
+        # a pool overlaps when each of its products is fully entitled for
+        # its dates already
+        if not provided_ids.issubset(entitled_date_ranges):
+            return False
+        pool_start = isodate.parse_date(pool['startDate'])
+        pool_end = isodate.parse_date(pool['endDate'])
+        partially_valid_products = self.sorter.partially_valid_products
+        for productid in provided_ids:
+            if not self._dates_overlap(pool_start, pool_end, entitled_date_ranges[productid]) \
+                    or productid in partially_valid_products:
+                return False
+        return True
+
     def filter_out_overlapping(self, pools):
-        entitled_product_ids_to_certs = self._get_entitled_product_to_cert_map()
+        entitled_date_ranges = self._get_entitled_product_to_date_ranges()
         filtered_pools = []
         for pool in pools:
             provided_ids = set([p['productId'] for p in pool['providedProducts']])
@@ -217,22 +242,17 @@ class PoolFilter(object):
             # NOTE: We may have to check for other types or handle the case of a product with no type in the future
             if wrapped_pool.get_product_attributes('type')['type'] == 'SVC':
                 provided_ids.add(pool['productId'])
-            overlap = 0
-            possible_overlap_pids = provided_ids.intersection(list(entitled_product_ids_to_certs.keys()))
-            for productid in possible_overlap_pids:
-                if self._dates_overlap(pool, entitled_product_ids_to_certs[productid]) \
-                        and productid not in self.sorter.partially_valid_products:
-                    overlap += 1
-                else:
-                    break
-            if overlap != len(provided_ids) or wrapped_pool.get_stacking_id() in self.sorter.partial_stacks:
+            if not self._is_overlapping(pool, provided_ids, entitled_date_ranges) \
+                    or wrapped_pool.get_stacking_id() in self.sorter.partial_stacks:
                 filtered_pools.append(pool)
 
         return filtered_pools
 
     def filter_out_non_overlapping(self, pools):
-        not_overlapping = self.filter_out_overlapping(pools)
-        return [pool for pool in pools if pool not in not_overlapping]
+        # the pools returned are the same objects, and several of them can
+        # have the same id
+        not_overlapping = set(id(pool) for pool in self.filter_out_overlapping(pools))
+        return [pool for pool in pools if id(pool) not in not_overlapping]
 
     def filter_subscribed_pools(self, pools, subscribed_pool_ids,
             compatible_pools):
@@ -241,8 +261,9 @@ class PoolFilter(object):
         already has a subscription, unless the pool can be subscribed to again
         (ie has multi-entitle).
         """
-        resubscribeable_pool_ids = [pool['id'] for pool in
-                                    list(compatible_pools.values())]
+        subscribed_pool_ids = set(subscribed_pool_ids)
+        resubscribeable_pool_ids = set(pool['id'] for pool in
+                                       compatible_pools.values())
 
         filtered_pools = []
         for pool in pools:
@@ -253,12 +274,15 @@ class PoolFilter(object):
 
 
 def list_pools(uep, consumer_uuid, list_all=False, active_on=None, filter_string=None, future=None,
-               after_date=None):
+               after_date=None, page_size=None):
     """
     Wrapper around the UEP call to fetch pools, which forces a facts update
     if anything has changed before making the request. This ensures the
     rule checks server side will have the most up to date info about the
     consumer possible.
+
+    If page_size is given, the pools are requested page_size at a time and
+    a rhsm.connection.PageIterator over them is returned.
     """
 
     # client tells service 'look for facts again'
@@ -284,6 +308,11 @@ def list_pools(uep, consumer_uuid, list_all=False, active_on=None, filter_string
     owner = uep.getOwner(consumer_uuid)
     ownerid = owner['key']
 
+    if page_size:
+        return uep.iterPoolsList(page_size, consumer=consumer_uuid, listAll=list_all,
+                active_on=active_on, owner=ownerid, filter_string=filter_string, future=future,
+                after_date=after_date)
+
     return uep.getPoolsList(consumer=consumer_uuid, listAll=list_all,
             active_on=active_on, owner=ownerid, filter_string=filter_string, future=future,
                             after_date=after_date)
@@ -301,6 +330,28 @@ def get_available_entitlements(get_all=False, active_on=None, overlapping=False,
     The 'all' setting can be used to return all pools, even if the rules do
     not pass. (i.e. show pools that are incompatible for your hardware)
     """
+    pool_stash = PoolStash()
+    dlist = pool_stash.get_filtered_pools_list(active_on, not get_all,
+           overlapping, uninstalled, text, filter_string, future=future, after_date=after_date)
+    return _format_available_pools(dlist)
+
+
+def iter_available_entitlements(get_all=False, active_on=None, overlapping=False,
+                                uninstalled=False, text=None, filter_string=None,
+                                future=None, after_date=None, page_size=POOL_PAGE_SIZE):
+    """
+    Like get_available_entitlements, but the pools are requested from the
+    server page_size at a time and yielded as each page arrives.
+    """
+    pool_stash = PoolStash()
+    for dlist in pool_stash.iter_filtered_pools(active_on, not get_all,
+            overlapping, uninstalled, text, filter_string, future=future, after_date=after_date,
+            page_size=page_size):
+        for data in _format_available_pools(dlist):
+            yield data
+
+
+def _format_available_pools(dlist):
     columns = [
         'id',
         'quantity',
@@ -319,10 +370,6 @@ def get_available_entitlements(get_all=False, active_on=None, overlapping=False,
         'management_enabled'
     ]
 
-    pool_stash = PoolStash()
-    dlist = pool_stash.get_filtered_pools_list(active_on, not get_all,
-           overlapping, uninstalled, text, filter_string, future=future, after_date=after_date)
-
     for pool in dlist:
         pool_wrapper = PoolWrapper(pool)
         pool['providedProducts'] = pool_wrapper.get_provided_products()
@@ -487,7 +534,7 @@ class PoolStash(object):
         self.compatible_pools = {}
         log.debug("Refreshing pools from server...")
         for pool in list_pools(require(CP_PROVIDER).get_consumer_auth_cp(),
-                self.identity.uuid, active_on=active_on):
+                self.identity.uuid, active_on=active_on, page_size=POOL_PAGE_SIZE):
             self.compatible_pools[pool['id']] = pool
             self.all_pools[pool['id']] = pool
 
@@ -495,7 +542,7 @@ class PoolStash(object):
         # Sadly this currently requires a second query to the server.
         self.incompatible_pools = {}
         for pool in list_pools(require(CP_PROVIDER).get_consumer_auth_cp(),
-                self.identity.uuid, list_all=True, active_on=active_on):
+                self.identity.uuid, list_all=True, active_on=active_on, page_size=POOL_PAGE_SIZE):
             if not pool['id'] in self.compatible_pools:
                 self.incompatible_pools[pool['id']] = pool
                 self.all_pools[pool['id']] = pool
@@ -537,6 +584,36 @@ class PoolStash(object):
 
         return self._filter_pools(incompatible, overlapping, uninstalled, False, text)
 
+    def iter_filtered_pools(self, active_on, incompatible,
+            overlapping, uninstalled, text, filter_string, future=None, after_date=None,
+            page_size=POOL_PAGE_SIZE):
+        """
+        Like get_filtered_pools_list, but the pools are requested from the
+        server page_size at a time, and a list of the filtered pools of each
+        page is yielded as it arrives. The pools are not kept in the stash.
+
+        A pool that moves to a later page while paging, e.g. when pools are
+        added on the server, is only yielded the first time it is seen.
+        """
+        self.all_pools = {}
+        self.compatible_pools = {}
+        if active_on and overlapping:
+            self.sorter = ComplianceManager(active_on)
+        elif not active_on and overlapping:
+            self.sorter = require(CERT_SORTER)
+
+        pages = list_pools(require(CP_PROVIDER).get_consumer_auth_cp(),
+            self.identity.uuid, list_all=not incompatible, active_on=active_on,
+            filter_string=filter_string, future=future, after_date=after_date,
+            page_size=page_size)
+        pool_filter = PoolFilter(require(PROD_DIR), require(ENT_DIR), self.sorter)
+        seen_pool_ids = set()
+        for pools in pages.iter_pages():
+            pools = [pool for pool in pools if pool['id'] not in seen_pool_ids]
+            seen_pool_ids.update(pool['id'] for pool in pools)
+            yield self._filter_pool_list(pools, overlapping, uninstalled, False, text,
+                                         pool_filter=pool_filter)
+
     def _get_subscribed_pool_ids(self):
         return [ent.pool.id for ent in require(ENT_DIR).list()]
 
@@ -557,8 +634,18 @@ class PoolStash(object):
             log.debug("\tRemoved %d incompatible pools" %
                        len(self.incompatible_pools))
 
-        pool_filter = PoolFilter(require(PROD_DIR),
-                require(ENT_DIR), self.sorter)
+        pools = self._filter_pool_list(pools, overlapping, uninstalled, subscribed, text)
+
+        log.debug("\t%d pools to display, %d filtered out" % (len(pools),
+            len(self.all_pools) - len(pools)))
+
+        return pools
+
+    def _filter_pool_list(self, pools, overlapping, uninstalled, subscribed, text,
+            pool_filter=None):
+        if pool_filter is None:
+            pool_filter = PoolFilter(require(PROD_DIR),
+                    require(ENT_DIR), self.sorter)
 
         # Filter out products that are not installed if necessary:
         if uninstalled:
@@ -587,9 +674,6 @@ class PoolStash(object):
             log.debug("\tRemoved %d pools that we're already subscribed to" %
                       (prev_length - len(pools)))
 
-        log.debug("\t%d pools to display, %d filtered out" % (len(pools),
-            len(self.all_pools) - len(pools)))
-
         return pools
 
     def merge_pools(self, incompatible=False, overlapping=False,
@@ -852,6 +936,7 @@ def clean_all_data(backup=True):
             os.remove(certpath)
     else:
         log.warn("Entitlement cert directory does not exist: %s" % ent_cert_dir)
+    CertificateCache(Path.abs(ent_cert_dir)).delete()
 
     # Subclasses of cache.CacheManager have a @classmethod delete_cache
     # for deleting persistent caches
@@ -861,6 +946,7 @@ def clean_all_data(backup=True):
         SyncedStore(None).update_cache({})
     # FIXME: implement as dbus client to facts service DeleteCache() once implemented
     # Facts.delete_cache()
+    FactsCache().delete()
     # WrittenOverridesCache is also a subclass of cache.CacheManager, but
     # it is deleted in RepoActionInvoker.delete_repo_file() below.
     # StatusCache subclasses have a a per instance cache varable
@@ -24,7 +24,10 @@ from iniparse import RawConfigParser as ConfigParser
 import logging
 import os
 import re
+import six
+import stat
 import string
+import tempfile
 
 try:
     from debian.deb822 import Deb822
@@ -464,9 +467,48 @@ class YumRepoFile(RepoFileBase, ConfigParser):
     def __init__(self, path=None, name=None):
         ConfigParser.__init__(self)
         RepoFileBase.__init__(self, path, name)
+        # The sections as they were last read or written, the stat of the
+        # file at that time, and the sections changed since, see _has_changed
+        self._snapshot = None
+        self._file_state = None
+        self._dirty_sections = set()
 
     def read(self):
+        file_state = self._stat_file()
         ConfigParser.read(self, self.path)
+        self._take_snapshot(file_state)
+
+    def _stat_file(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime)
+
+    def _section_items(self, section):
+        # Sometimes we end up with ints, but values must be strings to compare
+        return dict([(str(k), str(v)) for (k, v) in self.items(section)])
+
+    def _take_snapshot(self, file_state):
+        self._snapshot = dict((section, self._section_items(section)) for section in self.sections())
+        self._file_state = file_state
+        self._dirty_sections = set()
+
+    def add_section(self, section):
+        ConfigParser.add_section(self, section)
+        self._dirty_sections.add(section)
+
+    def set(self, section, option, value):
+        ConfigParser.set(self, section, option, value)
+        self._dirty_sections.add(section)
+
+    def remove_option(self, section, option):
+        self._dirty_sections.add(section)
+        return ConfigParser.remove_option(self, section, option)
+
+    def remove_section(self, section):
+        self._dirty_sections.add(section)
+        return ConfigParser.remove_section(self, section)
 
     def _configparsers_equal(self, otherparser):
         if set(otherparser.sections()) != set(self.sections()):
@@ -483,21 +525,60 @@ class YumRepoFile(RepoFileBase, ConfigParser):
         '''
         Check if the version on disk is different from what we have loaded
         '''
+        if self._snapshot is not None and self._stat_file() == self._file_state:
+            # The file is as we last read or wrote it, so only the sections
+            # changed since then need to be compared.
+            if set(self._snapshot) != set(self.sections()):
+                return True
+            # The section sets match, so a dirty section that is gone now
+            # was added and removed again since the snapshot.
+            for section in self._dirty_sections:
+                if not self.has_section(section):
+                    continue
+                if self._snapshot.get(section) != self._section_items(section):
+                    return True
+            return False
+
         on_disk = ConfigParser()
         on_disk.read(self.path)
         return not self._configparsers_equal(on_disk)
 
+    def _replace_file(self, content):
+        """
+        Replaces the repo file with content, so that package managers reading
+        it at the same time see either the old or the new file, never a
+        partly written one.
+        """
+        try:
+            mode = stat.S_IMODE(os.stat(self.path).st_mode)
+        except OSError:
+            mode = 0o644
+        directory = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.%s' % os.path.basename(self.path))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, mode)
+            os.rename(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
     def write(self):
         if not self.manage_repos:
             log.debug("Skipping write due to manage_repos setting: %s" %
                     self.path)
             return
         if self._has_changed():
-            f = open(self.path, 'w')
-            tidy_writer = TidyWriter(f)
+            output = six.StringIO()
+            tidy_writer = TidyWriter(output)
             ConfigParser.write(self, tidy_writer)
             tidy_writer.close()
-            f.close()
+            self._replace_file(output.getvalue())
+        self._take_snapshot(self._stat_file())
 
     def add(self, repo):
         self.add_section(repo.id)
@@ -516,6 +597,7 @@ class YumRepoFile(RepoFileBase, ConfigParser):
 
         for k, v in list(repo.items()):
             ConfigParser.set(self, repo.id, k, v)
+        self._dirty_sections.add(repo.id)
 
     def section(self, section):
         if self.has_section(section):
@@ -17,7 +17,7 @@ import os
 import unittest
 import zlib
 
-from rhsm.bitstream import GhettoBitStream
+from rhsm.bitstream import BitReader, GhettoBitStream
 
 DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
                     'entitlement_data.bin')
@@ -75,3 +75,41 @@ class TestGhettoBitStream(unittest.TestCase):
         self.assertEqual(self.bs.combine_bytes([1, 3]), 259)
         self.assertEqual(self.bs.combine_bytes([3]), 3)
         self.assertEqual(self.bs.combine_bytes([1, 1, 3]), 65795)
+
+
+class TestBitReader(unittest.TestCase):
+    def setUp(self):
+        self.reader = BitReader(tree_data)
+
+    def test_pop_byte(self):
+        self.assertEqual(self.reader.pop_byte(), 5)
+        self.assertEqual(self.reader.bits_left, (len(tree_data) - 1) * 8)
+
+    def test_matches_ghetto_bit_stream(self):
+        bits = ''.join(GhettoBitStream(tree_data))
+        reader_bits = []
+        while self.reader.bits_left:
+            reader_bits.append(str(self.reader.read(1)))
+        self.assertEqual(''.join(reader_bits), bits)
+
+    def test_peek_does_not_consume(self):
+        reader = BitReader(b'\xd5\x06')
+        self.assertEqual(reader.peek(4), 13)
+        self.assertEqual(reader.peek(12), 3408)
+        self.assertEqual(reader.bits_left, 16)
+
+    def test_skip(self):
+        reader = BitReader(b'\xd5\x06')
+        reader.skip(3)
+        self.assertEqual(reader.read(8), 168)
+        self.assertEqual(reader.bits_left, 5)
+
+    def test_peek_past_end_pads_with_zeros(self):
+        reader = BitReader(b'\xff')
+        self.assertEqual(reader.peek(12), 4080)
+        self.assertEqual(reader.bits_left, 8)
+
+    def test_skip_past_end(self):
+        reader = BitReader(b'\xff')
+        reader.peek(12)
+        self.assertRaises(EOFError, reader.skip, 9)
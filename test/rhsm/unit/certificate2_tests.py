@@ -250,6 +250,21 @@ class V3CertTests(unittest.TestCase):
     def test_match_deep_path(self):
         self.assertTrue(self.ent_cert.check_path('/path/to/awesomeos/x86_64/foo/bar'))
 
+    def test_check_paths(self):
+        self.assertEqual([True, False, True, False],
+                self.ent_cert.check_paths(['/path/to/awesomeos/x86_64',
+                                           '/path/to/awesomeos',
+                                           '/foo/path/never/bar',
+                                           '/foo/path/']))
+
+    def test_path_tree_built_on_first_check(self):
+        self.assertEqual(None, self.ent_cert._path_tree_object)
+        self.ent_cert.check_path('/path/to/awesomeos/x86_64')
+        tree = self.ent_cert._path_tree_object
+        self.assertTrue(tree is not None)
+        self.ent_cert.check_path('/foo/path/never')
+        self.assertTrue(self.ent_cert._path_tree_object is tree)
+
     def test_missing_pool(self):
         self.assertEqual(None, self.ent_cert.pool)
 
@@ -18,6 +18,7 @@ from __future__ import print_function, division, absolute_import
 import datetime
 import locale
 import socket
+import threading
 import unittest
 import shutil
 import os
@@ -30,7 +31,9 @@ from rhsm import connection
 from rhsm.connection import UEPConnection, Restlib, ConnectionException, ConnectionSetupException, \
         BadCertificateException, RestlibException, GoneException, NetworkException, \
         RemoteServerException, drift_check, ExpiredIdentityCertException, UnauthorizedException, \
-        ForbiddenException, AuthenticationException, RateLimitExceededException, ContentConnection
+        ForbiddenException, AuthenticationException, RateLimitExceededException, ContentConnection, \
+        ConnectionPool, Validators, PageIterator
+from rhsm.https import httplib
 
 from mock import Mock, patch
 from datetime import date
@@ -91,6 +94,21 @@ class ConnectionTests(unittest.TestCase):
         self.cp.conn.request_get.assert_called_with(
                 "/owners/myorg/environments?name=env+name__%2B%2B%3D%2A%26")
 
+    def test_get_pools_page(self):
+        self.cp.conn = Mock()
+        self.cp.conn.request_get = Mock(return_value=[])
+        self.cp.getPoolsList(owner="myorg", page=2, per_page=100, sort_by="id", order="asc")
+        self.cp.conn.request_get.assert_called_with(
+                "/owners/myorg/pools?&page=2&per_page=100&sort_by=id&order=asc")
+
+    def test_iter_pools_list(self):
+        self.cp.conn = Mock()
+        self.cp.conn.request_get = Mock(side_effect=[[{'id': 'pool1'}, {'id': 'pool2'}], [{'id': 'pool3'}]])
+        pools = self.cp.iterPoolsList(2, owner="myorg", listAll=True)
+        self.assertEqual(['pool1', 'pool2', 'pool3'], [pool['id'] for pool in pools])
+        self.cp.conn.request_get.assert_called_with(
+                "/owners/myorg/pools?&listall=true&page=2&per_page=2")
+
     def test_entitle_date(self):
         self.cp.conn = Mock()
         self.cp.conn.request_post = Mock(return_value=[])
@@ -104,6 +122,20 @@ class ConnectionTests(unittest.TestCase):
         self.cp.bind("abcd")
         self.cp.conn.request_post.assert_called_with("/consumers/abcd/entitlements")
 
+    def test_update_profile_delta(self):
+        self.cp.conn = Mock()
+        self.cp.conn.request_post = Mock(return_value=None)
+        delta = [{"content_type": "rpm", "added": [{"name": "a"}], "removed": []}]
+        self.cp.updateProfileDelta("abcd", delta)
+        self.cp.conn.request_post.assert_called_with("/consumers/abcd/profiles/delta", delta)
+
+    def test_update_consumer_facts_delta(self):
+        self.cp.conn = Mock()
+        self.cp.conn.request_post = Mock(return_value=None)
+        self.cp.updateConsumerFactsDelta("abcd", {"a": "1"}, ["b"])
+        self.cp.conn.request_post.assert_called_with("/consumers/abcd/facts/delta",
+                                                     {"changed": {"a": "1"}, "removed": ["b"]})
+
     def test_clean_up_prefix(self):
         self.assertTrue(self.cp.handler == "/Test")
 
@@ -612,6 +644,526 @@ class RestlibTests(unittest.TestCase):
         self.assertTrue(isinstance(data["phoneNumbers"][0][0]["type"], type(u"")))
 
 
+def mock_response(content='{}', will_close=False, status=200):
+    response = Mock()
+    response.status = status
+    response.will_close = will_close
+    response.read.return_value = content.encode('utf-8')
+    response.getheaders.return_value = []
+    response.getheader.return_value = None
+    return response
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(idle_timeout=15, max_connections=2)
+        usable_patcher = patch.object(ConnectionPool, '_is_usable', return_value=True)
+        self.is_usable = usable_patcher.start()
+        self.addCleanup(usable_patcher.stop)
+
+    def test_get_empty(self):
+        self.assertEqual(None, self.pool.get('key'))
+
+    def test_put_get(self):
+        conn = Mock()
+        self.pool.put('key', conn)
+        self.assertEqual(None, self.pool.get('other'))
+        self.assertEqual(conn, self.pool.get('key'))
+        self.assertEqual(None, self.pool.get('key'))
+        self.assertEqual(1, self.pool.reused)
+        self.assertFalse(conn.close.called)
+
+    def test_max_connections(self):
+        conns = [Mock(), Mock(), Mock()]
+        for conn in conns:
+            self.pool.put('key', conn)
+        self.assertTrue(conns[2].close.called)
+        self.assertEqual(conns[1], self.pool.get('key'))
+        self.assertEqual(conns[0], self.pool.get('key'))
+
+    @patch('rhsm.connection.time.time')
+    def test_idle_timeout(self, mock_time):
+        conn = Mock()
+        mock_time.return_value = 100
+        self.pool.put('key', conn)
+        mock_time.return_value = 116
+        self.assertEqual(None, self.pool.get('key'))
+        self.assertTrue(conn.close.called)
+
+    def test_unusable_connection_is_closed(self):
+        conn = Mock()
+        self.pool.put('key', conn)
+        self.is_usable.return_value = False
+        self.assertEqual(None, self.pool.get('key'))
+        self.assertTrue(conn.close.called)
+
+    def test_disabled(self):
+        pool = ConnectionPool(idle_timeout=0, max_connections=2)
+        conn = Mock()
+        pool.put('key', conn)
+        self.assertTrue(conn.close.called)
+        self.assertEqual(None, pool.get('key'))
+
+    def test_clear(self):
+        conn = Mock()
+        other = Mock()
+        self.pool.put('key', conn)
+        self.pool.put('other', other)
+        self.pool.clear('key')
+        self.assertTrue(conn.close.called)
+        self.assertFalse(other.close.called)
+        self.pool.clear()
+        self.assertTrue(other.close.called)
+
+    def test_session_requires_same_context(self):
+        conn = Mock()
+        self.pool.put('key', conn)
+        self.assertEqual(conn.sock.session, self.pool.session('key', conn._context))
+        self.assertEqual(None, self.pool.session('key', Mock()))
+
+
+class RestlibConnectionReuseTests(unittest.TestCase):
+    def setUp(self):
+        self.pool = ConnectionPool(idle_timeout=15, max_connections=2)
+        pool_patcher = patch.object(Restlib, 'connection_pool', self.pool)
+        pool_patcher.start()
+        self.addCleanup(pool_patcher.stop)
+        usable_patcher = patch.object(ConnectionPool, '_is_usable', return_value=True)
+        usable_patcher.start()
+        self.addCleanup(usable_patcher.stop)
+
+        self.restlib = Restlib("somehost", "123", "/handler")
+        create_patcher = patch.object(self.restlib, '_create_connection')
+        self.create_connection = create_patcher.start()
+        self.addCleanup(create_patcher.stop)
+
+    def test_connection_reused(self):
+        conn = Mock()
+        conn.getresponse.return_value = mock_response()
+        self.create_connection.return_value = conn
+
+        self.restlib.request_get('/status')
+        self.restlib.request_get('/status')
+        self.assertEqual(1, self.create_connection.call_count)
+        self.assertEqual(2, conn.request.call_count)
+
+    def test_closed_by_server_not_reused(self):
+        conn = Mock()
+        conn.getresponse.return_value = mock_response(will_close=True)
+        self.create_connection.return_value = conn
+
+        self.restlib.request_get('/status')
+        self.restlib.request_get('/status')
+        self.assertEqual(2, self.create_connection.call_count)
+        self.assertTrue(conn.close.called)
+
+    def test_stale_connection_retried(self):
+        stale = Mock()
+        stale.getresponse.side_effect = [mock_response(), httplib.BadStatusLine('')]
+        fresh = Mock()
+        fresh.getresponse.return_value = mock_response('{"result": 1}')
+        self.create_connection.side_effect = [stale, fresh]
+
+        self.restlib.request_get('/status')
+        self.assertEqual({'result': 1}, self.restlib.request_get('/status'))
+        self.assertTrue(stale.close.called)
+
+    def test_sent_post_not_retried(self):
+        conn = Mock()
+        conn.getresponse.side_effect = [mock_response(), httplib.BadStatusLine('')]
+        self.create_connection.return_value = conn
+
+        self.restlib.request_get('/status')
+        self.assertRaises(httplib.BadStatusLine, self.restlib.request_post, '/consumers', {'name': 'test'})
+        self.assertEqual(1, self.create_connection.call_count)
+        self.assertEqual(2, conn.request.call_count)
+
+    def test_unsent_post_retried(self):
+        stale = Mock()
+        stale.getresponse.return_value = mock_response()
+        stale.request.side_effect = [None, httplib.CannotSendRequest()]
+        fresh = Mock()
+        fresh.getresponse.return_value = mock_response('{"uuid": "abc"}')
+        self.create_connection.side_effect = [stale, fresh]
+
+        self.restlib.request_get('/status')
+        self.assertEqual({'uuid': 'abc'}, self.restlib.request_post('/consumers', {'name': 'test'}))
+        self.assertEqual(1, fresh.request.call_count)
+
+    def test_sent_put_not_retried(self):
+        conn = Mock()
+        conn.getresponse.side_effect = [mock_response(), httplib.BadStatusLine('')]
+        self.create_connection.return_value = conn
+
+        self.restlib.request_get('/status')
+        self.assertRaises(httplib.BadStatusLine, self.restlib.request_put, '/consumers/abc', {'facts': {}})
+        self.assertEqual(1, self.create_connection.call_count)
+
+    def test_timeout_not_retried(self):
+        conn = Mock()
+        conn.getresponse.side_effect = [mock_response(), socket.timeout('timed out')]
+        self.create_connection.return_value = conn
+
+        self.restlib.request_get('/status')
+        self.assertRaises(socket.timeout, self.restlib.request_get, '/status')
+        self.assertEqual(1, self.create_connection.call_count)
+
+    def test_new_connection_not_retried(self):
+        conn = Mock()
+        conn.getresponse.side_effect = httplib.BadStatusLine('')
+        self.create_connection.return_value = conn
+
+        self.assertRaises(httplib.BadStatusLine, self.restlib.request_get, '/status')
+        self.assertEqual(1, self.create_connection.call_count)
+        self.assertTrue(conn.close.called)
+        self.assertEqual(None, self.pool.get(self.restlib._connection_key()))
+
+    def test_key_changes_with_cert(self):
+        temp_dir = mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        cert_file = os.path.join(temp_dir, 'cert.pem')
+        with open(cert_file, 'w') as f:
+            f.write('old')
+        restlib = Restlib("somehost", "123", "/handler", cert_file=cert_file)
+        key = restlib._connection_key()
+        self.assertEqual(key, restlib._connection_key())
+        with open(cert_file, 'w') as f:
+            f.write('renewed')
+        self.assertNotEqual(key, restlib._connection_key())
+
+
+class RestlibCompressionTests(unittest.TestCase):
+    def setUp(self):
+        self.restlib = Restlib("somehost", "123", "/handler")
+        self.conn = Mock()
+        self.conn.getresponse.return_value = mock_response(will_close=True)
+        patcher = patch.object(self.restlib, '_get_connection', return_value=(self.conn, False))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _sent(self):
+        return self.conn.request.call_args[1]['body'], self.conn.request.call_args[1]['headers']
+
+    def test_accepts_gzip(self):
+        self.restlib.request_get('/status')
+        self.assertEqual('gzip', self._sent()[1]['Accept-Encoding'])
+
+    def test_gzip_response_decoded(self):
+        content = json.dumps({'pools': ['pool'] * 1000})
+        response = mock_response(will_close=True)
+        response.read.return_value = connection.gzip_compress(content.encode('utf-8'))
+        response.getheader.side_effect = lambda name: 'gzip' if name == 'content-encoding' else None
+        self.conn.getresponse.return_value = response
+
+        self.assertEqual({'pools': ['pool'] * 1000}, self.restlib.request_get('/pools'))
+        self.assertEqual(len(content), self.restlib.bytes_received_uncompressed)
+        self.assertTrue(self.restlib.bytes_received < self.restlib.bytes_received_uncompressed)
+
+    def test_request_not_compressed_by_default(self):
+        params = {'facts': dict(('fact.%d' % i, 'value') for i in range(1000))}
+        self.restlib.request_put('/consumers/abcd', params)
+        body, headers = self._sent()
+        self.assertFalse('Content-Encoding' in headers)
+        self.assertEqual(params, json.loads(body.decode('utf-8')))
+
+    def test_large_request_compressed(self):
+        self.restlib.compress_requests = True
+        params = {'facts': dict(('fact.%d' % i, 'value') for i in range(1000))}
+        self.restlib.request_put('/consumers/abcd', params)
+        body, headers = self._sent()
+        self.assertEqual('gzip', headers['Content-Encoding'])
+        self.assertEqual(params, json.loads(connection.gzip_decompress(body).decode('utf-8')))
+        self.assertEqual(len(body), self.restlib.bytes_sent)
+        self.assertTrue(self.restlib.bytes_sent < self.restlib.bytes_sent_uncompressed)
+
+    def test_small_request_not_compressed(self):
+        self.restlib.compress_requests = True
+        self.restlib.request_put('/consumers/abcd', {'autoheal': True})
+        self.assertFalse('Content-Encoding' in self._sent()[1])
+
+    @patch('rhsm.connection.config')
+    def test_compression_needs_capability(self, mock_config):
+        mock_config.get.side_effect = lambda section, key: '1' if key == 'compress_requests' else None
+        uep = UEPConnection(username="dummy", password="dummy", handler="/Test/", insecure=True,
+                            host="somehost", ssl_port=443, timeout=10)
+        self.assertTrue(uep.compress_requests)
+        with patch.object(uep, 'getStatus', return_value={'managerCapabilities': ['combined_reporting']}):
+            uep.has_capability('combined_reporting')
+        self.assertFalse(uep.conn.compress_requests)
+
+        uep.capabilities = None
+        with patch.object(uep, 'getStatus', return_value={'managerCapabilities': ['gzip_request']}):
+            uep.has_capability('combined_reporting')
+        self.assertTrue(uep.conn.compress_requests)
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def stream_response(content, chunk_size, status=200):
+    response = mock_response(will_close=False, status=status)
+    response.read.side_effect = chunked(content, chunk_size) + [b'']
+    return response
+
+
+class IterJsonListTests(unittest.TestCase):
+    def test_elements_across_chunks(self):
+        elements = [{'id': i, 'name': 'pool %d' % i, 'quantity': i * 10} for i in range(50)] + [1, "two", 3.5, None]
+        text = json.dumps(elements)
+        for size in (1, 2, 7, 64, len(text)):
+            self.assertEqual(elements, list(connection.iter_json_list(chunked(text, size))))
+
+    def test_number_at_chunk_boundary(self):
+        self.assertEqual([123, 45], list(connection.iter_json_list(['[12', '3, 4', '5]'])))
+
+    def test_number_ending_at_chunk_boundary(self):
+        self.assertEqual([-12500.0], list(connection.iter_json_list(['[-12', '500.', '0]'])))
+        self.assertEqual([1e+10, 7], list(connection.iter_json_list(['[1', 'e+1', '0 ', ', 7]'])))
+
+    def test_split_at_every_offset(self):
+        elements = [-12500.0, 1e-3, 0, 17, True, False, None, "a,]", {"b": [1, 2.5]}, [], -0.25]
+        text = json.dumps(elements)
+        for i in range(len(text) + 1):
+            for j in range(i, len(text) + 1):
+                chunks = [text[:i], text[i:j], text[j:]]
+                self.assertEqual(elements, list(connection.iter_json_list(chunks)), chunks)
+
+    def test_empty_list(self):
+        self.assertEqual([], list(connection.iter_json_list([' [ ', ' ] '])))
+
+    def test_not_a_list(self):
+        self.assertEqual([{'a': [1, 2]}], list(connection.iter_json_list(['{"a": ', '[1, 2]}'])))
+
+    def test_truncated(self):
+        self.assertRaises(ValueError, list, connection.iter_json_list(['[{"a": 1}, {"b"']))
+        self.assertRaises(ValueError, list, connection.iter_json_list(['[1, 2']))
+        self.assertRaises(ValueError, list, connection.iter_json_list(['']))
+
+    def test_invalid_separator(self):
+        self.assertRaises(ValueError, list, connection.iter_json_list(['[1 2]']))
+
+
+class RestlibStreamTests(unittest.TestCase):
+    def setUp(self):
+        self.restlib = Restlib("somehost", "123", "/handler")
+        self.conn = Mock()
+        patcher = patch.object(self.restlib, '_get_connection', return_value=(self.conn, False))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pools = [{'id': 'pool%d' % i, 'productName': u'Product \u00e9 %d' % i} for i in range(100)]
+
+    def test_stream_list(self):
+        content = json.dumps(self.pools).encode('utf-8')
+        self.conn.getresponse.return_value = stream_response(content, 100)
+        with patch.object(self.restlib.connection_pool, 'put') as put:
+            self.assertEqual(self.pools, list(self.restlib.request_get_iter('/pools')))
+            self.assertTrue(put.called)
+        self.assertEqual(len(content), self.restlib.bytes_received)
+
+    def test_stream_gzip(self):
+        content = json.dumps(self.pools).encode('utf-8')
+        response = stream_response(connection.gzip_compress(content), 50)
+        response.getheader.side_effect = lambda name: 'gzip' if name == 'content-encoding' else None
+        self.conn.getresponse.return_value = response
+        self.assertEqual(self.pools, list(self.restlib.request_get_iter('/pools')))
+        self.assertEqual(len(content), self.restlib.bytes_received_uncompressed)
+
+    def test_request_made_lazily(self):
+        self.conn.getresponse.return_value = stream_response(b'[]', 100)
+        pools = self.restlib.request_get_iter('/pools')
+        self.assertFalse(self.conn.request.called)
+        self.assertEqual([], list(pools))
+        self.assertTrue(self.conn.request.called)
+
+    def test_abandoned_stream_closes_connection(self):
+        self.conn.getresponse.return_value = stream_response(json.dumps(self.pools).encode('utf-8'), 100)
+        pools = self.restlib.request_get_iter('/pools')
+        next(pools)
+        pools.close()
+        self.assertTrue(self.conn.close.called)
+
+    def test_stream_error(self):
+        self.conn.getresponse.return_value = mock_response('{"displayMessage": "Not found"}', status=404)
+        self.assertRaises(RestlibException, list, self.restlib.request_get_iter('/pools'))
+
+    def test_uep_stream(self):
+        uep = UEPConnection(username="dummy", password="dummy", handler="/Test/", insecure=True)
+        uep.conn = Mock()
+        uep.getPoolsList(owner='admin', stream=True)
+        self.assertTrue(uep.conn.request_get_iter.called)
+        self.assertFalse(uep.conn.request_get.called)
+
+
+class PageIteratorTests(unittest.TestCase):
+    def setUp(self):
+        self.items = list(range(10))
+        self.fetched = []
+
+    def fetch_page(self, page):
+        self.fetched.append(page)
+        return self.items[(page - 1) * 4:page * 4]
+
+    def test_iterates_all_pages(self):
+        for prefetch in (True, False):
+            self.fetched = []
+            pages = PageIterator(self.fetch_page, 4, prefetch=prefetch)
+            self.assertEqual(self.items, list(pages))
+            self.assertEqual([1, 2, 3], self.fetched)
+
+    def test_iter_pages(self):
+        pages = PageIterator(self.fetch_page, 4)
+        self.assertEqual([[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]], list(pages.iter_pages()))
+        self.assertEqual(3, pages.pages_fetched)
+
+    def test_full_last_page(self):
+        self.items = list(range(8))
+        self.assertEqual(self.items, list(PageIterator(self.fetch_page, 4)))
+        self.assertEqual([1, 2, 3], self.fetched)
+
+    def test_next_page_prefetched(self):
+        requested = threading.Event()
+
+        def fetch_page(page):
+            if page == 2:
+                requested.set()
+            return self.fetch_page(page)
+        pages = PageIterator(fetch_page, 4).iter_pages()
+        next(pages)
+        # the second page is requested while the first one is consumed
+        self.assertTrue(requested.wait(5))
+        pages.close()
+
+    def test_paging_not_supported(self):
+        pages = PageIterator(lambda page: self.items, 4)
+        self.assertEqual(self.items, list(pages))
+        self.assertEqual(1, pages.pages_fetched)
+
+    def test_paging_ignored_with_full_page(self):
+        pools = [{'id': 'pool%d' % i} for i in range(4)]
+        for prefetch in (True, False):
+            pages = PageIterator(lambda page: list(pools), 4, prefetch=prefetch)
+            self.assertEqual(pools, list(pages))
+            self.assertEqual(2, pages.pages_fetched)
+
+    def test_error_raised(self):
+        def fetch_page(page):
+            if page == 2:
+                raise RestlibException(500, "error")
+            return self.items[:4]
+        pages = PageIterator(fetch_page, 4)
+        self.assertRaises(RestlibException, list, pages)
+
+
+class ValidatorsTests(unittest.TestCase):
+    def test_request_headers(self):
+        self.assertEqual({}, Validators().request_headers())
+        validators = Validators({'etag': '"abc"', 'last-modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        self.assertEqual({'If-None-Match': '"abc"',
+                          'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'},
+                         validators.request_headers())
+
+    def test_update_from_response(self):
+        validators = Validators({'etag': '"abc"', 'last-modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        validators.update_from_response(200, {'ETag': '"def"', 'Content-Type': 'application/json'})
+        self.assertFalse(validators.not_modified)
+        self.assertEqual({'etag': '"def"'}, validators)
+
+    def test_update_from_not_modified(self):
+        validators = Validators({'etag': '"abc"', 'last-modified': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        validators.update_from_response(304, {'ETag': '"abc"'})
+        self.assertTrue(validators.not_modified)
+        self.assertEqual('Wed, 21 Oct 2015 07:28:00 GMT', validators['last-modified'])
+
+    def test_conditional_request(self):
+        restlib = Restlib("somehost", "123", "/handler")
+        conn = Mock()
+        response = mock_response('')
+        response.status = 304
+        response.getheaders.return_value = [('ETag', '"abc"')]
+        conn.getresponse.return_value = response
+        validators = Validators({'etag': '"abc"'})
+        with patch.object(restlib, '_get_connection', return_value=(conn, False)):
+            self.assertEqual(None, restlib.request_get('/status', validators=validators))
+        self.assertEqual('"abc"', conn.request.call_args[1]['headers']['If-None-Match'])
+        self.assertTrue(validators.not_modified)
+
+
+class SSLContextCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.ca_dir = os.path.join(self.temp_dir, 'ca')
+        os.mkdir(self.ca_dir)
+        self._write(os.path.join(self.ca_dir, 'redhat-uep.pem'), 'ca')
+
+    def _write(self, path, content):
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def _restlib(self, **kwargs):
+        restlib = Restlib("somehost", "123", "/handler", ca_dir=self.ca_dir, **kwargs)
+        patcher = patch.object(restlib, '_create_ssl_context', side_effect=lambda: Mock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return restlib
+
+    def test_context_reused(self):
+        restlib = self._restlib()
+        context = restlib._get_ssl_context()
+        self.assertTrue(context is restlib._get_ssl_context())
+        self.assertEqual(1, restlib.ssl_context_created)
+        self.assertEqual(1, restlib.ssl_context_reused)
+
+    def test_ca_dir_change(self):
+        restlib = self._restlib()
+        context = restlib._get_ssl_context()
+        self._write(os.path.join(self.ca_dir, 'other.pem'), 'other ca')
+        self.assertFalse(context is restlib._get_ssl_context())
+        self.assertEqual(2, restlib.ssl_context_created)
+
+    def test_ca_cert_change(self):
+        restlib = self._restlib()
+        context = restlib._get_ssl_context()
+        self._write(os.path.join(self.ca_dir, 'redhat-uep.pem'), 'new ca')
+        self.assertFalse(context is restlib._get_ssl_context())
+
+    def test_client_cert_change(self):
+        cert_file = os.path.join(self.temp_dir, 'cert.pem')
+        key_file = os.path.join(self.temp_dir, 'key.pem')
+        self._write(cert_file, 'cert')
+        self._write(key_file, 'key')
+        restlib = self._restlib(cert_file=cert_file, key_file=key_file)
+        context = restlib._get_ssl_context()
+        self.assertTrue(context is restlib._get_ssl_context())
+        self._write(key_file, 'new key')
+        self.assertFalse(context is restlib._get_ssl_context())
+
+    @patch.object(ContentConnection, '_load_ca_certificate')
+    def test_content_connection(self, mock_load):
+        ent_dir = os.path.join(self.temp_dir, 'entitlement')
+        os.mkdir(ent_dir)
+        self._write(os.path.join(ent_dir, '1.pem'), 'cert')
+        self._write(os.path.join(ent_dir, '1-key.pem'), 'key')
+        cont_conn = ContentConnection(host="foobar", insecure=True)
+        cont_conn.ent_dir = ent_dir
+
+        pairs = cont_conn._get_ent_cert_key_list()
+        self.assertEqual([(os.path.join(ent_dir, '1.pem'), os.path.join(ent_dir, '1-key.pem'))], pairs)
+        context = cont_conn._get_ssl_context(*pairs[0])
+        self.assertTrue(context is cont_conn._get_ssl_context(*pairs[0]))
+        self.assertEqual(1, mock_load.call_count)
+        self.assertEqual(1, cont_conn.ssl_context_reused)
+
+        self._write(os.path.join(ent_dir, '1.pem'), 'renewed cert')
+        self.assertFalse(context is cont_conn._get_ssl_context(*pairs[0]))
+        self.assertEqual(2, mock_load.call_count)
+
+        self._write(os.path.join(ent_dir, '2.pem'), 'cert')
+        self._write(os.path.join(ent_dir, '2-key.pem'), 'key')
+        self.assertEqual(2, len(cont_conn._get_ent_cert_key_list()))
+
+
 # see #830767 and #842885 for examples of why this is
 # a useful test. Aka, sometimes we forget to make
 # str/repr work and that cases weirdness
@@ -15,7 +15,8 @@ from __future__ import print_function, division, absolute_import
 
 import unittest
 
-from rhsm.huffman import HuffmanNode
+from rhsm.bitstream import BitReader
+from rhsm.huffman import HuffmanDecoder, HuffmanNode
 
 
 class TestHuffmanNode(unittest.TestCase):
@@ -76,3 +77,45 @@ class TestHuffmanNode(unittest.TestCase):
             leaves = [HuffmanNode(weight) for weight in range(1, n)]
             tree = HuffmanNode.build_tree(leaves)
             self.assertEqual(tree.weight, sum(leaf.weight for leaf in leaves))
+
+
+class TestHuffmanDecoder(unittest.TestCase):
+    def setUp(self):
+        self.leaves = [HuffmanNode(weight, str(weight)) for weight in range(1, 5)]
+        # codes are '110', '111', '10' and '0', see TestHuffmanNode
+        self.root = HuffmanNode.build_tree(self.leaves)
+
+    def test_leaf_codes(self):
+        codes = sorted(HuffmanDecoder.leaf_codes(self.root), key=lambda c: c[2])
+        self.assertEqual(codes, [(6, 3, '1'), (7, 3, '2'), (2, 2, '3'), (0, 1, '4')])
+
+    def test_decode(self):
+        # 0 10 110 111 0, followed by padding
+        reader = BitReader(b'\x5b\x80')
+        decoder = HuffmanDecoder(self.root)
+        values = [decoder.decode(reader) for x in range(5)]
+        self.assertEqual(values, ['4', '3', '1', '2', '4'])
+        self.assertEqual(reader.bits_left, 6)
+
+    def test_decode_with_secondary_tables(self):
+        reader = BitReader(b'\x5b\x80')
+        decoder = HuffmanDecoder(self.root, table_bits=1)
+        values = [decoder.decode(reader) for x in range(5)]
+        self.assertEqual(values, ['4', '3', '1', '2', '4'])
+
+    def test_decode_matches_codes(self):
+        leaves = [HuffmanNode(weight, weight) for weight in range(1, 300)]
+        root = HuffmanNode.build_tree(leaves)
+        bits = ''.join(leaf.code for leaf in leaves)
+        bits += '0' * (-len(bits) % 8)
+        data = bytearray(int(bits[i:i + 8], 2) for i in range(0, len(bits), 8))
+        reader = BitReader(data)
+        decoder = HuffmanDecoder(root, table_bits=4)
+        self.assertEqual([decoder.decode(reader) for leaf in leaves], list(range(1, 300)))
+
+    def test_decode_past_end(self):
+        reader = BitReader(b'\xff')
+        decoder = HuffmanDecoder(self.root)
+        decoder.decode(reader)
+        decoder.decode(reader)
+        self.assertRaises(EOFError, decoder.decode, reader)
@@ -18,12 +18,16 @@ import os
 import unittest
 import six
 
+from mock import patch
+
 from rhsm.bitstream import GhettoBitStream
 from rhsm.huffman import HuffmanNode
-from rhsm.pathtree import PathTree, PATH_END
+from rhsm.pathtree import PathMatcher, PathTree, PATH_END
 
 DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
                     'entitlement_data.bin')
+SATELLITE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'satellite_generated_data.bin')
 
 
 class TestPathTree(unittest.TestCase):
@@ -82,6 +86,21 @@ class TestPathTree(unittest.TestCase):
         self.assertTrue('foo' in pt)
         self.assertEqual(len(list(pt.keys())), 1)
 
+    def test_decoders_agree(self):
+        for path in (DATA, SATELLITE_DATA):
+            data = open(path, 'rb').read()
+            word_leaves, bits = PathTree._unpack_data(data)
+            word_root = HuffmanNode.build_tree(word_leaves)
+            by_table = PathTree._decode_path_tree(word_root, bits)
+            by_bits = PathTree._decode_path_tree_by_bits(word_leaves, bits)
+            self.assertEqual(by_table, by_bits)
+
+    def test_decode_truncated_falls_back(self):
+        data = open(SATELLITE_DATA, 'rb').read()
+        word_leaves, bits = PathTree._unpack_data(data)
+        word_root = HuffmanNode.build_tree(word_leaves)
+        self.assertRaises(EOFError, PathTree._decode_path_tree, word_root, bits[:-4])
+
     def test_match_path(self):
         data = open(DATA, 'rb').read()
         pt = PathTree(data)
@@ -171,3 +190,62 @@ class TestPathTree(unittest.TestCase):
             self.assertTrue(pt.match_path('/foo/jarjar/binks'))
             self.assertTrue(pt.match_path('/foo/jarjar/bar'))
             self.assertFalse(pt.match_path('/foo/jarjar/notbinks'))
+
+
+class TestPathMatcher(unittest.TestCase):
+    def setUp(self):
+        self.tree = {'foo': [{'$releasever': [{'bar': [{PATH_END: None}]}],
+                              'jarjar': [{'binks': [{PATH_END: None}]}]}],
+                     'listing': [{'$var': [{PATH_END: None}]}]}
+        self.matcher = PathMatcher(self.tree)
+
+    def test_matches_like_traverse_tree(self):
+        paths = ['/foo/path/bar', '/foo/path/abc', '/foo/jarjar/binks',
+                 '/foo/jarjar/bar', '/foo/jarjar/notbinks', '/foo/path/bar/baz',
+                 '/foo/listing', '/foo/path/listing', '/foo/path/listing/x',
+                 '/listing', '/listing/a', '/foo', '/bar']
+        for path in paths:
+            words = path.strip('/').split('/')
+            self.assertEqual(PathTree._traverse_tree(self.tree, words),
+                             self.matcher.match(words), path)
+
+    def test_literal_and_variable_children(self):
+        root = PathMatcher._compile(self.tree, {})
+        self.assertEqual(set(['foo', 'listing']), set(root.literal))
+        self.assertEqual((), root.variable)
+        foo = root.literal['foo'][0]
+        self.assertEqual(['jarjar'], list(foo.literal))
+        self.assertEqual(1, len(foo.variable))
+
+    def test_shared_nodes_compiled_once(self):
+        end = {PATH_END: None}
+        tree = {'a': [end], 'b': [end]}
+        root = PathMatcher._compile(tree, {})
+        self.assertTrue(root.literal['a'][0] is root.literal['b'][0])
+        self.assertTrue(root.literal['a'][0].is_end)
+
+    def test_prefixes_remembered(self):
+        self.matcher.match(['foo', 'path', 'bar'])
+        self.assertTrue(('foo', 'path') in self.matcher._prefixes)
+        with patch.object(PathMatcher, '_compile') as mock_compile:
+            self.assertTrue(self.matcher.match(['foo', 'other', 'bar']))
+            self.assertFalse(mock_compile.called)
+
+    def test_prefix_limit(self):
+        self.matcher.MAX_PREFIXES = 2
+        self.assertTrue(self.matcher.match(['foo', 'path', 'bar']))
+        self.assertTrue(len(self.matcher._prefixes) <= 2)
+        self.assertTrue(self.matcher.match(['foo', 'jarjar', 'binks']))
+
+    def test_match_paths(self):
+        data = open(DATA, 'rb').read()
+        pt = PathTree(data)
+        self.assertEqual([True, False, True], pt.match_paths(['/foo/path', '/foo', '/foo/path/bar']))
+
+    def test_replaced_tree_recompiled(self):
+        data = open(DATA, 'rb').read()
+        pt = PathTree(data)
+        self.assertTrue(pt.match_path('/foo/path'))
+        pt.path_tree = self.tree
+        self.assertFalse(pt.match_path('/foo/path'))
+        self.assertTrue(pt.matcher.tree is self.tree)
@@ -18,11 +18,16 @@ try:
 except ImportError:
     import unittest
 
+import os
 import platform
+import shutil
+import tempfile
+import threading
+import time
 import mock
 from test.fixture import open_mock
 
-from rhsmlib.facts import collector, firmware_info
+from rhsmlib.facts import all, cache, collector, firmware_info
 
 
 class GetArchTest(unittest.TestCase):
@@ -43,3 +48,247 @@ class GetArchTest(unittest.TestCase):
     def test_get_platform_specific_info_provider(self):
         info_provider = firmware_info.get_firmware_collector(arch=platform.machine())
         self.assertTrue(info_provider is not None)
+
+
+class StubCollector(collector.FactsCollector):
+    def __init__(self, facts, update=None):
+        self.facts = facts
+        self.update = update
+
+    def get_all(self):
+        if self.update:
+            self.update()
+        return self.facts
+
+
+class AllFactsCollectorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.fact_cache = cache.FactsCache(os.path.join(self.tmp_dir, 'collector_cache.json'))
+
+    def _collector(self, collectors, timeout):
+        all_collector = all.AllFactsCollector(timeout=timeout, fact_cache=self.fact_cache)
+        all_collector.collectors = collectors
+        return all_collector
+
+    def test_merges_in_collector_order(self):
+        all_collector = self._collector([StubCollector({'a': 1, 'b': 1}), StubCollector({'b': 2})], 5)
+        self.assertEqual({'a': 1, 'b': 2}, all_collector.get_all())
+        self.assertEqual([], all_collector.timed_out)
+        self.assertEqual(['StubCollector'], list(all_collector.timings.keys()))
+
+    def test_collectors_run_at_once(self):
+        started = threading.Event()
+
+        def wait_for_other():
+            # only returns True if the other collector runs at the same time
+            if not started.wait(5):
+                raise AssertionError("collectors ran one after another")
+
+        all_collector = self._collector([StubCollector({'a': 1}, wait_for_other),
+                                         StubCollector({'b': 2}, started.set)], 10)
+        self.assertEqual({'a': 1, 'b': 2}, all_collector.get_all())
+
+    def test_slow_collector_left_out(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        class SlowCollector(StubCollector):
+            pass
+
+        all_collector = self._collector([StubCollector({'a': 1}),
+                                         SlowCollector({'b': 2}, release.wait)], 0.1)
+        self.assertEqual({'a': 1}, all_collector.get_all())
+        self.assertEqual(['SlowCollector'], all_collector.timed_out)
+
+    def test_timed_out_fact_names(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        class SlowCollector(StubCollector):
+            pass
+
+        slow = SlowCollector({'b': 2, 'c': 3})
+        self._collector([StubCollector({'a': 1}), slow], 5).get_all()
+
+        slow.update = release.wait
+        all_collector = self._collector([StubCollector({'a': 1}), slow], 0.1)
+        all_collector.fact_cache = cache.FactsCache(self.fact_cache.cache_file)
+        self.assertEqual({'a': 1}, all_collector.get_all())
+        self.assertEqual(set(['b', 'c']), all_collector.get_timed_out_fact_names())
+
+    def test_collector_error_raised(self):
+        def fail():
+            raise OSError("no such file")
+
+        all_collector = self._collector([StubCollector({'a': 1}, fail)], 5)
+        self.assertRaises(OSError, all_collector.get_all)
+
+    def test_no_timeout_runs_in_order(self):
+        order = []
+        all_collector = self._collector([StubCollector({'a': 1}, lambda: order.append(1)),
+                                         StubCollector({'b': 2}, lambda: order.append(2))], 0)
+        with mock.patch('threading.Thread') as mock_thread:
+            self.assertEqual({'a': 1, 'b': 2}, all_collector.get_all())
+            self.assertFalse(mock_thread.called)
+        self.assertEqual([1, 2], order)
+
+    def test_fact_cache_saved(self):
+        fact_cache = mock.Mock()
+        all_collector = all.AllFactsCollector(timeout=0, fact_cache=fact_cache)
+        for fact_collector in all_collector.collectors:
+            self.assertTrue(fact_collector.fact_cache is fact_cache)
+        all_collector.collectors = [StubCollector({'a': 1})]
+        self.assertEqual({'a': 1}, all_collector.get_all())
+        fact_cache.save.assert_called_once_with()
+
+    @mock.patch('rhsmlib.facts.all.initConfig')
+    def test_timeout_from_config(self, mock_init_config):
+        mock_init_config.return_value.get_int.return_value = 30
+        self.assertEqual(30, all.AllFactsCollector()._get_timeout())
+        mock_init_config.return_value.get_int.assert_called_with('rhsm', 'fact_collector_timeout')
+
+        mock_init_config.return_value.get_int.side_effect = ValueError("not a number")
+        self.assertEqual(all.DEFAULT_COLLECTOR_TIMEOUT, all.AllFactsCollector()._get_timeout())
+
+
+class CountingCollector(StubCollector):
+    def __init__(self, facts, volatility=collector.BOOT_STABLE, files=None):
+        super(CountingCollector, self).__init__(facts)
+        collector.FactsCollector.__init__(self, arch='x86_64')
+        self.volatility = volatility
+        self.volatility_files = files or []
+        self.calls = 0
+
+    def get_all(self):
+        self.calls += 1
+        return dict(self.facts)
+
+
+class FactsCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.cache_file = os.path.join(self.tmp_dir, 'facts', 'collector_cache.json')
+        self.boot_id = 'boot-1'
+        patcher = mock.patch.object(cache.FactsCache, 'boot_id', lambda fact_cache: self.boot_id)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _collect_twice(self, fact_collector):
+        fact_collector.fact_cache = cache.FactsCache(self.cache_file)
+        first = fact_collector.get_cached_all()
+        fact_collector.fact_cache.save()
+        fact_collector.fact_cache = cache.FactsCache(self.cache_file)
+        self.assertEqual(first, fact_collector.get_cached_all())
+
+    def test_boot_stable_reused(self):
+        fact_collector = CountingCollector({'dmi.system.uuid': 'abc'})
+        self._collect_twice(fact_collector)
+        self.assertEqual(1, fact_collector.calls)
+
+    def test_always_not_cached(self):
+        fact_collector = CountingCollector({'memory.memfree': '1'}, collector.ALWAYS)
+        self._collect_twice(fact_collector)
+        self.assertEqual(2, fact_collector.calls)
+        self.assertFalse(os.path.exists(self.cache_file))
+
+    def test_reboot_invalidates(self):
+        fact_collector = CountingCollector({'dmi.system.uuid': 'abc'})
+        fact_collector.fact_cache = cache.FactsCache(self.cache_file)
+        fact_collector.get_cached_all()
+        fact_collector.fact_cache.save()
+        self.boot_id = 'boot-2'
+        fact_collector.fact_cache = cache.FactsCache(self.cache_file)
+        fact_collector.get_cached_all()
+        self.assertEqual(2, fact_collector.calls)
+
+    def test_file_change_invalidates(self):
+        release = os.path.join(self.tmp_dir, 'os-release')
+        with open(release, 'w') as f:
+            f.write('NAME=one\n')
+        fact_collector = CountingCollector({'distribution.name': 'one'}, files=[release])
+        fact_collector.fact_cache = cache.FactsCache(self.cache_file)
+        fact_collector.get_cached_all()
+        fact_collector.get_cached_all()
+        self.assertEqual(1, fact_collector.calls)
+        with open(release, 'w') as f:
+            f.write('NAME=other\n')
+        fact_collector.get_cached_all()
+        self.assertEqual(2, fact_collector.calls)
+
+    def test_periodic_expires(self):
+        fact_collector = CountingCollector({'lscpu.cpu_mhz': '2000'}, collector.PERIODIC)
+        fact_collector.fact_cache = cache.FactsCache(self.cache_file)
+        fact_collector.get_cached_all()
+        fact_collector.get_cached_all()
+        self.assertEqual(1, fact_collector.calls)
+        later = time.time() + cache.FactsCache.PERIODIC_MAX_AGE + 1
+        with mock.patch('time.time', return_value=later):
+            fact_collector.get_cached_all()
+        self.assertEqual(2, fact_collector.calls)
+
+    def test_no_boot_id_not_cached(self):
+        self.boot_id = ''
+        fact_collector = CountingCollector({'dmi.system.uuid': 'abc'})
+        self._collect_twice(fact_collector)
+        self.assertEqual(2, fact_collector.calls)
+
+    def test_prefix_not_cached(self):
+        fact_collector = CountingCollector({'dmi.system.uuid': 'abc'})
+        fact_collector.prefix = '/tmp/test-data'
+        self._collect_twice(fact_collector)
+        self.assertEqual(2, fact_collector.calls)
+
+    def test_invalid_cache_file_ignored(self):
+        os.makedirs(os.path.dirname(self.cache_file))
+        with open(self.cache_file, 'w') as f:
+            f.write('not json')
+        fact_collector = CountingCollector({'dmi.system.uuid': 'abc'})
+        self._collect_twice(fact_collector)
+        self.assertEqual(1, fact_collector.calls)
+
+    def test_deleted_by_other_process(self):
+        fact_collector = CountingCollector({'dmi.system.uuid': 'abc'})
+        fact_collector.fact_cache = cache.FactsCache(self.cache_file)
+        fact_collector.get_cached_all()
+        fact_collector.fact_cache.save()
+
+        cache.FactsCache(self.cache_file).delete()
+        fact_collector.get_cached_all()
+        self.assertEqual(2, fact_collector.calls)
+
+    def test_stale_entries_not_saved(self):
+        fact_collector = CountingCollector({'dmi.system.uuid': 'abc'})
+        fact_collector.fact_cache = cache.FactsCache(self.cache_file)
+        fact_collector.get_cached_all()
+
+        other_cache = cache.FactsCache(self.cache_file)
+        other_cache.set_fact_names('Other', ['other.fact'])
+        other_cache.save()
+        fact_collector.fact_cache.save()
+        self.assertEqual(['other.fact'], cache.FactsCache(self.cache_file).get_fact_names('Other'))
+
+        other_cache.delete()
+        fact_collector.fact_cache.save()
+        self.assertFalse(os.path.exists(self.cache_file))
+
+    def test_hardware_method_volatility(self):
+        fact_cache = cache.FactsCache(self.cache_file)
+        calls = []
+
+        def get_stable():
+            calls.append('stable')
+            return {'proc_stat.btime': '1'}
+
+        def get_volatile():
+            calls.append('volatile')
+            return {'memory.memfree': '1'}
+
+        fact_collector = collector.FactsCollector(arch='x86_64', hardware_methods=[get_stable, get_volatile])
+        fact_collector.method_volatility = {'get_stable': (collector.BOOT_STABLE, [])}
+        fact_collector.fact_cache = fact_cache
+        fact_collector.get_all()
+        self.assertEqual({'proc_stat.btime': '1', 'memory.memfree': '1'}, fact_collector.get_all())
+        self.assertEqual(['stable', 'volatile', 'volatile'], calls)
@@ -18,7 +18,11 @@ try:
 except ImportError:
     import unittest
 
+import os
+import shutil
 import six
+import socket
+import tempfile
 
 from mock import patch
 from mock import Mock
@@ -182,19 +186,16 @@ class GenericPlatformSpecificInfoProviderTest(test.fixture.SubManFixture):
 
 class HardwareProbeTest(test.fixture.SubManFixture):
     def setUp(self):
-        # Note this is patching an *instance* of HardwareCollector, not the class.
         self.hw_check_topo = hwprobe.HardwareCollector()
-        self.hw_check_topo_patcher = patch.object(
-            self.hw_check_topo,
-            'check_for_cpu_topo',
-            Mock(return_value=True)
-        )
-        self.hw_check_topo_patcher.start()
         super(HardwareProbeTest, self).setUp()
 
-    def tearDown(self):
-        self.hw_check_topo_patcher.stop()
-        super(HardwareProbeTest, self).tearDown()
+    def _fake_cpu_dirs(self, mock_dir_entries, names):
+        # every cpu directory has a topology directory
+        def dir_entries(path):
+            if path.endswith("topology"):
+                return []
+            return [(name, True) for name in names]
+        mock_dir_entries.side_effect = dir_entries
 
     @patch(OPEN_FUNCTION)
     def test_distro_no_release(self, MockOpen):
@@ -385,6 +386,49 @@ class HardwareProbeTest(test.fixture.SubManFixture):
         self.assertEqual(net_int['net.interface.lo.ipv4_address'], '127.0.0.1')
         self.assertFalse('net.interface.lo.mac_address' in net_int)
 
+    @patch("ethtool.get_devices")
+    @patch("ethtool.get_interfaces_info")
+    def test_network_interfaces_skipped(self, MockGetInterfacesInfo, MockGetDevices):
+        hw = hwprobe.HardwareCollector()
+        MockGetDevices.return_value = ['eth0', 'veth1a2b', 'virbr0', 'virbr0-nic']
+        MockGetInterfacesInfo.return_value = []
+
+        with patch.object(hw, '_get_skipped_interfaces', Mock(return_value=['veth*', 'virbr*-nic'])):
+            hw.get_network_interfaces()
+        MockGetInterfacesInfo.assert_called_once_with(['eth0', 'virbr0'])
+
+    @patch("socket.getaddrinfo", side_effect=socket.gaierror)
+    @patch("ethtool.get_devices")
+    @patch("ethtool.get_interfaces_info")
+    def test_network_facts_share_interfaces(self, MockGetInterfacesInfo, MockGetDevices, mock_getaddrinfo):
+        hw = hwprobe.HardwareCollector()
+        MockGetDevices.return_value = ['eth0']
+        mock_info = Mock(mac_address="00:00:00:00:00:00", device="eth0")
+        mock_info.get_ipv6_addresses.return_value = []
+        mock_info.get_ipv4_addresses.return_value = [Mock(address="10.0.0.1", netmask="24", broadcast="Unknown")]
+        MockGetInterfacesInfo.return_value = [mock_info]
+
+        with patch.object(hw, '_get_skipped_interfaces', Mock(return_value=[])) as mock_skipped:
+            net_info = hw.get_network_info()
+            net_int = hw.get_network_interfaces()
+        self.assertEqual('10.0.0.1', net_info['network.ipv4_address'])
+        self.assertEqual('10.0.0.1', net_int['net.interface.eth0.ipv4_address'])
+        self.assertEqual(1, MockGetInterfacesInfo.call_count)
+        self.assertEqual(1, mock_skipped.call_count)
+
+        # every collection reads them again
+        hw.hardware_methods = []
+        hw.get_all()
+        hw.get_interfaces_info()
+        self.assertEqual(2, MockGetInterfacesInfo.call_count)
+
+    @patch("rhsmlib.facts.hwprobe.initConfig")
+    def test_skipped_interfaces_from_config(self, mock_init_config):
+        mock_init_config.return_value.get.return_value = "veth*, ,virbr*-nic"
+        hw = hwprobe.HardwareCollector()
+        self.assertEqual(['veth*', 'virbr*-nic'], hw._get_skipped_interfaces())
+        mock_init_config.return_value.get.assert_called_with('rhsm', 'skip_network_interfaces')
+
     @patch("ethtool.get_devices")
     @patch("ethtool.get_interfaces_info")
     def test_network_interfaces_sit(self, MockGetInterfacesInfo, MockGetDevices):
@@ -460,6 +504,15 @@ class HardwareProbeTest(test.fixture.SubManFixture):
         # note we .upper the result
         self.assertEqual("52:54:00:07:03:BA", slave_hw)
 
+    @patch(OPEN_FUNCTION)
+    def test_get_slave_hwaddr_reads_bonding_once(self, MockOpen):
+        MockOpen.return_value = six.StringIO(PROC_BONDING_RR)
+        hw = hwprobe.HardwareCollector()
+        self.assertEqual("52:54:00:07:03:BA", hw._get_slave_hwaddr("bond0", "eth0"))
+        self.assertEqual("52:54:00:66:20:F7", hw._get_slave_hwaddr("bond0", "eth1"))
+        self.assertEqual("", hw._get_slave_hwaddr("bond0", "eth2"))
+        self.assertEqual(1, MockOpen.call_count)
+
     @patch(OPEN_FUNCTION)
     def test_get_slave_hwaddr_alb(self, MockOpen):
         MockOpen.return_value = six.StringIO(PROC_BONDING_ALB)
@@ -495,9 +548,9 @@ class HardwareProbeTest(test.fixture.SubManFixture):
         self.assertEqual(expected_btime, ret['proc_stat.btime'])
 
     @patch.object(hwprobe.HardwareCollector, 'count_cpumask_entries')
-    @patch("os.listdir")
+    @patch("rhsmlib.facts.hwprobe.dir_entries")
     def test_cpu_info_s390(self, mock_list_dir, mock_mask):
-        mock_list_dir.return_value = ["cpu%s" % i for i in range(0, 3)]
+        self._fake_cpu_dirs(mock_list_dir, ["cpu%s" % i for i in range(0, 3)])
 
         # 32 cpus
         # 16 cores, 2 threads per core = each cpu has two thread siblings
@@ -528,12 +581,10 @@ class HardwareProbeTest(test.fixture.SubManFixture):
 
     @patch.object(hwprobe.HardwareCollector, 'has_s390x_sysinfo')
     @patch.object(hwprobe.HardwareCollector, 'read_s390x_sysinfo')
-    @patch.object(hwprobe.HardwareCollector, 'check_for_cpu_topo')
-    @patch("os.listdir")
-    def test_cpu_info_s390_sysinfo(self, mock_list_dir, mock_topo, mock_read_sysinfo, mock_has_sysinfo):
-        mock_list_dir.return_value = ["cpu%s" % i for i in range(0, 20)]
+    @patch("rhsmlib.facts.hwprobe.dir_entries")
+    def test_cpu_info_s390_sysinfo(self, mock_list_dir, mock_read_sysinfo, mock_has_sysinfo):
+        self._fake_cpu_dirs(mock_list_dir, ["cpu%s" % i for i in range(0, 20)])
         mock_has_sysinfo.return_value = True
-        mock_topo.return_value = True
         mock_read_sysinfo.return_value = ["CPU Topology SW:      0 0 0 4 6 4"]
 
         self.hw_check_topo.arch = 's390x'
@@ -575,7 +626,7 @@ class HardwareProbeTest(test.fixture.SubManFixture):
             self.assert_equal_dict(expected, self.hw_check_topo.get_cpu_info())
 
     @patch.object(hwprobe.HardwareCollector, 'count_cpumask_entries')
-    @patch("os.listdir")
+    @patch("rhsmlib.facts.hwprobe.dir_entries")
     def test_cpu_info(self, mock_list_dir, mock_count):
         def count_cpumask(cpu, field):
             cpumask_vals = {
@@ -585,7 +636,7 @@ class HardwareProbeTest(test.fixture.SubManFixture):
             }
             return cpumask_vals[field]
 
-        mock_list_dir.return_value = ["cpu0", "cpu1"]
+        self._fake_cpu_dirs(mock_list_dir, ["cpu0", "cpu1"])
         with patch.object(self.hw_check_topo, 'count_cpumask_entries', Mock(side_effect=count_cpumask)):
             expected = {
                 'cpu.cpu(s)': 2,
@@ -596,7 +647,7 @@ class HardwareProbeTest(test.fixture.SubManFixture):
             }
             self.assert_equal_dict(expected, self.hw_check_topo.get_cpu_info())
 
-    @patch("os.listdir")
+    @patch("rhsmlib.facts.hwprobe.dir_entries")
     def test_cpu_info_no_topo(self, mock_list_dir):
         def count_cpumask(cpu, field):
             cpumask_vals = {
@@ -606,7 +657,7 @@ class HardwareProbeTest(test.fixture.SubManFixture):
             }
             return cpumask_vals[field]
 
-        mock_list_dir.return_value = ["cpu%s" % i for i in range(0, 16)]
+        self._fake_cpu_dirs(mock_list_dir, ["cpu%s" % i for i in range(0, 16)])
 
         with patch.object(self.hw_check_topo, 'count_cpumask_entries', Mock(side_effect=count_cpumask)):
             expected = {
@@ -619,7 +670,7 @@ class HardwareProbeTest(test.fixture.SubManFixture):
             self.assert_equal_dict(expected, self.hw_check_topo.get_cpu_info())
 
     @patch.object(hwprobe.HardwareCollector, "read_physical_id")
-    @patch("os.listdir")
+    @patch("rhsmlib.facts.hwprobe.dir_entries")
     def test_cpu_info_no_topo_ppc64_physical_id(self, mock_list_dir,
                                                 mock_read_physical):
         self.hw_check_topo.arch = "ppc64"
@@ -636,7 +687,7 @@ class HardwareProbeTest(test.fixture.SubManFixture):
             }
             return cpumask_vals[field]
 
-        mock_list_dir.return_value = ["cpu%s" % i for i in range(0, 8)]
+        self._fake_cpu_dirs(mock_list_dir, ["cpu%s" % i for i in range(0, 8)])
         with patch.object(self.hw_check_topo, 'count_cpumask_entries', Mock(side_effect=count_cpumask)):
             with patch.object(self.hw_check_topo, 'read_physical_id', Mock(side_effect=get_physical)):
                 expected = {
@@ -648,9 +699,9 @@ class HardwareProbeTest(test.fixture.SubManFixture):
                 }
                 self.assert_equal_dict(expected, self.hw_check_topo.get_cpu_info())
 
-    @patch("os.listdir")
+    @patch("rhsmlib.facts.hwprobe.dir_entries")
     def test_cpu_info_lots_cpu(self, mock_list_dir):
-        mock_list_dir.return_value = ["cpu%s" % i for i in range(0, 2000)]
+        self._fake_cpu_dirs(mock_list_dir, ["cpu%s" % i for i in range(0, 2000)])
 
         def count_cpumask(cpu, field):
             vals = {
@@ -671,9 +722,9 @@ class HardwareProbeTest(test.fixture.SubManFixture):
             }
             self.assert_equal_dict(expected, self.hw_check_topo.get_cpu_info())
 
-    @patch("os.listdir")
+    @patch("rhsmlib.facts.hwprobe.dir_entries")
     def test_cpu_info_other_files(self, mock_list_dir):
-        mock_list_dir.return_value = [
+        self._fake_cpu_dirs(mock_list_dir, [
             "cpu0", "cpu1",  # normal cpu ids (valid)
             "cpu123123",     # big cpu   (valid)
             "cpu_",          # not valid
@@ -682,7 +733,7 @@ class HardwareProbeTest(test.fixture.SubManFixture):
             "cpu0foo",       # only cpuN are valid
             "cpu11111111 ",  # trailing space, not valie
             "cpu00"          # odd name, but valid I guess
-        ]
+        ])
 
         def count_cpumask(cpu, field):
             vals = {
@@ -704,6 +755,90 @@ class HardwareProbeTest(test.fixture.SubManFixture):
             self.assert_equal_dict(expected, self.hw_check_topo.get_cpu_info())
 
 
+class TestCpuTopology(unittest.TestCase):
+    def setUp(self):
+        self.prefix = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.prefix)
+        self.sys_cpu_path = os.path.join(self.prefix, "sys/devices/system/cpu")
+        os.makedirs(os.path.join(self.sys_cpu_path, "cpufreq"))
+
+    def _add_cpu(self, number, topology=None):
+        cpu_dir = os.path.join(self.sys_cpu_path, "cpu%d" % number)
+        os.makedirs(cpu_dir)
+        if topology is not None:
+            os.makedirs(os.path.join(cpu_dir, "topology"))
+            for field, value in topology.items():
+                with open(os.path.join(cpu_dir, "topology", field), "w") as f:
+                    f.write(value + "\n")
+
+    def _add_cpus(self, count, threads_per_core, cores_per_socket):
+        cpus_per_socket = threads_per_core * cores_per_socket
+        for cpu in range(count):
+            core_start = cpu - cpu % threads_per_core
+            socket_start = cpu - cpu % cpus_per_socket
+            self._add_cpu(cpu, {
+                'thread_siblings_list': "%d-%d" % (core_start, core_start + threads_per_core - 1),
+                'core_siblings_list': "%d-%d" % (socket_start, socket_start + cpus_per_socket - 1),
+                'physical_package_id': "%d" % (cpu // cpus_per_socket),
+            })
+
+    def test_cpus_ordered_and_without_topology_skipped(self):
+        for cpu in [10, 2, 1]:
+            self._add_cpu(cpu, {'core_siblings_list': "1-2,10"})
+        # offline or unallocated cpu
+        self._add_cpu(3)
+
+        topology = hwprobe.CpuTopology(self.sys_cpu_path)
+        self.assertEqual([os.path.join(self.sys_cpu_path, "cpu%d" % cpu) for cpu in [1, 2, 10]],
+                         topology.cpu_files)
+        self.assertEqual("1-2,10", topology.read(topology.cpu_files[0], 'core_siblings_list'))
+        self.assertEqual(None, topology.read(topology.cpu_files[0], 'book_siblings_list'))
+
+    def test_files_read_once(self):
+        self._add_cpus(4, 2, 2)
+        topology = hwprobe.CpuTopology(self.sys_cpu_path)
+        cpu_file = topology.cpu_files[0]
+        with patch(OPEN_FUNCTION, mock_open(read_data="0-1\n")) as mock_file:
+            self.assertEqual("0-1", topology.read(cpu_file, 'thread_siblings_list'))
+            self.assertEqual("0-1", topology.read(cpu_file, 'thread_siblings_list'))
+            # not in the topology directory, so never opened
+            self.assertEqual(None, topology.read(cpu_file, 'book_siblings_list'))
+        self.assertEqual(1, mock_file.call_count)
+
+    @patch("os.access", return_value=False)
+    def test_cpu_and_lscpu_facts_share_topology(self, mock_access):
+        self._add_cpus(16, 2, 4)
+        hw = hwprobe.HardwareCollector(arch="x86_64", prefix=self.prefix)
+
+        with patch.object(hwprobe, 'CpuTopology', wraps=hwprobe.CpuTopology) as mock_topology:
+            facts = hw.get_all()
+        self.assertEqual(1, mock_topology.call_count)
+
+        self.assertEqual(16, facts['cpu.cpu(s)'])
+        self.assertEqual(2, facts['cpu.thread(s)_per_core'])
+        self.assertEqual(4, facts['cpu.core(s)_per_socket'])
+        self.assertEqual(2, facts['cpu.cpu_socket(s)'])
+        # no lscpu, so its topology facts come from /sys too
+        self.assertEqual('16', facts['lscpu.cpu(s)'])
+        self.assertEqual('2', facts['lscpu.thread(s)_per_core'])
+        self.assertEqual('4', facts['lscpu.core(s)_per_socket'])
+        self.assertEqual('2', facts['lscpu.socket(s)'])
+
+    @patch("os.access", return_value=False)
+    def test_lscpu_drawers(self, mock_access):
+        for cpu in range(8):
+            self._add_cpu(cpu, {
+                'thread_siblings_list': "%d" % cpu,
+                'core_siblings_list': "%d" % cpu,
+                'book_siblings_list': "%d-%d" % (cpu - cpu % 2, cpu - cpu % 2 + 1),
+                'drawer_siblings_list': "%d-%d" % (cpu - cpu % 4, cpu - cpu % 4 + 3),
+            })
+        hw = hwprobe.HardwareCollector(arch="x86_64", prefix=self.prefix)
+        lscpu_info = hw.get_ls_cpu_info()
+        self.assertEqual('4', lscpu_info['lscpu.book(s)'])
+        self.assertEqual('2', lscpu_info['lscpu.drawer(s)'])
+
+
 class TestLscpu(unittest.TestCase):
     @patch('os.environ', {
         'LANGUAGE': 'ja_JP.eucJP',
@@ -40,6 +40,7 @@ from rhsm.certificate2 import EntitlementCertificate, ProductCertificate, \
 from rhsm import profile
 from rhsm import ourjson as json
 from rhsm.certificate2 import CONTENT_ACCESS_CERT_TYPE
+from rhsm.connection import PageIterator
 
 # config file is root only, so just fill in a stringbuffer
 cfg_buf = """
@@ -458,7 +459,7 @@ class StubUEP(object):
     def getProduct(self):
         return {}
 
-    def getRelease(self, consumerId):
+    def getRelease(self, consumerId, validators=None):
         return {'releaseVer': ''}
 
     def getServiceLevelList(self, owner):
@@ -478,7 +479,7 @@ class StubUEP(object):
     def setConsumer(self, consumer):
         self.consumer = consumer
 
-    def getConsumer(self, consumerId, username=None, password=None):
+    def getConsumer(self, consumerId, username=None, password=None, validators=None):
         if hasattr(self, 'consumer') and self.consumer:
             return self.consumer
         if six.callable(self.registered_consumer_info):
@@ -497,25 +498,30 @@ class StubUEP(object):
     def getCertificateSerials(self, consumer):
         return []
 
-    def getCompliance(self, uuid, on_data=None):
+    def getCompliance(self, uuid, on_data=None, validators=None):
         return {}
 
-    def getSyspurposeCompliance(self, uuid, on_date=None):
+    def getSyspurposeCompliance(self, uuid, on_date=None, validators=None):
         return self.syspurpose_compliance_status
 
     def setSyspurposeCompliance(self, status):
         self.syspurpose_compliance_status = status
 
-    def getEntitlementList(self, uuid):
+    def getEntitlementList(self, uuid, request_certs=False, validators=None):
         return [{'id': 'ent1'}, {'id': 'ent2'}]
 
-    def getPoolsList(self, uuid, listAll, active_on, owner):
+    def getPoolsList(self, consumer=None, listAll=False, active_on=None, owner=None, **kwargs):
         return [{'id': 'pool1'}, {'id': 'pool2'}]
 
+    def iterPoolsList(self, per_page, prefetch=True, **kwargs):
+        def fetch_page(page):
+            return self.getPoolsList(page=page, per_page=per_page, **kwargs)
+        return PageIterator(fetch_page, per_page, prefetch=prefetch)
+
     def getSubscriptionList(self, owner):
         return [{'id': 'sub1'}, {'id': 'sub2'}]
 
-    def getContentOverrides(self, uuid):
+    def getContentOverrides(self, uuid, validators=None):
         return []
 
 
@@ -647,6 +653,12 @@ class StubCPProvider(object):
     def get_consumer_auth_cp(self):
         return self.consumer_auth_cp
 
+    def new_consumer_auth_cp(self):
+        return self.consumer_auth_cp
+
+    def set_thread_consumer_auth_cp(self, cp):
+        pass
+
     def get_basic_auth_cp(self):
         return self.basic_auth_cp
 
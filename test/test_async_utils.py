@@ -35,10 +35,10 @@ class ListPoolsStubUEP(stubs.StubUEP):
     def getOwner(self, consumeruuid):
         return {'key': 'owner'}
 
-    def getPoolsList(self, consumer, listAll=None, active_on=None, owner=None):
+    def getPoolsList(self, consumer, listAll=None, active_on=None, owner=None, **kwargs):
         return []
 
-    def getEntitlementList(self, consumeruuid=None):
+    def getEntitlementList(self, consumeruuid=None, request_certs=False, validators=None):
         return []
 
 
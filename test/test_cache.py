@@ -37,7 +37,7 @@ from rhsm import ourjson as json
 from subscription_manager.cache import ProfileManager, \
     InstalledProductsManager, EntitlementStatusCache, \
     PoolTypeCache, ReleaseStatusCache, ContentAccessCache, \
-    PoolStatusCache
+    PoolStatusCache, OverrideStatusCache, StatusCachePrefetcher
 
 from rhsm.profile import Package, RPMProfile, EnabledReposProfile, ModulesProfile
 
@@ -372,7 +372,9 @@ class TestProfileManager(unittest.TestCase):
 
         mock_enabled_repos_profile = EnabledReposProfile(repo_file=repo_file)
 
-        mock_module_profile = ModulesProfile()
+        # keep ModulesProfile away from dnf and the module profile cache
+        with patch.object(ModulesProfile, '_load', return_value=enabled_modules):
+            mock_module_profile = ModulesProfile()
         mock_module_profile.collect = Mock(return_value=enabled_modules)
 
         mock_profile = {
@@ -383,6 +385,333 @@ class TestProfileManager(unittest.TestCase):
         return mock_profile
 
 
+class TestRPMProfile(unittest.TestCase):
+    @staticmethod
+    def _header(name, arch="x86_64", vendor="Red Hat, Inc."):
+        # new string objects, like every rpm header returns
+        return {'name': name, 'version': '1.0', 'release': '1', 'arch': ''.join(arch),
+                'epoch': None, 'vendor': ''.join(vendor)}
+
+    def test_accumulate_profile(self):
+        headers = [self._header("package1"), self._header("gpg-pubkey"), self._header("package2")]
+        packages = RPMProfile._accumulate_profile(headers)
+        self.assertEqual(["package1", "package2"], [pkg.name for pkg in packages])
+        self.assertEqual(0, packages[0].epoch)
+
+    def test_iter_profile_is_lazy(self):
+        def headers():
+            yield self._header("package1")
+            raise AssertionError("read too far")
+        self.assertEqual("package1", next(RPMProfile._iter_profile(headers())).name)
+
+    def test_arch_and_vendor_shared(self):
+        packages = RPMProfile._accumulate_profile([self._header("package1"), self._header("package2")])
+        self.assertTrue(packages[0].arch is packages[1].arch)
+        self.assertTrue(packages[0].vendor is packages[1].vendor)
+
+    def test_package_has_no_dict(self):
+        package = Package(name="package1", version="1.0", release="1", arch="x86_64")
+        self.assertFalse(hasattr(package, '__dict__'))
+
+    def test_equal_packages_hash_equal(self):
+        package = Package(name="package1", version="1.0", release="1", arch="x86_64", vendor=b'Red Hat')
+        other = Package(name="package1", version="1.0", release="1", arch="x86_64", vendor=u'Red Hat')
+        self.assertEqual(package, other)
+        self.assertEqual(hash(package), hash(other))
+        self.assertFalse(package != other)
+
+    def test_profile_eq_ignores_order(self):
+        headers = [self._header("package%d" % i) for i in range(10)]
+        profile = RPMProfile.__new__(RPMProfile)
+        profile.packages = RPMProfile._accumulate_profile(headers)
+        other = RPMProfile.__new__(RPMProfile)
+        other.packages = RPMProfile._accumulate_profile(reversed(headers))
+        self.assertEqual(profile, other)
+
+        other.packages[0] = Package(name="package0", version="2.0", release="1", arch="x86_64")
+        self.assertNotEqual(profile, other)
+
+    def test_iter_collect(self):
+        profile = RPMProfile.__new__(RPMProfile)
+        profile.packages = RPMProfile._accumulate_profile([self._header("package1")])
+        self.assertEqual(profile.collect(), list(profile.iter_collect()))
+        self.assertEqual("package1", profile.collect()[0]['name'])
+
+
+class TestProfileManagerFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.rpmdb_file = os.path.join(self.tmp_dir, 'Packages')
+        with open(self.rpmdb_file, 'w') as f:
+            f.write('package1')
+
+        for name, value in [('CACHE_FILE', os.path.join(self.tmp_dir, 'profile.json')),
+                            ('FINGERPRINT_FILE', os.path.join(self.tmp_dir, 'profile.fingerprint.json')),
+                            ('FINGERPRINT_GLOBS', [self.rpmdb_file])]:
+            patcher = patch.object(ProfileManager, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        cookie_patcher = patch('subscription_manager.cache.rpmdb_cookie', return_value='cookie1')
+        self.rpmdb_cookie = cookie_patcher.start()
+        self.addCleanup(cookie_patcher.stop)
+
+        self.rpm_profile = [{'name': 'package1'}]
+        profile_patcher = patch('subscription_manager.cache.get_profile')
+        self.get_profile = profile_patcher.start()
+        self.addCleanup(profile_patcher.stop)
+        self.get_profile.side_effect = self._get_profile
+
+    def _get_profile(self, profile_type):
+        profile = Mock()
+        profile.collect.return_value = self.rpm_profile if profile_type == 'rpm' else []
+        return profile
+
+    def _write_cache(self):
+        profile_mgr = ProfileManager()
+        profile_mgr.write_cache()
+        self.get_profile.reset_mock()
+
+    def test_write_cache_writes_fingerprint(self):
+        self._write_cache()
+        with open(ProfileManager.FINGERPRINT_FILE) as f:
+            fingerprint = json.loads(f.read())
+        self.assertEqual('cookie1', fingerprint['rpmdb_cookie'])
+        self.assertTrue(self.rpmdb_file in fingerprint['files'])
+
+    def test_unchanged_fingerprint_skips_collection(self):
+        self._write_cache()
+        self.assertFalse(ProfileManager().has_changed())
+        self.assertFalse(self.get_profile.called)
+
+    def test_changed_cookie_compares_profile(self):
+        self._write_cache()
+        self.rpmdb_cookie.return_value = 'cookie2'
+        self.assertFalse(ProfileManager().has_changed())
+        self.assertTrue(self.get_profile.called)
+
+        # the fingerprint is updated, so the next check is cheap again
+        self.get_profile.reset_mock()
+        self.assertFalse(ProfileManager().has_changed())
+        self.assertFalse(self.get_profile.called)
+
+    def test_changed_file_detects_change(self):
+        self._write_cache()
+        with open(self.rpmdb_file, 'a') as f:
+            f.write('package2')
+        self.rpm_profile = [{'name': 'package1'}, {'name': 'package2'}]
+        self.assertTrue(ProfileManager().has_changed())
+
+    def test_no_cookie_compares_profile(self):
+        self.rpmdb_cookie.return_value = None
+        self._write_cache()
+        self.assertFalse(os.path.exists(ProfileManager.FINGERPRINT_FILE))
+        self.rpm_profile = [{'name': 'package1'}, {'name': 'package2'}]
+        self.assertTrue(ProfileManager().has_changed())
+
+    def test_cookie_lost_compares_profile(self):
+        self._write_cache()
+        self.rpmdb_cookie.return_value = None
+        self.rpm_profile = [{'name': 'package1'}, {'name': 'package2'}]
+        self.assertTrue(ProfileManager().has_changed())
+
+    def test_no_fingerprint_compares_profile(self):
+        self._write_cache()
+        os.remove(ProfileManager.FINGERPRINT_FILE)
+        self.assertFalse(ProfileManager().has_changed())
+        self.assertTrue(self.get_profile.called)
+
+    def test_delete_cache_removes_fingerprint(self):
+        self._write_cache()
+        ProfileManager.delete_cache()
+        self.assertFalse(os.path.exists(ProfileManager.CACHE_FILE))
+        self.assertFalse(os.path.exists(ProfileManager.FINGERPRINT_FILE))
+
+
+class StubProfileServer(object):
+    """
+    Stands in for a server that keeps the combined profile of one consumer
+    and can apply profile deltas to it.
+    """
+    def __init__(self, capabilities):
+        self.capabilities = capabilities
+        self.profile = {}
+        self.uploads = []
+
+    def supports_resource(self, resource):
+        return True
+
+    def has_capability(self, capability):
+        return capability in self.capabilities
+
+    def updateCombinedProfile(self, consumer_uuid, profile):
+        self.uploads.append(('full', profile))
+        self.profile = dict((item['content_type'], item['profile']) for item in profile)
+
+    def updateProfileDelta(self, consumer_uuid, delta):
+        self.uploads.append(('delta', delta))
+        for item in delta:
+            if item['content_type'] == 'rpm':
+                rpms = [pkg for pkg in self.profile['rpm'] if pkg not in item['removed']]
+                self.profile['rpm'] = rpms + item['added']
+            else:
+                self.profile[item['content_type']] = item['profile']
+
+
+class TestProfileManagerDelta(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        for name, value in [('CACHE_FILE', os.path.join(self.tmp_dir, 'profile.json')),
+                            ('FINGERPRINT_FILE', os.path.join(self.tmp_dir, 'profile.fingerprint.json'))]:
+            patcher = patch.object(ProfileManager, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.packages = [Package(name="package%d" % i, version="1.0.0", release=1, arch="x86_64").to_dict()
+                         for i in range(100)]
+        self.repos = [{"repositoryid": "repo1", "baseurl": ["http://example.com/repo1"]}]
+        self.server = StubProfileServer(["combined_reporting", "profile_delta"])
+
+    def _update(self, server):
+        profile_mgr = ProfileManager()
+        profile_mgr.report_package_profile = 1
+        profile_mgr.current_profile = {'rpm': list(self.packages), 'enabled_repos': list(self.repos),
+                                       'modulemd': []}
+        profile_mgr.update_check(server, "FAKEUUID")
+        return profile_mgr
+
+    def test_first_upload_is_full(self):
+        self._update(self.server)
+        self.assertEqual(['full'], [kind for kind, _data in self.server.uploads])
+
+    def test_changes_uploaded_as_delta(self):
+        self._update(self.server)
+        removed = self.packages.pop(3)
+        added = Package(name="package100", version="1.0.0", release=1, arch="x86_64").to_dict()
+        self.packages.append(added)
+        profile_mgr = self._update(self.server)
+
+        kind, delta = self.server.uploads[-1]
+        self.assertEqual('delta', kind)
+        self.assertEqual([{'content_type': 'rpm', 'added': [added], 'removed': [removed]}], delta)
+        self.assertEqual(profile_mgr.current_profile, self.server.profile)
+
+    def test_changed_repos_in_delta(self):
+        self._update(self.server)
+        self.repos.append({"repositoryid": "repo2", "baseurl": ["http://example.com/repo2"]})
+        profile_mgr = self._update(self.server)
+
+        kind, delta = self.server.uploads[-1]
+        self.assertEqual('delta', kind)
+        self.assertEqual([{'content_type': 'enabled_repos', 'profile': self.repos}], delta)
+        self.assertEqual(profile_mgr.current_profile, self.server.profile)
+
+    def test_forced_upload_without_changes_is_full(self):
+        profile_mgr = self._update(self.server)
+        profile_mgr.update_check(self.server, "FAKEUUID", force=True)
+        self.assertEqual(['full', 'full'], [kind for kind, _data in self.server.uploads])
+
+    def test_no_delta_without_capability(self):
+        server = StubProfileServer(["combined_reporting"])
+        self._update(server)
+        self.packages.pop()
+        self._update(server)
+        self.assertEqual(['full', 'full'], [kind for kind, _data in server.uploads])
+
+    def test_delta_failure_uploads_full_profile(self):
+        self._update(self.server)
+        self.packages.pop()
+        self.server.updateProfileDelta = Mock(side_effect=RestlibException(400, "unknown profile"))
+        profile_mgr = self._update(self.server)
+        self.assertEqual(['full', 'full'], [kind for kind, _data in self.server.uploads])
+        self.assertEqual(profile_mgr.current_profile, self.server.profile)
+
+
+class TestModulesProfileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.module_file = os.path.join(self.tmp_dir, 'duck.module')
+        with open(self.module_file, 'w') as f:
+            f.write('[duck]\nname=duck\nstream=0\nprofiles=\nstate=enabled\n')
+
+        for name, value in [('CACHE_FILE', os.path.join(self.tmp_dir, 'cache', 'module_profile.json')),
+                            ('STATE_GLOBS', [os.path.join(self.tmp_dir, '*.module')])]:
+            patcher = patch.object(ModulesProfile, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name in ['dnf', 'libdnf']:
+            patcher = patch('rhsm.profile.%s' % name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('rhsm.profile.rpmdb_cookie', return_value='cookie1')
+        self.rpmdb_cookie = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.modules = [{"name": "duck", "stream": "0", "version": "20180730233102", "context": "deadbeef",
+                         "arch": "noarch", "profiles": ["default"], "installed_profiles": [],
+                         "status": "enabled"}]
+        patcher = patch.object(ModulesProfile, '_ModulesProfile__generate', return_value=self.modules)
+        self.generate = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unchanged_state_uses_cache(self):
+        self.assertEqual(self.modules, ModulesProfile().collect())
+        self.assertEqual(self.modules, ModulesProfile().collect())
+        self.assertEqual(1, self.generate.call_count)
+
+    def test_changed_state_generates_again(self):
+        ModulesProfile()
+        with open(self.module_file, 'a') as f:
+            f.write('profiles=default\n')
+        ModulesProfile()
+        self.assertEqual(2, self.generate.call_count)
+
+    def test_new_state_file_generates_again(self):
+        ModulesProfile()
+        open(os.path.join(self.tmp_dir, 'goose.module'), 'w').close()
+        ModulesProfile()
+        self.assertEqual(2, self.generate.call_count)
+
+    def test_changed_packages_generates_again(self):
+        ModulesProfile()
+        self.rpmdb_cookie.return_value = 'cookie2'
+        ModulesProfile()
+        self.assertEqual(2, self.generate.call_count)
+
+    def test_no_rpmdb_cookie_generates_again(self):
+        self.rpmdb_cookie.return_value = None
+        ModulesProfile()
+        ModulesProfile()
+        self.assertEqual(2, self.generate.call_count)
+
+    def test_cache_written_atomically(self):
+        ModulesProfile()
+        self.assertEqual(['module_profile.json'], os.listdir(os.path.dirname(ModulesProfile.CACHE_FILE)))
+        with patch('rhsm.profile.json.dumps', side_effect=IOError("disk full")):
+            self.rpmdb_cookie.return_value = 'cookie2'
+            ModulesProfile()
+        # the previous cache is left as it was, and no temporary file
+        self.assertEqual(['module_profile.json'], os.listdir(os.path.dirname(ModulesProfile.CACHE_FILE)))
+        with open(ModulesProfile.CACHE_FILE) as f:
+            self.assertEqual('cookie1', json.loads(f.read())['state']['rpmdb_cookie'])
+
+    def test_corrupted_cache(self):
+        os.makedirs(os.path.dirname(ModulesProfile.CACHE_FILE))
+        with open(ModulesProfile.CACHE_FILE, 'w') as f:
+            f.write('not json')
+        self.assertEqual(self.modules, ModulesProfile().collect())
+        self.assertEqual(1, self.generate.call_count)
+
+    @patch('rhsm.profile.dnf', None)
+    def test_no_dnf(self):
+        self.assertEqual([], ModulesProfile().collect())
+        self.assertFalse(self.generate.called)
+        self.assertFalse(os.path.exists(ModulesProfile.CACHE_FILE))
+
+
 class TestInstalledProductsCache(SubManFixture):
     def setUp(self):
         super(TestInstalledProductsCache, self).setUp()
@@ -728,6 +1057,157 @@ class TestPoolStatusCache(SubManFixture):
         self.assertEqual(dummy_pools, self.pool_status_cache.server_status)
 
 
+class TestStatusCacheConditionalRequests(SubManFixture):
+    def setUp(self):
+        super(TestStatusCacheConditionalRequests, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        cache_file_patcher = patch.object(OverrideStatusCache, 'CACHE_FILE',
+                                          os.path.join(self.cache_dir, 'content_overrides.json'))
+        cache_file_patcher.start()
+        self.addCleanup(cache_file_patcher.stop)
+        self.override_cache = OverrideStatusCache()
+        self.override_cache.write_cache = Mock()
+        self.cached = [{'name': 'enabled', 'value': '1'}]
+        self.uep = Mock()
+
+    def _write_cache(self, validators):
+        with open(self.override_cache.CACHE_FILE, 'w') as f:
+            f.write(json.dumps(self.cached))
+        with open(self.override_cache.validators_file, 'w') as f:
+            f.write(json.dumps(validators))
+
+    def test_validators_file(self):
+        self.assertEqual(os.path.join(self.cache_dir, 'content_overrides.validators.json'),
+                         self.override_cache.validators_file)
+
+    def test_not_modified_uses_cache(self):
+        self._write_cache({'etag': '"1"'})
+
+        def get_overrides(uuid, validators=None):
+            self.assertEqual({'If-None-Match': '"1"'}, validators.request_headers())
+            validators.not_modified = True
+            return None
+        self.uep.getContentOverrides.side_effect = get_overrides
+
+        self.assertEqual(self.cached, self.override_cache.load_status(self.uep, "SOMEUUID"))
+        self.assertEqual(self.cached, self.override_cache.server_status)
+        self.assertFalse(self.override_cache.write_cache.called)
+        self.assertFalse(self.override_cache.last_error)
+
+    def test_modified_stores_validators(self):
+        self._write_cache({'etag': '"1"'})
+        new_overrides = [{'name': 'enabled', 'value': '0'}]
+
+        def get_overrides(uuid, validators=None):
+            validators.clear()
+            validators['etag'] = '"2"'
+            return new_overrides
+        self.uep.getContentOverrides.side_effect = get_overrides
+
+        self.assertEqual(new_overrides, self.override_cache.load_status(self.uep, "SOMEUUID"))
+        self.assertEqual(1, self.override_cache.write_cache.call_count)
+
+        self.override_cache._write_cache_and_validators(self.override_cache.validators)
+        with open(self.override_cache.CACHE_FILE) as f:
+            self.assertEqual(new_overrides, json.loads(f.read()))
+        with open(self.override_cache.validators_file) as f:
+            self.assertEqual({'etag': '"2"'}, json.loads(f.read()))
+
+    def test_no_validators_without_cache(self):
+        self.uep.getContentOverrides.return_value = self.cached
+        self.override_cache.load_status(self.uep, "SOMEUUID")
+        validators = self.uep.getContentOverrides.call_args[1]['validators']
+        self.assertEqual({}, validators.request_headers())
+
+    def test_not_modified_unreadable_cache_fetches_again(self):
+        self._write_cache({'etag': '"1"'})
+        with open(self.override_cache.CACHE_FILE, 'w') as f:
+            f.write('not json')
+
+        def get_overrides(uuid, validators=None):
+            if validators.get('etag'):
+                validators.not_modified = True
+                return None
+            return self.cached
+        self.uep.getContentOverrides.side_effect = get_overrides
+
+        self.assertEqual(self.cached, self.override_cache.load_status(self.uep, "SOMEUUID"))
+        self.assertEqual(2, self.uep.getContentOverrides.call_count)
+
+    def test_write_without_validators_removes_them(self):
+        self._write_cache({'etag': '"1"'})
+        self.override_cache.server_status = self.cached
+        self.override_cache._write_cache_and_validators(None)
+        self.assertTrue(os.path.exists(self.override_cache.CACHE_FILE))
+        self.assertFalse(os.path.exists(self.override_cache.validators_file))
+
+    def test_delete_cache_removes_validators(self):
+        self._write_cache({'etag': '"1"'})
+        self.override_cache.delete_cache()
+        self.assertFalse(os.path.exists(self.override_cache.CACHE_FILE))
+        self.assertFalse(os.path.exists(self.override_cache.validators_file))
+
+    def test_on_date_not_conditional(self):
+        status_cache = EntitlementStatusCache()
+        status_cache.write_cache = Mock()
+        self.uep.getCompliance.return_value = {"a": "1"}
+        status_cache.load_status(self.uep, "SOMEUUID", on_date="2199-12-25")
+        self.uep.getCompliance.assert_called_once_with("SOMEUUID", "2199-12-25", validators=None)
+        self.assertEqual(None, status_cache.validators)
+
+
+class TestStatusCachePrefetcher(SubManFixture):
+    def setUp(self):
+        super(TestStatusCachePrefetcher, self).setUp()
+        self.status_cache = EntitlementStatusCache()
+        self.status_cache.write_cache = Mock()
+        self.release_cache = ReleaseStatusCache()
+        self.release_cache.write_cache = Mock()
+        self.uep = Mock()
+        self.uep.getCompliance.return_value = {"status": "valid"}
+        self.uep.getRelease.return_value = {"releaseVer": "7.5"}
+        self.prefetcher = StatusCachePrefetcher(Mock(return_value=self.uep))
+
+    def test_prefetched_status_is_used(self):
+        self.prefetcher.prefetch([self.status_cache, self.release_cache], "SOMEUUID")
+        other_uep = Mock()
+        self.assertEqual({"status": "valid"}, self.status_cache.load_status(other_uep, "SOMEUUID"))
+        self.assertEqual({"releaseVer": "7.5"}, self.release_cache.load_status(other_uep, "SOMEUUID"))
+        self.assertEqual(1, self.uep.getCompliance.call_count)
+        self.assertEqual(1, self.uep.getRelease.call_count)
+        self.assertFalse(other_uep.method_calls)
+
+    def test_prefetched_status_used_once(self):
+        self.prefetcher.prefetch([self.status_cache], "SOMEUUID")
+        self.status_cache.load_status(self.uep, "SOMEUUID")
+        self.status_cache.load_status(self.uep, "SOMEUUID")
+        self.assertEqual(2, self.uep.getCompliance.call_count)
+
+    def test_read_status_waits_for_prefetch(self):
+        self.status_cache.server_status = {"status": "invalid"}
+        self.prefetcher.prefetch([self.status_cache], "SOMEUUID")
+        self.assertEqual({"status": "valid"}, self.status_cache.read_status(Mock(), "SOMEUUID"))
+
+    def test_prefetch_error_is_raised(self):
+        self.prefetcher.uep_factory.side_effect = socket.error("no connection")
+        self.prefetcher.prefetch([self.status_cache], "SOMEUUID")
+        self.assertRaises(socket.error, self.status_cache.load_status, self.uep, "SOMEUUID")
+
+    def test_other_uuid_not_prefetched(self):
+        self.prefetcher.prefetch([self.status_cache], "SOMEUUID")
+        other_uep = Mock()
+        other_uep.getCompliance.return_value = {"status": "invalid"}
+        self.assertEqual({"status": "invalid"}, self.status_cache.load_status(other_uep, "OTHERUUID"))
+        self.assertEqual(("OTHERUUID", None), other_uep.getCompliance.call_args[0])
+
+    def test_on_date_not_prefetched(self):
+        self.prefetcher.prefetch([self.status_cache], "SOMEUUID")
+        self.status_cache.load_status(self.uep, "SOMEUUID", on_date="2199-12-25")
+        self.uep.getCompliance.assert_called_with("SOMEUUID", "2199-12-25", validators=None)
+        self.assertEqual(2, self.uep.getCompliance.call_count)
+
+
 class TestPoolTypeCache(SubManFixture):
     """
     Class for testing PoolTypeCache
@@ -25,10 +25,13 @@ import os
 from mock import patch, MagicMock
 from shutil import rmtree
 
+from . import certdata
 from .stubs import StubProduct, StubEntitlementCertificate, \
-    StubProductCertificate
+    StubProductCertificate, StubCertificateDirectory
+from rhsm.certificate2 import Pool
 from subscription_manager.certdirectory import Path, EntitlementDirectory, \
-    ProductDirectory, ProductCertificateDirectory, Directory
+    ProductDirectory, ProductCertificateDirectory, Directory, \
+    CertificateCache, CertificateDirectory
 from subscription_manager.repolib import YumRepoFile
 from subscription_manager.productid import ProductDatabase
 
@@ -205,6 +208,10 @@ class EntitlementDirectoryWithCertsTest(DirectoryWithCertsTest):
         self.path_patcher = patch("subscription_manager.certdirectory.EntitlementDirectory.productpath")
         self.mock_productpath = self.path_patcher.start()
 
+        self.cache_dir = tempfile.mkdtemp(prefix='subscription-manager-unit-tests-tmp')
+        self.cache_patcher = patch.object(CertificateCache, 'CACHE_DIR', self.cache_dir)
+        self.cache_patcher.start()
+
         mock_product = MagicMock()
         mock_product.id = '123456789'
 
@@ -247,6 +254,8 @@ class EntitlementDirectoryWithCertsTest(DirectoryWithCertsTest):
     def tearDown(self):
         self.patcher.stop()
         self.path_patcher.stop()
+        self.cache_patcher.stop()
+        rmtree(self.cache_dir)
         super(EntitlementDirectoryWithCertsTest, self).tearDown()
 
     def test_list_valid(self):
@@ -262,6 +271,191 @@ class EntitlementDirectoryWithCertsTest(DirectoryWithCertsTest):
         self.assertTrue(isinstance(res, list))
 
 
+class CachingCertificateDirectory(CertificateDirectory):
+    CACHE_CERTS = True
+
+
+class CertificateCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cert_dir = tempfile.mkdtemp(prefix='subscription-manager-unit-tests-tmp')
+        self.cache_dir = tempfile.mkdtemp(prefix='subscription-manager-unit-tests-tmp')
+        self.addCleanup(rmtree, self.cert_dir)
+        self.addCleanup(rmtree, self.cache_dir)
+        patcher = patch.object(CertificateCache, 'CACHE_DIR', self.cache_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self._write_cert('100.pem', certdata.ENTITLEMENT_CERT_V3_0)
+        self._write_cert('200.pem', certdata.ENTITLEMENT_CERT_V1_0)
+
+    def _write_cert(self, filename, pem):
+        with open(os.path.join(self.cert_dir, filename), 'w') as f:
+            f.write(pem)
+
+    def _list(self):
+        return sorted(CachingCertificateDirectory(self.cert_dir).list(), key=lambda c: c.serial)
+
+    @patch('subscription_manager.certdirectory.create_from_file')
+    def test_unchanged_certs_are_not_parsed(self, mock_create):
+        from rhsm.certificate import create_from_file
+        mock_create.side_effect = create_from_file
+        parsed = self._list()
+        self.assertEqual(2, mock_create.call_count)
+
+        mock_create.reset_mock()
+        cached = self._list()
+        self.assertEqual(0, mock_create.call_count)
+        self.assertEqual([c.serial for c in parsed], [c.serial for c in cached])
+        self.assertEqual(parsed[1].order.name, cached[1].order.name)
+        self.assertEqual(parsed[1].provided_paths, cached[1].provided_paths)
+        self.assertEqual(parsed[1].pem, cached[1].pem)
+        # the v1 cert is cached with its pem so it can still be written out
+        self.assertTrue(cached[0].pem)
+
+    @patch('subscription_manager.certdirectory.create_from_file')
+    def test_rewritten_cert_is_parsed(self, mock_create):
+        from rhsm.certificate import create_from_file
+        mock_create.side_effect = create_from_file
+        self._list()
+        self._write_cert('100.pem', certdata.ENTITLEMENT_CERT_V1_0)
+        mock_create.reset_mock()
+        self._list()
+        mock_create.assert_called_once_with(os.path.join(self.cert_dir, '100.pem'))
+
+    def test_removed_cert_is_pruned(self):
+        self._list()
+        os.unlink(os.path.join(self.cert_dir, '200.pem'))
+        self.assertEqual(1, len(self._list()))
+        cache = CertificateCache(self.cert_dir)
+        cache.get('ignored', None)
+        self.assertEqual([os.path.join(self.cert_dir, '100.pem')], list(cache._entries))
+
+    def test_other_version_is_ignored(self):
+        self._list()
+        with patch.object(CertificateCache, 'VERSION', CertificateCache.VERSION + 1):
+            cache = CertificateCache(self.cert_dir)
+            path = os.path.join(self.cert_dir, '100.pem')
+            self.assertEqual(None, cache.get(path, CertificateCache.fingerprint(path)))
+
+    def test_writable_by_others_is_ignored(self):
+        self._list()
+        cache = CertificateCache(self.cert_dir)
+        os.chmod(cache.cache_file, 0o666)
+        path = os.path.join(self.cert_dir, '100.pem')
+        self.assertEqual(None, cache.get(path, CertificateCache.fingerprint(path)))
+
+    def test_unwritable_cache_dir(self):
+        with patch.object(CertificateCache, 'CACHE_DIR', '/dev/null/nope'):
+            self.assertEqual(2, len(self._list()))
+
+
+class IncrementalRefreshTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cert_dir = tempfile.mkdtemp(prefix='subscription-manager-unit-tests-tmp')
+        self.addCleanup(rmtree, self.cert_dir)
+        for name in ('1.pem', '2.pem', '3.pem'):
+            self._write(name, 'cert %s' % name)
+
+        patcher = patch('subscription_manager.certdirectory.create_from_file')
+        self.mock_create = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_create.side_effect = lambda path: MagicMock(path=path)
+        self.d = CertificateDirectory(self.cert_dir)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.cert_dir, name), 'w') as f:
+            f.write(content)
+
+    def _paths(self):
+        return sorted(os.path.basename(cert.path) for cert in self.d.list())
+
+    def test_refresh_without_changes(self):
+        first = self.d.list()
+        self.d.refresh()
+        second = self.d.list()
+        self.assertEqual(3, self.mock_create.call_count)
+        self.assertFalse(first is second)
+        self.assertEqual(sorted(first, key=id), sorted(second, key=id))
+
+    def test_refresh_only_parses_changes(self):
+        self.d.list()
+        self.mock_create.reset_mock()
+
+        self._write('2.pem', 'a rewritten certificate')
+        self._write('4.pem', 'cert 4.pem')
+        os.unlink(os.path.join(self.cert_dir, '3.pem'))
+        self.d.refresh()
+
+        self.assertEqual(['1.pem', '2.pem', '4.pem'], self._paths())
+        parsed = sorted(os.path.basename(call[0][0]) for call in self.mock_create.call_args_list)
+        self.assertEqual(['2.pem', '4.pem'], parsed)
+
+    def test_list_without_refresh_is_unchanged(self):
+        self.d.list()
+        self._write('4.pem', 'cert 4.pem')
+        self.assertEqual(['1.pem', '2.pem', '3.pem'], self._paths())
+
+
+class CertificateIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cert1 = StubEntitlementCertificate('product1', ['product2'], pool=Pool(id='pool1'),
+                                                stacking_id='stack1')
+        self.cert2 = StubEntitlementCertificate('product3', pool=Pool(id='pool1'),
+                                                stacking_id='stack1')
+        self.cert3 = StubEntitlementCertificate('product2', pool=Pool(id='pool2'))
+        self.ent_dir = StubCertificateDirectory([self.cert1, self.cert2, self.cert3])
+
+    def test_find(self):
+        self.assertEqual(self.cert2, self.ent_dir.find(self.cert2.serial))
+        self.assertEqual(None, self.ent_dir.find(1))
+
+    def test_find_by_product(self):
+        # first cert in the listing wins
+        self.assertTrue(self.ent_dir.find_by_product('product2') is self.cert1)
+        self.assertEqual(None, self.ent_dir.find_by_product('product4'))
+
+    def test_find_all_by_product_completes_stacks(self):
+        certs = self.ent_dir.find_all_by_product('product1')
+        self.assertEqual(set([self.cert1, self.cert2]), set(certs))
+        certs = self.ent_dir.find_all_by_product('product2')
+        self.assertEqual(set([self.cert1, self.cert2, self.cert3]), set(certs))
+
+    def test_list_for_product(self):
+        self.assertEqual([self.cert1, self.cert3], self.ent_dir.list_for_product('product2'))
+        self.assertEqual([], self.ent_dir.list_for_product('product4'))
+
+    def test_list_for_pool_id(self):
+        self.assertEqual([self.cert1, self.cert2], self.ent_dir.list_for_pool_id('pool1'))
+        self.assertEqual([], self.ent_dir.list_for_pool_id('pool3'))
+
+    def test_list_serials_for_pool_ids(self):
+        serials = self.ent_dir.list_serials_for_pool_ids(['pool1', 'pool2'])
+        self.assertEqual({'pool1': [str(self.cert1.serial), str(self.cert2.serial)],
+                          'pool2': [str(self.cert3.serial)]}, serials)
+
+    def test_index_reused(self):
+        index = self.ent_dir._get_index()
+        self.ent_dir.find_by_product('product1')
+        self.ent_dir.list_for_pool_id('pool1')
+        self.assertTrue(self.ent_dir._get_index() is index)
+
+    def test_index_rebuilt_when_listing_changes(self):
+        self.ent_dir.find(self.cert1.serial)
+        cert4 = StubEntitlementCertificate('product4')
+        self.ent_dir.certs.append(cert4)
+        self.assertEqual(cert4, self.ent_dir.find(cert4.serial))
+        self.ent_dir.certs = [self.cert3]
+        self.assertEqual(None, self.ent_dir.find(self.cert1.serial))
+
+    def test_refresh_drops_index(self):
+        self.ent_dir._get_index()
+        self.ent_dir.refresh()
+        self.assertEqual(None, self.ent_dir._index)
+
+
 class ProductCertificateDirectoryTest(DirectoryTest):
     klass = ProductCertificateDirectory
 
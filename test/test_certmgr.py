@@ -15,13 +15,16 @@ from __future__ import print_function, division, absolute_import
 #
 
 from datetime import datetime, timedelta
+import threading
 
 import mock
 from . import stubs
 
 from rhsm import ourjson as json
 from subscription_manager import action_client
+from subscription_manager import base_action_client
 from subscription_manager import content_action_client
+from subscription_manager.cp_provider import CPProvider
 from subscription_manager import entcertlib
 from subscription_manager import identitycertlib
 from subscription_manager import repolib
@@ -158,6 +161,11 @@ class TestActionClient(ActionClientTestBase):
         actionclient = action_client.ActionClient()
         actionclient.update()
 
+    def test_profile_updated_after_content(self):
+        actionclient = action_client.ActionClient()
+        dependencies = actionclient._get_dependencies()
+        self.assertTrue(actionclient.content_client in dependencies[actionclient.profilelib])
+
     # see bz #852706
     @mock.patch.object(entcertlib.EntCertActionInvoker, 'update')
     def test_gone_exception(self, mock_update):
@@ -282,6 +290,151 @@ class TestActionClient(ActionClientTestBase):
         self.fail("Did not ExceptionException in the logged exceptions")
 
 
+class StubLib(object):
+    def __init__(self, name, update=None):
+        self.name = name
+        self._update = update
+
+    def update(self):
+        if self._update:
+            self._update()
+        return self.name
+
+    def __repr__(self):
+        return self.name
+
+
+class TestUpdateScheduler(SubManFixture):
+    def setUp(self):
+        super(TestUpdateScheduler, self).setUp()
+        self.updated = []
+
+    def _run(self, scheduler):
+        def run_update(lib):
+            report = lib.update()
+            self.updated.append(lib.name)
+            return report
+        return scheduler.run(run_update)
+
+    def test_dependencies_updated_first(self):
+        first, second, third = StubLib("first"), StubLib("second"), StubLib("third")
+        scheduler = base_action_client.UpdateScheduler(
+            [third, second, first], {third: [second], second: [first]}, 4)
+        reports = self._run(scheduler)
+        self.assertEqual(["first", "second", "third"], self.updated)
+        # reports are still in libset order
+        self.assertEqual(["third", "second", "first"], reports)
+
+    def test_independent_libs_run_at_once(self):
+        started = threading.Event()
+
+        def wait_for_other():
+            # only returns True if the other lib is running at the same time
+            self.assertTrue(started.wait(5))
+
+        libs = [StubLib("waits", wait_for_other), StubLib("starts", started.set)]
+        scheduler = base_action_client.UpdateScheduler(libs, {}, 2)
+        self.assertEqual(["waits", "starts"], self._run(scheduler))
+
+    def test_max_workers(self):
+        running = []
+        most_running = []
+        lock = threading.Lock()
+
+        def update():
+            with lock:
+                running.append(1)
+                most_running.append(len(running))
+            threading.Event().wait(0.01)
+            with lock:
+                running.pop()
+
+        libs = [StubLib(str(i), update) for i in range(6)]
+        scheduler = base_action_client.UpdateScheduler(libs, {}, 2)
+        self._run(scheduler)
+        self.assertEqual(6, len(self.updated))
+        self.assertTrue(max(most_running) <= 2)
+
+    def test_exception_stops_dependents(self):
+        def gone():
+            raise GoneException(410, "bye bye", " 234234")
+
+        first, second = StubLib("first", gone), StubLib("second")
+        scheduler = base_action_client.UpdateScheduler([first, second], {second: [first]}, 4)
+        self.assertRaises(GoneException, self._run, scheduler)
+        self.assertEqual([], self.updated)
+
+    def test_exception_waits_for_running(self):
+        started = threading.Event()
+
+        def gone():
+            started.wait(5)
+            raise GoneException(410, "bye bye", " 234234")
+
+        def slow():
+            started.set()
+            threading.Event().wait(0.05)
+
+        libs = [StubLib("gone", gone), StubLib("slow", slow)]
+        scheduler = base_action_client.UpdateScheduler(libs, {}, 2)
+        self.assertRaises(GoneException, self._run, scheduler)
+        self.assertEqual(["slow"], self.updated)
+
+    def test_unknown_dependency(self):
+        first, second = StubLib("first"), StubLib("second")
+        self.assertRaises(ValueError, base_action_client.UpdateScheduler,
+                          [second], {second: [first]}, 4)
+
+    def test_circular_dependency(self):
+        first, second = StubLib("first"), StubLib("second")
+        scheduler = base_action_client.UpdateScheduler(
+            [first, second], {first: [second], second: [first]}, 4)
+        self.assertRaises(ValueError, self._run, scheduler)
+
+    def test_threaded_update(self):
+        started = threading.Event()
+        threaded = []
+
+        def run_threaded_update(lib):
+            threaded.append(lib.name)
+            return lib.update()
+
+        waits, starts, last = StubLib("waits", lambda: started.wait(5)), StubLib("starts", started.set), StubLib("last")
+        scheduler = base_action_client.UpdateScheduler([waits, starts, last], {last: [waits, starts]}, 2)
+        self.assertEqual(["waits", "starts", "last"], scheduler.run(lambda lib: lib.update(), run_threaded_update))
+        # the last lib has nothing to overlap with, so it is updated inline
+        self.assertEqual(["starts", "waits"], sorted(threaded))
+
+    @mock.patch.object(stubs.StubCPProvider, 'set_thread_consumer_auth_cp')
+    @mock.patch.object(stubs.StubCPProvider, 'new_consumer_auth_cp')
+    def test_threaded_update_own_connection(self, new_cp, set_thread_cp):
+        client = base_action_client.BaseActionClient()
+        lib = mock.Mock()
+        self.assertEqual(lib.update.return_value, client._run_threaded_update(lib))
+        self.assertEqual([mock.call(new_cp.return_value), mock.call(None)],
+                         set_thread_cp.call_args_list)
+
+    def test_thread_connection_reuses_capabilities(self):
+        cp_provider = CPProvider()
+        shared_cp = cp_provider.get_consumer_auth_cp()
+        shared_cp.capabilities = ['gzip_request']
+        shared_cp.conn.compress_requests = True
+
+        thread_cp = cp_provider.new_consumer_auth_cp()
+        self.assertFalse(thread_cp is shared_cp)
+        with mock.patch.object(thread_cp.conn, 'request_get') as request_get:
+            self.assertTrue(thread_cp.has_capability('gzip_request'))
+            self.assertFalse(request_get.called)
+        self.assertTrue(thread_cp.conn.compress_requests)
+
+    def test_default_dependencies_keep_order(self):
+        client = base_action_client.BaseActionClient()
+        libs = [StubLib("first"), StubLib("second"), StubLib("third")]
+        client._libset = libs
+        self.assertEqual({libs[0]: [], libs[1]: [libs[0]], libs[2]: [libs[1]]},
+                         client._get_dependencies())
+
+
 class TestHealingActionClient(TestActionClient):
     def test_healing_no_heal(self):
         self.mock_cert_sorter.is_valid = mock.Mock(return_value=True)
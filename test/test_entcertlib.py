@@ -20,6 +20,7 @@ from __future__ import print_function, division, absolute_import
 from mock import Mock, patch
 from datetime import timedelta, datetime
 import six
+import socket
 
 from .stubs import StubEntitlementCertificate, StubProduct, StubEntitlementDirectory
 
@@ -129,3 +130,94 @@ class UpdateActionTests(fixture.SubManFixture):
 
         exceptions = update_action.report.exceptions()
         self.assertEqual([], exceptions)
+
+
+class BatchedInstallTests(fixture.SubManFixture):
+
+    def setUp(self):
+        super(BatchedInstallTests, self).setUp()
+        self.certs = dict((cert.serial, cert) for cert in
+                          [StubEntitlementCertificate(StubProduct("P%d" % i)) for i in range(7)])
+
+        self.mock_uep = Mock()
+        self.mock_uep.getCertificates.side_effect = self._get_certificates
+        self.set_consumer_auth_cp(self.mock_uep)
+        inj.provide(inj.ENT_DIR, StubEntitlementDirectory([]))
+
+        build_patcher = patch("subscription_manager.entcertlib.EntitlementCertBundleInstaller.build_cert")
+        build_cert_mock = build_patcher.start()
+        build_cert_mock.side_effect = lambda bundle: (bundle['key'], bundle['cert'])
+        self.addCleanup(build_patcher.stop)
+
+        write_patcher = patch.object(Writer, "write")
+        write_patcher.start()
+        self.addCleanup(write_patcher.stop)
+
+    def _get_certificates(self, uuid, serials=None):
+        return [{'key': Mock(), 'cert': self.certs[int(sn)]} for sn in serials]
+
+    def _install(self, batch_size):
+        update_action = TestingUpdateAction()
+        with patch.object(update_action, '_get_batch_size', return_value=batch_size):
+            update_action.install(sorted(self.certs))
+        return update_action.report
+
+    def test_batches(self):
+        report = self._install(3)
+
+        self.assertEqual(3, self.mock_uep.getCertificates.call_count)
+        requested = [call[1]['serials'] for call in self.mock_uep.getCertificates.call_args_list]
+        self.assertEqual([str(sn) for sn in sorted(self.certs)], sum(requested, []))
+        self.assertEqual([self.certs[sn] for sn in sorted(self.certs)], report.added)
+        self.assertEqual(3, report.batches)
+
+    def test_single_batch(self):
+        report = self._install(10)
+
+        self.assertEqual(1, self.mock_uep.getCertificates.call_count)
+        self.assertEqual(7, len(report.added))
+
+    def test_fetch_error_is_raised(self):
+        self.mock_uep.getCertificates.side_effect = [
+            self._get_certificates(None, [str(sn) for sn in sorted(self.certs)[:3]]),
+            socket.error("connection reset")]
+
+        self.assertRaises(socket.error, self._install, 3)
+
+    @patch("subscription_manager.entcertlib.EntitlementCertBundlesInstaller.post_install")
+    def test_fetch_error_after_first_batch(self, post_install_mock):
+        self.mock_uep.getCertificateSerials.return_value = [{'serial': sn} for sn in sorted(self.certs)]
+        self.mock_uep.getCertificates.side_effect = [
+            self._get_certificates(None, [str(sn) for sn in sorted(self.certs)[:3]]),
+            socket.error("connection reset")]
+        self.mock_uep.has_capability.return_value = False
+
+        update_action = TestingUpdateAction()
+        update_action.ent_dir.refresh = Mock()
+        update_action.repo_hook = Mock()
+        update_action.branding_hook = Mock()
+        with patch.object(update_action, '_get_batch_size', return_value=3):
+            self.assertRaises(socket.error, update_action.perform)
+
+        self.assertEqual([self.certs[sn] for sn in sorted(self.certs)[:3]], update_action.report.added)
+        self.assertTrue(post_install_mock.called)
+        self.assertTrue(update_action.ent_dir.refresh.called)
+        self.assertTrue(update_action.repo_hook.called)
+        self.assertTrue(update_action.branding_hook.called)
+
+    def test_timings(self):
+        report = self._install(3)
+
+        self.assertTrue(report.timings['total'] > 0)
+        self.assertTrue(all(t >= 0 for t in report.timings.values()))
+        self.assertTrue("3 batch(es)" in report.format_timings())
+
+    @patch.object(entcertlib.conf['rhsm'], 'get_int')
+    def test_batch_size_config(self, get_int_mock):
+        update_action = TestingUpdateAction()
+        get_int_mock.return_value = 25
+        self.assertEqual(25, update_action._get_batch_size())
+        get_int_mock.return_value = None
+        self.assertEqual(entcertlib.DEFAULT_CERT_BATCH_SIZE, update_action._get_batch_size())
+        get_int_mock.side_effect = ValueError
+        self.assertEqual(entcertlib.DEFAULT_CERT_BATCH_SIZE, update_action._get_batch_size())
@@ -1,11 +1,13 @@
 from __future__ import print_function, division, absolute_import
 
+import os
 import tempfile
 import shutil
-from mock import patch
+from mock import Mock, patch
 
 from . import fixture
 from subscription_manager import facts
+from rhsm import connection
 from rhsm import ourjson as json
 
 facts_buf = """
@@ -204,3 +206,81 @@ class TestFacts(fixture.SubManFixture):
 
         self.assertTrue(isinstance(f, dict))
         self.assertEqual(f['net.interface.lo.ipv4_address'], '127.0.0.1')
+
+    @patch('subscription_manager.facts.AllFactsCollector')
+    def test_get_facts_timed_out_collector_uses_cache(self, mock_collector_class):
+        mock_collector = mock_collector_class.return_value
+        mock_collector.get_all.return_value = {'test.attr': 'new', 'uname.machine': 'x86_64'}
+        mock_collector.timed_out = ['HardwareCollector']
+        mock_collector.get_timed_out_fact_names.return_value = set(['cpu.cpu_socket(s)', 'cpu.unknown'])
+
+        f = self.f.get_facts(refresh=True)
+
+        self.assertEqual('new', f['test.attr'])
+        self.assertEqual('x86_64', f['uname.machine'])
+        # left out by the collector that timed out
+        self.assertEqual(2, f['cpu.cpu_socket(s)'])
+        # cached facts of the other collectors are not brought back
+        self.assertFalse('another' in f)
+        self.assertFalse('cpu.unknown' in f)
+
+    @patch('subscription_manager.facts.AllFactsCollector')
+    def test_get_facts_no_timeout_ignores_cache(self, mock_collector_class):
+        mock_collector = mock_collector_class.return_value
+        mock_collector.get_all.return_value = {'test.attr': 'new'}
+        mock_collector.timed_out = []
+
+        self.assertEqual({'test.attr': 'new'}, self.f.get_facts(refresh=True))
+
+
+class TestFactsDelta(fixture.SubManFixture):
+    def setUp(self):
+        super(TestFactsDelta, self).setUp()
+        self.fact_cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.fact_cache_dir)
+        self.f = facts.Facts()
+        self.f.CACHE_FILE = self.fact_cache_dir + "/facts.json"
+        with open(self.f.CACHE_FILE, "w") as fd:
+            fd.write(facts_buf)
+        self.f.facts = json.loads(facts_buf)
+        self.f.facts['net.interface.eth0.ipv4_address'] = '10.0.0.2'
+        self.f.facts['new.fact'] = 'new'
+        del self.f.facts['test.attr']
+
+        self.uep = Mock()
+        self.uep.has_capability = lambda capability: capability == facts.FACTS_DELTA_CAPABILITY
+
+    def test_facts_delta(self):
+        changed, removed = self.f._facts_delta(self.f.facts)
+        self.assertEqual({'net.interface.eth0.ipv4_address': '10.0.0.2', 'new.fact': 'new'}, changed)
+        self.assertEqual(['test.attr'], removed)
+
+    def test_sync_uploads_delta(self):
+        self.f._sync_with_server(self.uep, 'uuid')
+        self.uep.updateConsumerFactsDelta.assert_called_once_with(
+            'uuid', {'net.interface.eth0.ipv4_address': '10.0.0.2', 'new.fact': 'new'}, ['test.attr'])
+        self.assertFalse(self.uep.updateConsumer.called)
+        self.assertTrue(self.f.bytes_saved > 0)
+
+    def test_sync_without_capability_uploads_all(self):
+        self.uep.has_capability = lambda capability: False
+        self.f._sync_with_server(self.uep, 'uuid')
+        self.uep.updateConsumer.assert_called_once_with('uuid', facts=self.f.facts)
+        self.assertFalse(self.uep.updateConsumerFactsDelta.called)
+
+    def test_sync_without_cache_uploads_all(self):
+        os.remove(self.f.CACHE_FILE)
+        self.f._sync_with_server(self.uep, 'uuid')
+        self.uep.updateConsumer.assert_called_once_with('uuid', facts=self.f.facts)
+
+    def test_sync_unchanged_uploads_all(self):
+        self.f.facts = json.loads(facts_buf)
+        self.f._sync_with_server(self.uep, 'uuid')
+        self.uep.updateConsumer.assert_called_once_with('uuid', facts=self.f.facts)
+        self.assertFalse(self.uep.updateConsumerFactsDelta.called)
+
+    def test_sync_delta_failure_uploads_all(self):
+        self.uep.updateConsumerFactsDelta.side_effect = connection.RestlibException(404, "Not found")
+        self.f._sync_with_server(self.uep, 'uuid')
+        self.uep.updateConsumer.assert_called_once_with('uuid', facts=self.f.facts)
+        self.assertEqual(0, self.f.bytes_saved)
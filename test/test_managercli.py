@@ -603,7 +603,7 @@ class TestListCommand(TestCliProxyCommand):
             self.valid_date]
         self._test_afterdate_option(argv, self.cc.main, expected_exit_code=os.EX_USAGE)
 
-    @patch('subscription_manager.managerlib.get_available_entitlements')
+    @patch('subscription_manager.managerlib.iter_available_entitlements')
     def test_afterdate_option_valid(self, es):
         def create_pool_list(*args, **kwargs):
             return [{'productName': 'dummy-name',
@@ -627,7 +627,7 @@ class TestListCommand(TestCliProxyCommand):
         argv = ['subscription-manager', 'list', '--all', '--available', '--afterdate', self.valid_date]
         self._test_afterdate_option(argv, self.cc.main, should_exit=False)
 
-    @patch('subscription_manager.managerlib.get_available_entitlements')
+    @patch('subscription_manager.managerlib.iter_available_entitlements')
     def test_none_wrap_available_pool_id(self, mget_ents):
         list_command = managercli.ListCommand()
 
@@ -1399,6 +1399,21 @@ class TestUnSubscribeCommand(TestRemoveCommand):
 class TestFactsCommand(TestCliProxyCommand):
     command_class = managercli.FactsCommand
 
+    @patch('subscription_manager.managercli.FactsCache')
+    def test_update_deletes_collector_cache(self, mock_facts_cache):
+        self.cc.options = Mock(list=False, update=True)
+        self.cc.cp = Mock()
+        with patch.object(self.cc, '_validate_options'):
+            self._orig_do_command()
+        mock_facts_cache.return_value.delete.assert_called_once_with()
+
+    @patch('subscription_manager.managercli.FactsCache')
+    def test_list_keeps_collector_cache(self, mock_facts_cache):
+        self.cc.options = Mock(list=True, update=False)
+        with patch.object(self.cc, '_validate_options'):
+            self._orig_do_command()
+        self.assertFalse(mock_facts_cache.called)
+
 
 class TestImportCertCommand(TestCliCommand):
     command_class = managercli.ImportCertCommand
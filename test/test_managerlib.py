@@ -387,6 +387,32 @@ class PoolFilterTests(SubManFixture):
         self.assertEqual(1, len(result))
         self.assertEqual(product1, result[0]['productId'])
 
+    def test_filter_product_ids(self):
+        pool_filter = PoolFilter(product_dir=StubCertificateDirectory([]),
+                entitlement_dir=StubCertificateDirectory([]))
+
+        pools = [
+                create_pool('product1', 'product1'),
+                create_pool('product2', 'product2', provided_products=['provided1']),
+                create_pool('product3', 'product3'),
+        ]
+        result = pool_filter.filter_product_ids(pools, ['product1', 'provided1'])
+        self.assertEqual([pools[0], pools[1]], result)
+
+    def test_filter_subscribed_pools(self):
+        pool_filter = PoolFilter(product_dir=StubCertificateDirectory([]),
+                entitlement_dir=StubCertificateDirectory([]))
+
+        pools = [
+                create_pool('product1', 'product1'),
+                create_pool('product2', 'product2'),
+                create_pool('product3', 'product3'),
+        ]
+        subscribed = [pools[0]['id'], pools[1]['id']]
+        compatible = {pools[1]['id']: pools[1]}
+        result = pool_filter.filter_subscribed_pools(pools, subscribed, compatible)
+        self.assertEqual([pools[1], pools[2]], result)
+
     def test_filter_product_name(self):
         product1 = 'Foo Product'
         product2 = 'Bar Product'
@@ -1154,6 +1180,34 @@ class TestGetAvailableEntitlements(SubManFixture):
         res = managerlib.get_available_entitlements(uninstalled=True)
         self.assertEqual(1, len(res))
 
+    def test_iter_available_entitlements(self):
+        cp = self.get_consumer_cp()
+        pools = [self.build_pool_dict(str(i)) for i in range(5)]
+
+        def get_pools_list(consumer=None, listAll=False, active_on=None, owner=None, filter_string=None,
+                           after_date=None, future=None, page=None, per_page=None):
+            return pools[(page - 1) * per_page:page * per_page]
+
+        cp.getPoolsList = Mock(side_effect=get_pools_list)
+
+        res = list(managerlib.iter_available_entitlements(get_all=True, page_size=2))
+        self.assertEqual([str(i) for i in range(5)], [pool['id'] for pool in res])
+        self.assertEqual(3, cp.getPoolsList.call_count)
+
+    def test_iter_available_entitlements_moved_pool(self):
+        cp = self.get_consumer_cp()
+        # a pool added on the server after the first page moves pool 1 on
+        pages = [['0', '1'], ['1', '2'], ['3']]
+
+        def get_pools_list(consumer=None, listAll=False, active_on=None, owner=None, filter_string=None,
+                           after_date=None, future=None, page=None, per_page=None):
+            return [self.build_pool_dict(pool_id) for pool_id in pages[page - 1]]
+
+        cp.getPoolsList = Mock(side_effect=get_pools_list)
+
+        res = list(managerlib.iter_available_entitlements(get_all=True, page_size=2))
+        self.assertEqual(['0', '1', '2', '3'], [pool['id'] for pool in res])
+
     def build_pool_dict(self, pool_id, provided_products=[]):
         return {'id': str(pool_id),
             # note things fail if any of these are not set, or
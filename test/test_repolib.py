@@ -22,7 +22,9 @@ except ImportError:
     import unittest
 
 import re
+import shutil
 import six
+import stat
 from . import fixture
 
 from iniparse import RawConfigParser, SafeConfigParser
@@ -907,6 +909,83 @@ class YumRepoFileTest(unittest.TestCase):
         self.assertTrue(rf._configparsers_equal(other))
 
 
+class YumRepoFileWriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.repos_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.repos_dir)
+        patcher = patch("subscription_manager.repofile.manage_repos_enabled", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.path = os.path.join(self.repos_dir, 'redhat.repo')
+
+    def _repo_file(self):
+        rf = YumRepoFile(self.repos_dir, 'redhat.repo')
+        rf.read()
+        return rf
+
+    def _write_repos(self, count):
+        rf = self._repo_file()
+        for i in range(count):
+            rf.add(Repo('repo%d' % i, [('name', 'Repo %d' % i), ('enabled', '1')]))
+        rf.write()
+        return rf
+
+    def test_write_replaces_file(self):
+        self._write_repos(3)
+        os.chmod(self.path, 0o640)
+        inode = os.stat(self.path).st_ino
+
+        rf = self._repo_file()
+        rf.update(Repo('repo1', [('name', 'Repo 1'), ('enabled', '0')]))
+        rf.write()
+
+        self.assertNotEqual(inode, os.stat(self.path).st_ino)
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(self.path).st_mode))
+        self.assertEqual(['redhat.repo'], os.listdir(self.repos_dir))
+        self.assertEqual('0', self._repo_file().get('repo1', 'enabled'))
+
+    def test_unchanged_file_not_written(self):
+        self._write_repos(3)
+        rf = self._repo_file()
+        rf.update(Repo('repo1', [('name', 'Repo 1'), ('enabled', '1')]))
+        with patch.object(rf, '_replace_file') as replace_file:
+            rf.write()
+            self.assertFalse(replace_file.called)
+
+    def test_only_dirty_sections_compared(self):
+        rf = self._write_repos(3)
+        rf.delete('repo2')
+        self.assertTrue(rf._has_changed())
+        rf.add(Repo('repo2', [('name', 'Repo 2'), ('enabled', '1')]))
+        with patch.object(rf, '_section_items', wraps=rf._section_items) as section_items:
+            self.assertFalse(rf._has_changed())
+            self.assertEqual(1, section_items.call_count)
+
+    def test_added_and_deleted_section(self):
+        rf = self._write_repos(3)
+        rf.add(Repo('repo3', [('name', 'Repo 3'), ('enabled', '1')]))
+        rf.delete('repo3')
+        self.assertFalse(rf._has_changed())
+
+    def test_file_changed_on_disk(self):
+        rf = self._write_repos(3)
+        with open(self.path, 'a') as f:
+            f.write("[other]\nname = other\n")
+        self.assertTrue(rf._has_changed())
+        rf.write()
+        self.assertFalse(self._repo_file().has_section('other'))
+
+    def test_failed_write_keeps_file(self):
+        self._write_repos(3)
+        rf = self._repo_file()
+        rf.delete('repo0')
+        with patch('subscription_manager.repofile.os.rename', side_effect=OSError("rename failed")):
+            self.assertRaises(OSError, rf.write)
+        self.assertEqual(['redhat.repo'], os.listdir(self.repos_dir))
+        self.assertTrue(self._repo_file().has_section('repo0'))
+
+
 # config file is root only, so just fill in a stringbuffer
 unset_manage_repos_cfg_buf = """
 [server]